@@ -0,0 +1,231 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Features tracked per device: the six estimates followed by the 11 NIR channels
+ESTIMATE_FEATURES = [
+    'estimated_co2', 'estimated_protein', 'estimated_amino_acids',
+    'estimated_minerals', 'estimated_flavor_compounds', 'estimated_moisture',
+]
+NIR_FEATURES = [f'channel{i}' for i in range(11)]
+FEATURES = ESTIMATE_FEATURES + NIR_FEATURES
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'database', 'anomaly_state.json'
+)
+
+
+def extract_features(estimates, nir_readings):
+    """Build the feature vector (NaN for missing values) from an ingest payload.
+
+    ``nir_readings`` may be a dict keyed ``channel0..channel10`` or a plain list
+    (as sent by the firmware).
+    """
+    values = np.full(len(FEATURES), np.nan)
+    for i, name in enumerate(ESTIMATE_FEATURES):
+        value = estimates.get(name)
+        if isinstance(value, (int, float)):
+            values[i] = value
+
+    offset = len(ESTIMATE_FEATURES)
+    if isinstance(nir_readings, dict):
+        channels = [nir_readings.get(name) for name in NIR_FEATURES]
+    elif isinstance(nir_readings, (list, tuple)):
+        channels = list(nir_readings[:len(NIR_FEATURES)])
+    else:
+        channels = []
+    for i, value in enumerate(channels):
+        if isinstance(value, (int, float)):
+            values[offset + i] = value
+    return values
+
+
+class DeviceState:
+    """Rolling mean/variance per feature for one device"""
+    __slots__ = ('count', 'mean', 'var')
+
+    def __init__(self, size):
+        self.count = np.zeros(size)
+        self.mean = np.zeros(size)
+        self.var = np.zeros(size)
+
+
+class DeviceAnomalyDetector:
+    """Online per-device outlier detector.
+
+    Each feature keeps an exponentially weighted mean and variance. While a
+    feature has fewer than 1/alpha samples the update uses alpha = 1/n, which
+    is exactly Welford's running mean/variance; afterwards it decays with
+    ``alpha`` so the baseline follows slow sensor drift. Scoring and updating
+    are O(1) per measurement and never touch the database.
+    """
+
+    def __init__(self, alpha=0.05, z_threshold=4.0, min_samples=20,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH, checkpoint_interval=60.0):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.states = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one checkpoint file write at a time
+        self._snapshot_seq = 0
+        self._written_seq = 0
+        self._loaded = False
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+
+    def _deviations(self, state, values):
+        """(present, std, diff, z, ready) of a feature vector against a device state"""
+        present = ~np.isnan(values)
+        std = np.sqrt(state.var)
+        diff = np.where(present, values - state.mean, 0.0)
+        ready = present & (state.count >= self.min_samples)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(std > 0, np.abs(diff) / std, np.where(diff != 0, np.inf, 0.0))
+        return present, std, diff, z, ready
+
+    def score(self, device_serial, values):
+        """Score a feature vector against the device baseline without changing it.
+
+        Returns a list of flags, one per outlying feature.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            state = self.states.get(device_serial)
+            if state is None:
+                return []
+            _, std, _, z, ready = self._deviations(state, values)
+            return [
+                {
+                    'feature': FEATURES[i],
+                    'value': float(values[i]),
+                    'expected': round(float(state.mean[i]), 4),
+                    'std': round(float(std[i]), 4),
+                    'z_score': round(float(z[i]), 2) if np.isfinite(z[i]) else None
+                }
+                for i in np.nonzero(ready & (z > self.z_threshold))[0]
+            ]
+
+    def update(self, device_serial, values):
+        """Fold a stored measurement into the device baseline (call once it is committed)"""
+        with self._lock:
+            self._ensure_loaded()
+            state = self.states.get(device_serial)
+            if state is None:
+                state = DeviceState(len(FEATURES))
+                self.states[device_serial] = state
+
+            present, std, diff, z, ready = self._deviations(state, values)
+            # Outliers are folded in clipped to the threshold so a single fault
+            # does not inflate the baseline variance
+            clip = ready & (z > self.z_threshold) & (std > 0)
+            diff = np.where(clip, np.sign(diff) * self.z_threshold * std, diff)
+
+            # Update: alpha = 1/n during warm-up (Welford), then fixed decay
+            state.count = state.count + present
+            alpha = np.where(present, np.maximum(self.alpha, 1.0 / np.maximum(state.count, 1)), 0.0)
+            increment = alpha * diff
+            state.mean = state.mean + increment
+            state.var = np.where(present, (1 - alpha) * (state.var + diff * increment), state.var)
+            self._dirty = True
+
+        self.maybe_checkpoint()
+
+    def score_and_update(self, device_serial, values):
+        """``score`` followed by ``update``; returns the flags"""
+        flags = self.score(device_serial, values)
+        self.update(device_serial, values)
+        return flags
+
+    def baseline(self, device_serial):
+        """Current per-feature baseline for a device (None if unseen)"""
+        with self._lock:
+            self._ensure_loaded()
+            state = self.states.get(device_serial)
+            if state is None:
+                return None
+            return {
+                name: {
+                    'count': int(state.count[i]),
+                    'mean': round(float(state.mean[i]), 4),
+                    'std': round(float(np.sqrt(state.var[i])), 4)
+                }
+                for i, name in enumerate(FEATURES) if state.count[i] > 0
+            }
+
+    def maybe_checkpoint(self):
+        # Checked under the lock so concurrent ingests don't all start a checkpoint
+        with self._lock:
+            due = self._dirty and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+            if due:
+                self._last_checkpoint = time.monotonic()
+        if due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write all device states to disk atomically"""
+        if not self.checkpoint_path:
+            return
+        # Snapshot (copies of the arrays) under the lock; serialize and write outside it
+        with self._lock:
+            snapshot = {
+                'features': FEATURES,
+                'alpha': self.alpha,
+                'devices': {
+                    serial: {
+                        'count': state.count.tolist(),
+                        'mean': state.mean.tolist(),
+                        'var': state.var.tolist()
+                    }
+                    for serial, state in self.states.items()
+                }
+            }
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+
+        with self._write_lock:
+            # A newer snapshot already written by another thread wins
+            if seq < self._written_seq:
+                return
+            directory = os.path.dirname(self.checkpoint_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Per-process temp file: several workers may checkpoint at once (the last replace wins)
+            tmp_path = f'{self.checkpoint_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.checkpoint_path)
+            self._written_seq = seq
+
+    def load(self):
+        """Restore device states from the last checkpoint, if any"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        if snapshot.get('features') != FEATURES:
+            return
+        for serial, data in snapshot.get('devices', {}).items():
+            state = DeviceState(len(FEATURES))
+            state.count = np.asarray(data['count'], dtype=float)
+            state.mean = np.asarray(data['mean'], dtype=float)
+            state.var = np.asarray(data['var'], dtype=float)
+            self.states[serial] = state
+
+
+anomaly_detector = DeviceAnomalyDetector()
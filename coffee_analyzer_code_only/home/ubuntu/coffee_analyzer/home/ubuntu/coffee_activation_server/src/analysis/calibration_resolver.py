@@ -0,0 +1,226 @@
+"""Hierarchical calibration resolution.
+
+Calibration rows are often partial (e.g. an origin row only sets the co2,
+protein and moisture coefficients). The resolver merges every applicable row
+over the global defaults, from most general to most specific:
+
+    built-in defaults
+    -> global unknown row            (type UNKNOWN, origin UNKNOWN)
+    -> global variety default        (origin GLOBAL_ARABICA / GLOBAL_ROBUSTA)
+    -> origin rows, any type         (type UNKNOWN, origin X)
+    -> origin rows for the type      (type T, origin X)
+
+Within each level a row without a variety applies first and the matching
+variety row last. The merged result for every known (type, origin, variety)
+key is precomputed into a dict, so lookups are O(1); the table is rebuilt
+whenever calibration data is written.
+"""
+import threading
+import time
+
+from src.models.calibration_data import CalibrationData
+
+COEFFICIENT_FIELDS = [
+    'co2_coeff', 'co2_offset',
+    'protein_coeff', 'protein_offset',
+    'amino_acids_coeff', 'amino_acids_offset',
+    'minerals_coeff', 'minerals_offset',
+    'flavor_compounds_coeff', 'flavor_compounds_offset',
+    'moisture_coeff', 'moisture_offset',
+]
+
+# Coffee type / origin codes shared with the ESP32 firmware
+COFFEE_TYPE_CODES = {'GREEN': 0, 'ROASTED': 1, 'GROUND': 2, 'UNKNOWN_TYPE': 3}
+COFFEE_ORIGIN_CODES = {
+    'UNKNOWN': 0, 'BRAZIL': 1, 'COLOMBIA': 2, 'COSTA_RICA': 3, 'HONDURAS': 4,
+    'GUATEMALA': 5, 'INDIA': 6, 'INDONESIA': 7, 'VIETNAM': 8, 'PERU': 9,
+    'TANZANIA': 10, 'UGANDA': 11, 'ETHIOPIA': 12, 'IVORY_COAST': 13, 'YEMEN': 14,
+    'SCA': 15, 'GLOBAL_ARABICA': 16, 'GLOBAL_ROBUSTA': 17,
+}
+COFFEE_TYPES = tuple(COFFEE_TYPE_CODES.values())
+TYPE_UNKNOWN = COFFEE_TYPE_CODES['UNKNOWN_TYPE']
+ORIGIN_UNKNOWN = COFFEE_ORIGIN_CODES['UNKNOWN']
+ORIGIN_GLOBAL_ARABICA = COFFEE_ORIGIN_CODES['GLOBAL_ARABICA']
+ORIGIN_GLOBAL_ROBUSTA = COFFEE_ORIGIN_CODES['GLOBAL_ROBUSTA']
+KNOWN_ORIGINS = tuple(COFFEE_ORIGIN_CODES.values())
+GLOBAL_VARIETY_ORIGINS = {'Arabica': ORIGIN_GLOBAL_ARABICA, 'Robusta': ORIGIN_GLOBAL_ROBUSTA}
+
+# Last-resort values when the database has no calibration rows at all
+BUILTIN_DEFAULTS = {
+    'co2_coeff': 0.001,
+    'co2_offset': 0.0,
+    'protein_coeff': 0.001,
+    'protein_offset': 0.0,
+    'amino_acids_coeff': 0.0001,
+    'amino_acids_offset': 0.0,
+    'minerals_coeff': 0.00001,
+    'minerals_offset': 0.0,
+    'flavor_compounds_coeff': 0.000001,
+    'flavor_compounds_offset': 0.0,
+    'moisture_coeff': 0.0001,
+    'moisture_offset': 0.0,
+}
+BUILTIN_TYPE_ADJUSTMENTS = {
+    0: {'moisture_coeff': 0.0005},  # Green coffee
+    1: {'co2_coeff': 0.002},        # Roasted coffee releases more CO2
+}
+
+# Cross-process safety net: other workers pick up writes after this long
+REFRESH_SECONDS = 300
+
+
+def _normalize_variety(variety):
+    if not variety:
+        return None
+    variety = variety.strip()
+    if variety.lower() == 'unknown':
+        return None
+    return variety.capitalize()
+
+
+class CalibrationResolver:
+    """Precomputed (type, origin, variety) -> fully populated calibration dict"""
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._table = None
+        self._built_at = None  # None while the table is the built-in defaults fallback
+        self._rows = {}            # (type, origin, variety) -> {field: value} (non-null only)
+        self._row_ids = {}         # same key -> row id
+        self._origin_variety = {}  # origin -> variety of its rows (for variety-less lookups)
+        self._lock = threading.Lock()
+
+    # --- Building ---
+
+    def rebuild(self, entries=None):
+        """Recompute the lookup table from CalibrationData rows"""
+        return len(self._build(entries))
+
+    def _build(self, entries=None, fresh=True):
+        """Build and install the table; ``fresh=False`` leaves it due for a rebuild on the next lookup"""
+        if entries is None:
+            entries = CalibrationData.query.all()
+
+        rows = {}
+        row_ids = {}
+        origin_variety = {}
+        for entry in entries:
+            variety = _normalize_variety(entry.coffee_variety)
+            key = (entry.coffee_type, entry.coffee_origin, variety)
+            values = {field: getattr(entry, field) for field in COEFFICIENT_FIELDS if getattr(entry, field) is not None}
+            rows.setdefault(key, {}).update(values)
+            row_ids.setdefault(key, []).append(entry.id)
+            if variety and entry.coffee_origin not in (ORIGIN_GLOBAL_ARABICA, ORIGIN_GLOBAL_ROBUSTA):
+                origin_variety.setdefault(entry.coffee_origin, variety)
+
+        varieties = {None} | set(GLOBAL_VARIETY_ORIGINS) | {key[2] for key in rows}
+        origins = set(KNOWN_ORIGINS) | {key[1] for key in rows}
+        types = set(COFFEE_TYPES) | {key[0] for key in rows}
+
+        table = {}
+        with self._lock:
+            self._rows, self._row_ids, self._origin_variety = rows, row_ids, origin_variety
+            for coffee_type in types:
+                for origin in origins:
+                    for variety in varieties:
+                        table[(coffee_type, origin, variety)] = self._merge(coffee_type, origin, variety)
+            self._table = table
+            self._built_at = time.monotonic() if fresh else None
+        return table
+
+    def _layers(self, coffee_type, origin, variety):
+        """Row keys applicable to a lookup, most general first"""
+        if variety is None:
+            variety = self._origin_variety.get(origin)
+        layers = [(TYPE_UNKNOWN, ORIGIN_UNKNOWN, None)]
+
+        global_origin = GLOBAL_VARIETY_ORIGINS.get(variety)
+        if global_origin is not None:
+            layers += [(TYPE_UNKNOWN, global_origin, variety), (coffee_type, global_origin, variety)]
+
+        for layer_type in (TYPE_UNKNOWN, coffee_type):
+            layers.append((layer_type, origin, None))
+            if variety is not None:
+                layers.append((layer_type, origin, variety))
+
+        # Drop duplicates (e.g. when coffee_type is itself UNKNOWN), keeping the most specific position
+        seen = set()
+        ordered = []
+        for key in reversed(layers):
+            if key not in seen:
+                seen.add(key)
+                ordered.append(key)
+        return list(reversed(ordered))
+
+    def _merge(self, coffee_type, origin, variety):
+        values = dict(BUILTIN_DEFAULTS)
+        values.update(BUILTIN_TYPE_ADJUSTMENTS.get(coffee_type, {}))
+        sources = []
+        for key in self._layers(coffee_type, origin, variety):
+            row = self._rows.get(key)
+            if row:
+                values.update(row)
+                sources.extend(self._row_ids[key])
+        return {'values': values, 'sources': sources}
+
+    def invalidate(self):
+        """Rebuild on next lookup (call after calibration writes)"""
+        with self._lock:
+            self._table = None
+
+    # --- Lookup ---
+
+    def _ensure_table(self):
+        """The lookup table, rebuilt when invalidated or stale.
+
+        Callers use the returned reference: ``invalidate()`` may clear
+        ``self._table`` at any moment.
+        """
+        table = self._table
+        if table is not None and self._built_at is not None and \
+                time.monotonic() - self._built_at <= self.refresh_seconds:
+            return table
+        try:
+            return self._build()
+        except Exception:
+            from src.models.calibration_data import db
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            # No app context/database (e.g. offline scripts): built-in defaults only, retried next time
+            if table is None:
+                return self._build(entries=[], fresh=False)
+            if self._built_at is None:
+                return table
+            # Keep the current table and don't retry before the next refresh
+            with self._lock:
+                self._built_at = time.monotonic()
+            return table
+
+    def resolve_with_sources(self, coffee_type=None, coffee_origin=None, coffee_variety=None):
+        """(coefficients, ids of the calibration rows merged into them)"""
+        table = self._ensure_table()
+        coffee_type = TYPE_UNKNOWN if coffee_type is None else coffee_type
+        coffee_origin = ORIGIN_UNKNOWN if coffee_origin is None else coffee_origin
+        key = (coffee_type, coffee_origin, _normalize_variety(coffee_variety))
+
+        entry = table.get(key)
+        if entry is None:
+            # Unseen type/origin/variety: merge on demand and remember it
+            with self._lock:
+                entry = self._merge(*key)
+                table[key] = entry
+        return dict(entry['values']), list(entry['sources'])
+
+    def resolve(self, coffee_type=None, coffee_origin=None, coffee_variety=None):
+        """Fully populated calibration coefficients for a coffee"""
+        return self.resolve_with_sources(coffee_type, coffee_origin, coffee_variety)[0]
+
+    def variety_for_origin(self, coffee_origin):
+        """Variety ('Arabica', 'Robusta') the calibration rows give an origin, or None"""
+        self._ensure_table()
+        return self._origin_variety.get(coffee_origin)
+
+
+calibration_resolver = CalibrationResolver()
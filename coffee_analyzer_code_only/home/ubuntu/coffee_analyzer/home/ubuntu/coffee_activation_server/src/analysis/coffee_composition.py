@@ -96,44 +96,12 @@ def estimate_moisture(nir_readings_dict, calibration_data):
 
 
 # --- Calibration Data Management (Server-side) ---
-# This would be a more complex system in a real application, potentially using a database
-# to store and retrieve calibration models/coefficients based on coffee type and origin.
+# Calibration rows are merged hierarchically (variety/origin/type over the global
+# Arabica/Robusta defaults) by src.analysis.calibration_resolver.
 
-# Placeholder for a function that would load calibration data based on coffee type and origin
-def get_calibration_data_for_coffee(coffee_type, coffee_origin):
+def get_calibration_data_for_coffee(coffee_type, coffee_origin, coffee_variety=None):
     """Retrieves calibration data based on coffee type and origin.
-    This function would interact with a database or a static data store.
-    For now, it returns dummy data.
+    Returns a fully populated coefficient dict from the precomputed resolution table.
     """
-    # In a real system, this would query a database for specific calibration models
-    # or coefficients associated with the given coffee_type and coffee_origin.
-    # The data would come from the extensive research conducted in Phase 1.
-
-    # Dummy data for demonstration. Replace with actual loaded data.
-    calibration_data = {
-        'co2_coeff': 0.001,
-        'co2_offset': 0.0,
-        'protein_coeff': 0.001,
-        'protein_offset': 0.0,
-        'amino_acids_coeff': 0.0001,
-        'amino_acids_offset': 0.0,
-        'minerals_coeff': 0.00001,
-        'minerals_offset': 0.0,
-        'flavor_compounds_coeff': 0.000001,
-        'flavor_compounds_offset': 0.0,
-        'moisture_coeff': 0.0001,
-        'moisture_offset': 0.0,
-    }
-
-    # Example of how coefficients might vary by type/origin (simplified)
-    if coffee_type == 0: # Green Coffee
-        calibration_data['moisture_coeff'] = 0.0005
-    elif coffee_type == 1: # Roasted Coffee
-        calibration_data['co2_coeff'] = 0.002 # Roasted coffee might have different CO2 release
-    
-    # More specific adjustments based on origin would go here
-    # e.g., if coffee_origin == 'Brazil': calibration_data['protein_coeff'] = 0.0012
-
-    return calibration_data
-
-
+    from src.analysis.calibration_resolver import calibration_resolver
+    return calibration_resolver.resolve(coffee_type, coffee_origin, coffee_variety)
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets point selection.
+
+    Returns the indices of at most ``threshold`` points from the series (x, y)
+    that best preserve its visual shape. ``x`` must be sorted ascending.
+    The first and last points are always kept.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold <= 2:
+        return np.array([0, n - 1]) if threshold == 2 else np.array([0])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Interior points are split into (threshold - 2) buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if end <= start:
+            end = start + 1
+
+        # Average of the next bucket (or the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Pick the point forming the largest triangle with the previous pick and next average
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def lttb(x, y, threshold):
+    """Downsample (x, y) with LTTB; returns the reduced (x, y) arrays"""
+    indices = lttb_indices(x, y, threshold)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
@@ -0,0 +1,277 @@
+"""Vectorized quality scoring against the chemical reference ranges.
+
+The ``chemical_reference_ranges`` table (written by src/load_calibration_data.py)
+is read into dense NumPy arrays indexed by (variety, region, component), and
+re-read every ``REFRESH_SECONDS``. ``coffee_chemical_data.json`` is used only
+while that table is empty. Region rows missing a component inherit the
+variety's ``general`` range, and an extra ``*`` variety holds the envelope of
+all varieties for coffees whose variety is unknown.
+
+A measurement's quality score (0-100) is the mean over the scored components:
+100 inside the reference range, falling linearly to 0 one range-width outside
+it. Components without a reference range (CO2, amino acids, flavor compounds)
+are not scored; a measurement with none of the scored estimates gets None.
+"""
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from src.analysis.reference_ranges import DEFAULT_CHEMICAL_DATA_PATH, load_reference_ranges
+from src.analysis.calibration_resolver import COFFEE_ORIGIN_CODES, calibration_resolver
+
+# Measurement estimate -> reference component
+SCORED_COMPONENTS = {
+    'estimated_protein': 'proteins_percent',
+    'estimated_moisture': 'moisture_percent',
+    'estimated_minerals': 'minerals_ash_percent',
+}
+
+GENERAL_REGION = 'general'
+ANY_VARIETY = '*'
+# Single-value references (e.g. "2.09") get a tolerance of 10% of the value
+MIN_RELATIVE_WIDTH = 0.1
+REFRESH_SECONDS = 300
+
+
+class ReferenceRangeTable:
+    """Dense (variety, region, component) -> (min, max) arrays; NaN where no range exists"""
+
+    def __init__(self, ranges):
+        varieties = sorted({variety for variety, _, _, _, _ in ranges})
+        regions = [GENERAL_REGION] + sorted({region for _, region, _, _, _ in ranges} - {GENERAL_REGION})
+        components = sorted({component for _, _, component, _, _ in ranges})
+
+        self.varieties = {name: i for i, name in enumerate(varieties + [ANY_VARIETY])}
+        self.regions = {name: i for i, name in enumerate(regions)}
+        self.components = {name: i for i, name in enumerate(components)}
+
+        shape = (len(self.varieties), len(self.regions), len(self.components))
+        self.low = np.full(shape, np.nan)
+        self.high = np.full(shape, np.nan)
+        for variety, region, component, low, high in ranges:
+            index = (self.varieties[variety], self.regions[region], self.components[component])
+            self.low[index] = low
+            self.high[index] = high
+
+        # Regional rows fall back to the variety's general range
+        general = self.regions[GENERAL_REGION]
+        for array in (self.low, self.high):
+            array[:] = np.where(np.isnan(array), array[:, general:general + 1, :], array)
+
+        # Unknown variety: widest range any variety allows
+        known = slice(0, len(varieties))
+        any_index = self.varieties[ANY_VARIETY]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN slices
+            self.low[any_index] = np.nanmin(self.low[known], axis=0) if varieties else np.nan
+            self.high[any_index] = np.nanmax(self.high[known], axis=0) if varieties else np.nan
+
+        # Origin code -> region index (e.g. ETHIOPIA -> ethiopia_southwest), general otherwise
+        self.origin_regions = np.full(max(COFFEE_ORIGIN_CODES.values()) + 1, general, dtype=np.intp)
+        for name, code in COFFEE_ORIGIN_CODES.items():
+            prefix = name.lower()
+            for region, region_index in self.regions.items():
+                if region == prefix or region.startswith(prefix + '_'):
+                    self.origin_regions[code] = region_index
+                    break
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.low[:-1])))
+
+    def variety_index(self, variety):
+        return self.varieties.get((variety or '').lower(), self.varieties[ANY_VARIETY])
+
+    def region_indices(self, origins):
+        """Region index per origin code (None/unknown codes -> general)"""
+        origins = np.asarray([-1 if o is None else o for o in origins], dtype=np.intp)
+        known = (origins >= 0) & (origins < len(self.origin_regions))
+        regions = np.full(len(origins), self.regions[GENERAL_REGION], dtype=np.intp)
+        regions[known] = self.origin_regions[origins[known]]
+        return regions
+
+    def bounds(self, variety_indices, region_indices, components):
+        """(low, high) arrays of shape (rows, len(components)); NaN where no range applies"""
+        columns = np.array([self.components.get(c, -1) for c in components], dtype=np.intp)
+        low = np.full((len(variety_indices), len(columns)), np.nan)
+        high = np.full_like(low, np.nan)
+        present = columns >= 0
+        if present.any():
+            rows = (np.asarray(variety_indices)[:, None], np.asarray(region_indices)[:, None], columns[present][None, :])
+            low[:, present] = self.low[rows]
+            high[:, present] = self.high[rows]
+        return low, high
+
+
+def score_values(values, low, high):
+    """Per-row quality score from (rows, components) values and bounds; NaN where nothing was scored"""
+    values = np.asarray(values, dtype=float)
+    width = np.maximum(high - low, MIN_RELATIVE_WIDTH * np.abs(high))
+    width = np.where(width > 0, width, 1.0)
+    distance = np.maximum(low - values, 0.0) + np.maximum(values - high, 0.0)
+    component_scores = np.clip(1.0 - distance / width, 0.0, 1.0) * 100.0
+
+    scored = ~np.isnan(values) & ~np.isnan(low)
+    counts = scored.sum(axis=1)
+    totals = np.where(scored, component_scores, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, np.round(totals / counts, 1), np.nan)
+
+
+def _file_ranges(path):
+    try:
+        return load_reference_ranges(path)[0]
+    except (OSError, ValueError):
+        return []
+
+
+class QualityScorer:
+    """Scores measurement estimates against the reference range table (refreshed periodically)"""
+
+    def __init__(self, path=DEFAULT_CHEMICAL_DATA_PATH, refresh_seconds=REFRESH_SECONDS):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._table = None
+        self._built_at = None  # None: due for a load (first use or invalidated)
+        self._fallback = False  # the table came from the file because the database failed
+        self._lock = threading.Lock()
+
+    def load(self, path=None):
+        """Build the range table from chemical_reference_ranges, or the reference file while it is empty.
+
+        Needs an app context; raises if the table can't be read. No ranges
+        at all leaves scoring disabled.
+        """
+        from src.models.chemical_reference import ChemicalReferenceRange
+
+        ranges = [tuple(row) for row in ChemicalReferenceRange.query.with_entities(
+            ChemicalReferenceRange.variety, ChemicalReferenceRange.region, ChemicalReferenceRange.component,
+            ChemicalReferenceRange.min_value, ChemicalReferenceRange.max_value
+        )]
+        table = ReferenceRangeTable(ranges or _file_ranges(path or self.path))
+        with self._lock:
+            self._table = table
+            self._built_at = time.monotonic()
+            self._fallback = False
+        return table
+
+    def invalidate(self):
+        """Reload on next use (call after reference range writes)"""
+        with self._lock:
+            self._built_at = None
+
+    @property
+    def table(self):
+        table = self._table
+        built_at = self._built_at
+        if table is not None and built_at is not None and time.monotonic() - built_at <= self.refresh_seconds:
+            return table
+        try:
+            return self.load()
+        except Exception:
+            from src.models.chemical_reference import db
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            if table is not None and not self._fallback:
+                # Keep the current ranges and don't retry before the next refresh
+                with self._lock:
+                    self._built_at = time.monotonic()
+                return table
+            # No database (e.g. offline scripts): the reference file until the table can be read
+            if table is None:
+                table = ReferenceRangeTable(_file_ranges(self.path))
+            with self._lock:
+                self._table = table
+                self._fallback = True
+            return table
+
+    def _variety_indices(self, origins):
+        table = self.table
+        by_origin = {
+            origin: table.variety_index(calibration_resolver.variety_for_origin(origin))
+            for origin in set(origins)
+        }
+        return np.array([by_origin[origin] for origin in origins], dtype=np.intp)
+
+    def score_columns(self, origins, columns):
+        """Scores for a batch given coffee_origin codes and {estimate attribute: values}"""
+        origins = list(origins)
+        if not origins:
+            return np.empty(0)
+        table = self.table
+        attributes = [a for a in SCORED_COMPONENTS if a in columns]
+        values = np.array(
+            [[np.nan if v is None else v for v in columns[a]] for a in attributes], dtype=float
+        ).T.reshape(len(origins), len(attributes))
+        low, high = table.bounds(
+            self._variety_indices(origins), table.region_indices(origins),
+            [SCORED_COMPONENTS[a] for a in attributes]
+        )
+        return score_values(values, low, high)
+
+    def score_measurement(self, measurement):
+        """Quality score for one Measurement, or None if none of its estimates can be scored"""
+        columns = {attribute: [getattr(measurement, attribute)] for attribute in SCORED_COMPONENTS}
+        score = self.score_columns([measurement.coffee_origin], columns)[0]
+        return None if np.isnan(score) else float(score)
+
+
+quality_scorer = QualityScorer()
+
+
+def rescore_measurements(session, only_missing=True, device_serial=None, batch_size=5000, dry_run=False):
+    """Score stored measurements in id-ordered batches; returns (rows read, rows scored).
+
+    The daily aggregates of every rescored (device, day) are recomputed and
+    the devices' cached responses invalidated. The fleet rollup is not
+    touched: rebuild it afterwards (src/rebuild_fleet_rollup.py).
+    """
+    from sqlalchemy import update
+    from src.models.daily_aggregate import day_for, refresh_day
+    from src.models.measurement import Measurement
+    from src.monitoring.response_cache import response_cache, measurements_scope
+
+    attributes = list(SCORED_COMPONENTS)
+    columns = [Measurement.id, Measurement.device_serial, Measurement.timestamp, Measurement.coffee_origin] + \
+        [getattr(Measurement, a) for a in attributes]
+    filters = []
+    if only_missing:
+        filters.append(Measurement.quality_score.is_(None))
+    if device_serial:
+        filters.append(Measurement.device_serial == device_serial)
+
+    read = scored = 0
+    last_id = 0
+    touched_days = set()
+    while True:
+        rows = session.query(*columns).filter(Measurement.id > last_id, *filters) \
+            .order_by(Measurement.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        read += len(rows)
+
+        ids, serials, timestamps, origins, *values = zip(*rows)
+        scores = quality_scorer.score_columns(origins, dict(zip(attributes, values)))
+        updates = []
+        for row_id, serial, timestamp, score in zip(ids, serials, timestamps, scores):
+            if np.isnan(score):
+                continue
+            updates.append({'id': row_id, 'quality_score': float(score)})
+            if timestamp is not None:
+                touched_days.add((serial, day_for(timestamp)))
+        scored += len(updates)
+        if updates and not dry_run:
+            session.execute(update(Measurement), updates)
+            session.commit()
+
+    if touched_days and not dry_run:
+        for serial, day in sorted(touched_days):
+            refresh_day(session, serial, day)
+        session.commit()
+        # Effective across processes with a shared (redis) response cache; the memory backend relies on its TTL
+        response_cache.bump(*sorted({measurements_scope(serial) for serial, _ in touched_days}))
+    return read, scored
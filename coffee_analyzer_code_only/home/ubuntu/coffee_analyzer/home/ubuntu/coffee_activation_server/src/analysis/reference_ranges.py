@@ -0,0 +1,78 @@
+"""Reference composition ranges from ``coffee_chemical_data.json``.
+
+The file nests ``variety -> region -> component`` with values such as
+``"0.8 - 1.4"`` (a range), ``"2.09"`` (a single value) or non-numeric notes
+(``"present"``, ``true``) which are skipped.
+"""
+import json
+import os
+import re
+
+DEFAULT_CHEMICAL_DATA_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'coffee_chemical_data.json'
+))
+
+_NUMBER = r'[-+]?\d+(?:\.\d+)?'
+RANGE_PATTERN = re.compile(rf'^\s*({_NUMBER})\s*(?:-|–|to)\s*({_NUMBER})\s*$')
+VALUE_PATTERN = re.compile(rf'^\s*({_NUMBER})\s*$')
+
+
+def parse_range(value):
+    """``"0.8 - 1.4"`` -> (0.8, 1.4), ``"2.09"`` -> (2.09, 2.09); None if not numeric"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value), float(value)
+    if not isinstance(value, str):
+        return None
+    match = RANGE_PATTERN.match(value)
+    if match:
+        low, high = float(match.group(1)), float(match.group(2))
+        return (low, high) if low <= high else (high, low)
+    match = VALUE_PATTERN.match(value)
+    if match:
+        number = float(match.group(1))
+        return number, number
+    return None
+
+
+def parse_reference_data(data):
+    """(variety, region, component, min, max) for every numeric leaf, plus the skipped paths"""
+    skipped = []
+    ranges = []
+    for variety, regions in data.items():
+        if not isinstance(regions, dict):
+            skipped.append(variety)
+            continue
+        for region, components in regions.items():
+            if not isinstance(components, dict):
+                skipped.append(f'{variety}.{region}')
+                continue
+            for component, value in components.items():
+                parsed = parse_range(value)
+                if parsed is None:
+                    skipped.append(f'{variety}.{region}.{component}')
+                    continue
+                ranges.append((variety.lower(), region.lower(), component.lower(), parsed[0], parsed[1]))
+    return ranges, skipped
+
+
+def load_reference_ranges(path=DEFAULT_CHEMICAL_DATA_PATH):
+    """Parse a chemical reference JSON file or a CSV with variety,region,component,min_value,max_value"""
+    if path.lower().endswith('.csv'):
+        import csv
+        ranges = []
+        skipped = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    low, high = float(row['min_value']), float(row['max_value'])
+                except (KeyError, TypeError, ValueError):
+                    skipped.append(str(row))
+                    continue
+                ranges.append((row['variety'].strip().lower(), row['region'].strip().lower(),
+                               row['component'].strip().lower(), min(low, high), max(low, high)))
+        return ranges, skipped
+
+    with open(path) as f:
+        return parse_reference_data(json.load(f))
@@ -0,0 +1,463 @@
+"""Nearest-neighbour index over measurement NIR spectra.
+
+Every measurement's 11 NIR channels are SNV-normalized (per-spectrum mean 0,
+std 1, removing baseline offset and scatter scaling), optionally projected
+onto the leading PCA components, and stored as float32 rows alongside the
+measurement id, device and coffee type/origin. Queries are exact: a blocked
+brute-force scan computes squared distances block by block with one
+matrix-vector product and keeps the top k with ``argpartition``.
+
+The arrays are checkpointed as ``.npy`` files and reopened memory-mapped, so
+a restart does not re-parse the measurements table. Rows stored by other
+worker processes are picked up by ``maybe_sync`` at most every
+``SYNC_INTERVAL_SECONDS``. It lists only ids above its own watermark (plus
+recent gaps below it, for rows committed out of id order), and reads spectra
+only for ids not yet indexed. Checkpoints from several workers are serialized
+with a lock file.
+
+``rebuild`` indexes archived measurements as well (src/models/measurement_archive.py).
+Such rows are no longer served by ``GET /measurements/<id>``, so the search
+route leaves them out unless they are asked for.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from src.analysis.anomaly_detection import NIR_FEATURES
+
+DEFAULT_INDEX_DIR = os.environ.get(
+    'SPECTRAL_INDEX_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'spectral_index')
+)
+INDEX_VERSION = 1
+SEARCH_BLOCK_SIZE = 65536
+SYNC_INTERVAL_SECONDS = 5.0
+# Ids missing below the watermark (not yet committed by another worker) are
+# re-checked for this long, at most MAX_TRACKED_GAPS of them
+GAP_RETRY_SECONDS = 60.0
+MAX_TRACKED_GAPS = 10000
+FETCH_CHUNK_SIZE = 500
+NO_VALUE = -1
+
+ARRAY_TYPES = {
+    'ids': np.int64,
+    'vectors': np.float32,
+    'norms': np.float32,
+    'devices': np.int32,
+    'coffee_types': np.int16,
+    'coffee_origins': np.int16,
+}
+
+
+def spectrum_vector(nir_readings):
+    """The 11 channels as floats from a dict (channel0..channel10), list or JSON text; None if any is missing"""
+    if isinstance(nir_readings, str):
+        try:
+            nir_readings = json.loads(nir_readings)
+        except ValueError:
+            return None
+    if isinstance(nir_readings, dict):
+        channels = [nir_readings.get(name) for name in NIR_FEATURES]
+    elif isinstance(nir_readings, (list, tuple, np.ndarray)):
+        channels = [v.item() if isinstance(v, np.generic) else v for v in nir_readings[:len(NIR_FEATURES)]]
+    else:
+        return None
+    if len(channels) < len(NIR_FEATURES) or \
+            not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in channels):
+        return None
+    return np.asarray(channels, dtype=np.float64)
+
+
+def snv(vectors):
+    """Standard normal variate of each spectrum (row)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+    mean = vectors.mean(axis=1, keepdims=True)
+    std = vectors.std(axis=1, keepdims=True)
+    return (vectors - mean) / np.where(std > 0, std, 1.0)
+
+
+def fit_pca(normalized, components):
+    """(mean, basis) keeping the leading principal components of SNV spectra"""
+    mean = normalized.mean(axis=0)
+    covariance = np.cov(normalized - mean, rowvar=False)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:components]
+    return mean, eigenvectors[:, order]
+
+
+class SpectralIndex:
+    """Append-only spectral vectors with exact, filtered top-k search"""
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR, checkpoint_interval=300.0, block_size=SEARCH_BLOCK_SIZE,
+                 sync_interval=SYNC_INTERVAL_SECONDS):
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self.block_size = block_size
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._reset()
+        self._loaded = False
+        self._last_checkpoint = time.monotonic()
+
+    def _reset(self, pca=None):
+        self._arrays = None
+        self._size = 0
+        self._device_codes = {}
+        self._device_names = []
+        self._pca_mean, self._pca_basis = pca if pca else (None, None)
+        self.max_id = 0
+        self.synced_id = 0  # every row up to here has been seen by sync (except tracked gaps)
+        self._gaps = {}     # id missing below synced_id -> when it was first missed
+        self._synced_at = None
+        self._dirty = False
+        self._needs_backfill = True
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dimension(self):
+        return self._pca_basis.shape[1] if self._pca_basis is not None else len(NIR_FEATURES)
+
+    # --- Building ---
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+
+    def _reserve(self, extra):
+        """Grow (and, after a memory-mapped load, materialize) the arrays"""
+        capacity = len(self._arrays['ids']) if self._arrays is not None else 0
+        needed = self._size + extra
+        if self._arrays is not None and capacity >= needed and \
+                not isinstance(self._arrays['ids'], np.memmap):
+            return
+        capacity = max(1024, needed * 2)
+        arrays = {}
+        for name, dtype in ARRAY_TYPES.items():
+            shape = (capacity, self.dimension) if name == 'vectors' else (capacity,)
+            arrays[name] = np.empty(shape, dtype=dtype)
+            if self._arrays is not None:
+                arrays[name][:self._size] = self._arrays[name][:self._size]
+        self._arrays = arrays
+
+    def _project(self, raw):
+        normalized = snv(raw)
+        if self._pca_basis is not None:
+            normalized = (normalized - self._pca_mean) @ self._pca_basis
+        return normalized.astype(np.float32)
+
+    def _device_code(self, device_serial):
+        code = self._device_codes.get(device_serial)
+        if code is None:
+            code = len(self._device_names)
+            self._device_codes[device_serial] = code
+            self._device_names.append(device_serial)
+        return code
+
+    def _append(self, ids, devices, coffee_types, coffee_origins, raw):
+        if not ids:
+            return 0
+        vectors = self._project(np.asarray(raw))
+        count = len(ids)
+        with self._lock:
+            self._reserve(count)
+            rows = slice(self._size, self._size + count)
+            self._arrays['ids'][rows] = ids
+            self._arrays['vectors'][rows] = vectors
+            self._arrays['norms'][rows] = np.einsum('ij,ij->i', vectors, vectors)
+            self._arrays['devices'][rows] = [self._device_code(d) for d in devices]
+            self._arrays['coffee_types'][rows] = [NO_VALUE if t is None else t for t in coffee_types]
+            self._arrays['coffee_origins'][rows] = [NO_VALUE if o is None else o for o in coffee_origins]
+            self._size += count
+            self.max_id = max(self.max_id, int(max(ids)))
+            self._dirty = True
+        return count
+
+    def add_rows(self, rows):
+        """Index (id, device_serial, coffee_type, coffee_origin, nir_data) rows; returns the number added"""
+        columns = ([], [], [], [], [])
+        for row_id, device_serial, coffee_type, coffee_origin, nir_data in rows:
+            vector = spectrum_vector(nir_data)
+            if vector is None:
+                continue
+            for column, value in zip(columns, (row_id, device_serial, coffee_type, coffee_origin, vector)):
+                column.append(value)
+        return self._append(*columns)
+
+    def add(self, measurement):
+        """Index one stored measurement (called after the ingest commit)"""
+        self._ensure_loaded()
+        added = self.add_rows([(measurement.id, measurement.device_serial, measurement.coffee_type,
+                                measurement.coffee_origin, measurement.nir_data)])
+        self.maybe_checkpoint()
+        return bool(added)
+
+    @staticmethod
+    def _columns():
+        from src.models.measurement import Measurement
+        return (Measurement.id, Measurement.device_serial, Measurement.coffee_type,
+                Measurement.coffee_origin, Measurement.nir_data)
+
+    def _row_query(self, session, lower_id):
+        from src.models.measurement import Measurement
+        return session.query(*self._columns()).filter(Measurement.id > lower_id).order_by(Measurement.id)
+
+    def _known(self, ids):
+        """Mask of the ids that are already indexed"""
+        with self._lock:
+            indexed = self._arrays['ids'][:self._size] if self._arrays is not None else np.empty(0, np.int64)
+        return np.isin(np.asarray(ids, dtype=np.int64), indexed)
+
+    def maybe_sync(self, session):
+        """``sync`` unless one ran within the last ``sync_interval`` seconds"""
+        if self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_interval:
+            return 0
+        return self.sync(session)
+
+    def sync(self, session, batch_size=5000):
+        """Index rows stored since the last sync (by this or another worker); returns the number added"""
+        from src.models.measurement import Measurement
+
+        self._ensure_loaded()
+        now = time.monotonic()
+        backfill = self._needs_backfill
+        last_id = 0 if backfill else self.synced_id
+
+        # Ids only: rows this worker indexed at ingest are not read again
+        listed = []
+        while True:
+            ids = [row_id for (row_id,) in session.query(Measurement.id).filter(Measurement.id > last_id)
+                   .order_by(Measurement.id).limit(batch_size)]
+            if not ids:
+                break
+            if not backfill:
+                previous = last_id
+                for row_id in ids:
+                    for gap in range(previous + 1, min(row_id, previous + 1 + MAX_TRACKED_GAPS - len(self._gaps))):
+                        self._gaps.setdefault(gap, now)
+                    previous = row_id
+            listed.extend(ids)
+            last_id = ids[-1]
+
+        # Skipped ids may still be committed by a slower worker; give up on them after a while
+        self._gaps = {gap: seen for gap, seen in self._gaps.items() if now - seen < GAP_RETRY_SECONDS}
+        candidates = listed + list(self._gaps)
+        missing = [row_id for row_id, known in zip(candidates, self._known(candidates)) if not known] \
+            if candidates else []
+
+        added = 0
+        for start in range(0, len(missing), FETCH_CHUNK_SIZE):
+            chunk = missing[start:start + FETCH_CHUNK_SIZE]
+            rows = session.query(*self._columns()).filter(Measurement.id.in_(chunk)).all()
+            for row in rows:
+                self._gaps.pop(row[0], None)
+            added += self.add_rows(rows)
+        self.synced_id = max(self.synced_id, last_id)
+        self._needs_backfill = False
+        self._synced_at = now
+        return added
+
+    def rebuild(self, session, pca_components=None, batch_size=5000):
+        """Re-index every measurement, hot and archived, fitting PCA first when ``pca_components`` is set"""
+        from src.models.device import Device
+        from src.models.measurement import Measurement
+        from src.models.measurement_archive import measurement_archive
+
+        columns = ([], [], [], [], [])
+
+        def collect(rows):
+            for row_id, device_serial, coffee_type, coffee_origin, nir_data in rows:
+                vector = spectrum_vector(nir_data)
+                if vector is not None:
+                    for column, value in zip(columns, (row_id, device_serial, coffee_type, coffee_origin, vector)):
+                        column.append(value)
+
+        hot_ids = set()
+        last_id = 0
+        while True:
+            rows = self._row_query(session, last_id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            hot_ids.update(row[0] for row in rows)
+            collect(rows)
+
+        serials = {serial for (serial,) in session.query(Measurement.device_serial).distinct()}
+        serials.update(serial for (serial,) in session.query(Device.device_serial))
+        names = ['id', 'device_serial', 'coffee_type', 'coffee_origin', 'nir_data']
+        for serial in sorted(serials):
+            collect(row for row in measurement_archive.read(serial, names) if row[0] not in hot_ids)
+
+        pca = None
+        if pca_components and columns[0]:
+            components = max(1, min(int(pca_components), len(NIR_FEATURES)))
+            pca = fit_pca(snv(np.asarray(columns[4])), components)
+        with self._lock:
+            self._reset(pca)
+            self._loaded = True
+            self._append(*columns)
+            self.synced_id = max(self.max_id, last_id)
+            self._needs_backfill = False
+        self.checkpoint()
+        return self._size
+
+    # --- Search ---
+
+    def search(self, nir_readings, k=10, device_serial=None, coffee_type=None, coffee_origin=None,
+               exclude_id=None):
+        """Exact top-k (measurement_id, distance) pairs, nearest first"""
+        self._ensure_loaded()
+        raw = spectrum_vector(nir_readings)
+        if raw is None:
+            raise ValueError('incomplete NIR spectrum')
+        query = self._project(raw)[0]
+
+        with self._lock:
+            size = self._size
+            if not size:
+                return []
+            arrays = {name: array[:size] for name, array in self._arrays.items()}
+            device_code = self._device_codes.get(device_serial) if device_serial else None
+        if device_serial and device_code is None:
+            return []
+
+        mask = None
+        for values, wanted in ((arrays['devices'], device_code),
+                               (arrays['coffee_types'], coffee_type),
+                               (arrays['coffee_origins'], coffee_origin)):
+            if wanted is not None:
+                mask = values == wanted if mask is None else mask & (values == wanted)
+        if exclude_id is not None:
+            excluded = arrays['ids'] != exclude_id
+            mask = excluded if mask is None else mask & excluded
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        total = size if candidates is None else len(candidates)
+        if not total:
+            return []
+
+        query_norm = float(query @ query)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, total, self.block_size):
+            if candidates is None:
+                rows = np.arange(start, min(start + self.block_size, total))
+                block = arrays['vectors'][start:start + self.block_size]
+                norms = arrays['norms'][start:start + self.block_size]
+            else:
+                rows = candidates[start:start + self.block_size]
+                block = arrays['vectors'][rows]
+                norms = arrays['norms'][rows]
+            distances = norms - 2.0 * (block @ query) + query_norm
+            if len(distances) > k:
+                keep = np.argpartition(distances, k)[:k]
+                rows, distances = rows[keep], distances[keep]
+            best_rows = np.concatenate([best_rows, rows])
+            best_distances = np.concatenate([best_distances, distances])
+            if len(best_distances) > k:
+                keep = np.argpartition(best_distances, k)[:k]
+                best_rows, best_distances = best_rows[keep], best_distances[keep]
+
+        order = np.argsort(best_distances, kind='stable')
+        return [
+            (int(arrays['ids'][row]), float(np.sqrt(max(distance, 0.0))))
+            for row, distance in zip(best_rows[order], best_distances[order])
+        ]
+
+    def stats(self):
+        return {
+            'indexed': self._size,
+            'devices': len(self._device_names),
+            'dimension': self.dimension,
+            'pca': self._pca_basis is not None,
+            'max_id': self.max_id
+        }
+
+    # --- Persistence ---
+
+    def maybe_checkpoint(self):
+        if self._dirty and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write the arrays as .npy files (metadata last, so a partial write is never loaded)"""
+        if not self.directory:
+            return
+        with self._lock:
+            size = self._size
+            arrays = {name: array[:size] for name, array in self._arrays.items()} if size else {}
+            meta = {
+                'version': INDEX_VERSION,
+                'size': size,
+                'max_id': self.max_id,
+                'synced_id': self.synced_id,
+                'devices': list(self._device_names),
+                'pca_mean': self._pca_mean.tolist() if self._pca_mean is not None else None,
+                'pca_basis': self._pca_basis.tolist() if self._pca_basis is not None else None,
+            }
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+        os.makedirs(self.directory, exist_ok=True)
+        # One writer at a time across worker processes, so arrays and metadata come from the same index
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            tmp_suffix = f'.{os.getpid()}.tmp'
+            for name, array in arrays.items():
+                path = os.path.join(self.directory, f'{name}.npy')
+                with open(path + tmp_suffix, 'wb') as f:
+                    np.save(f, array)
+                os.replace(path + tmp_suffix, path)
+            meta_path = os.path.join(self.directory, 'meta.json')
+            with open(meta_path + tmp_suffix, 'w') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + tmp_suffix, meta_path)
+
+    def load(self):
+        """Reopen the last checkpoint memory-mapped; without one, the next sync indexes everything"""
+        meta_path = os.path.join(self.directory or '', 'meta.json')
+        if not self.directory or not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION:
+                return False
+            size = meta['size']
+            arrays = {}
+            if size:
+                for name in ARRAY_TYPES:
+                    array = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+                    if len(array) < size:
+                        return False
+                    arrays[name] = array[:size]
+        except (OSError, ValueError, KeyError):
+            return False
+
+        pca = None
+        if meta.get('pca_basis') is not None:
+            pca = (np.asarray(meta['pca_mean']), np.asarray(meta['pca_basis']))
+        with self._lock:
+            self._reset(pca)
+            if size:
+                self._arrays = arrays
+            self._size = size
+            self.max_id = meta['max_id']
+            self.synced_id = meta.get('synced_id', meta['max_id'])
+            self._device_names = list(meta['devices'])
+            self._device_codes = {name: i for i, name in enumerate(self._device_names)}
+            self._needs_backfill = False
+        return True
+
+
+spectral_index = SpectralIndex()
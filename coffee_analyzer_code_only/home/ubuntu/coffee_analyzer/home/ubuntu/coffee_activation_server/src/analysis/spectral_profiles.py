@@ -0,0 +1,97 @@
+"""Full-spectrum blend profile signatures and Mahalanobis matching.
+
+A profile's spectral signature is the per-channel mean and covariance of its
+samples' 11 NIR channels, stored as raw float64 bytes. Blend profiles usually
+hold fewer samples than channels, so the sample covariance is shrunk towards
+its diagonal and floored at a small relative noise level; the result is
+always positive definite.
+
+Matching computes the Mahalanobis distance of every sample to a profile with
+one triangular solve against the profile's Cholesky factor, which is cached
+per profile and recomputed only when the stored covariance changes.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from scipy.linalg import solve_triangular
+except ImportError:
+    solve_triangular = None
+
+from src.analysis.anomaly_detection import NIR_FEATURES
+
+SPECTRUM_CHANNELS = len(NIR_FEATURES)
+# Floor for each channel's standard deviation, relative to the channel mean
+RELATIVE_NOISE_FLOOR = 0.01
+CHOLESKY_CACHE_SIZE = 4096
+
+
+def encode_array(values, dtype=np.float64):
+    """Compact bytes representation of a numeric array"""
+    return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+
+def decode_array(blob, dtype=np.float64, shape=None):
+    if not blob:
+        return None
+    array = np.frombuffer(blob, dtype=dtype)
+    return array.reshape(shape) if shape is not None else array
+
+
+def spectral_signature(spectra):
+    """(mean, covariance) of sample spectra, shrunk towards the diagonal and noise-floored"""
+    spectra = np.asarray(spectra, dtype=np.float64).reshape(-1, SPECTRUM_CHANNELS)
+    count = len(spectra)
+    mean = spectra.mean(axis=0)
+    sample_covariance = np.cov(spectra, rowvar=False) if count > 1 else np.zeros((SPECTRUM_CHANNELS,) * 2)
+
+    # Shrinkage weight grows as samples get scarce relative to channels
+    shrinkage = SPECTRUM_CHANNELS / (count + SPECTRUM_CHANNELS)
+    covariance = (1 - shrinkage) * sample_covariance + shrinkage * np.diag(np.diag(sample_covariance))
+    floor = (RELATIVE_NOISE_FLOOR * np.maximum(np.abs(mean), 1.0)) ** 2
+    covariance[np.diag_indices(SPECTRUM_CHANNELS)] += floor
+    return mean, covariance
+
+
+class CholeskyCache:
+    """profile_id -> lower Cholesky factor, keyed on the stored covariance bytes"""
+
+    def __init__(self, max_entries=CHOLESKY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def factor(self, profile_id, covariance_blob):
+        with self._lock:
+            entry = self._entries.get(profile_id)
+            if entry is not None and entry[0] == covariance_blob:
+                self._entries.move_to_end(profile_id)
+                return entry[1]
+
+        covariance = decode_array(covariance_blob, shape=(SPECTRUM_CHANNELS, SPECTRUM_CHANNELS))
+        factor = np.linalg.cholesky(covariance)
+        with self._lock:
+            self._entries[profile_id] = (covariance_blob, factor)
+            self._entries.move_to_end(profile_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return factor
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cholesky_cache = CholeskyCache()
+
+
+def mahalanobis_distances(spectra, mean, factor):
+    """Mahalanobis distance of each spectrum (row) to a profile, via one triangular solve"""
+    diff = (np.atleast_2d(spectra) - mean).T
+    if solve_triangular is not None:
+        z = solve_triangular(factor, diff, lower=True, check_finite=False)
+    else:
+        z = np.linalg.solve(factor, diff)
+    return np.sqrt((z ** 2).sum(axis=0))
@@ -0,0 +1,51 @@
+"""Move old measurements from the database into the Parquet archive.
+
+Measurements older than the retention age are written to one compressed
+Parquet file per device per month and deleted from the measurements table.
+Safe to re-run; run it periodically (e.g. nightly from cron).
+
+Example:
+    python src/archive_measurements.py --older-than-days 180
+"""
+import argparse
+import os
+import sys
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.measurement_archive import (
+    DEFAULT_RETENTION_DAYS, MeasurementArchive, archive_measurements, measurement_archive
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive old measurements to per-device monthly Parquet files.')
+    parser.add_argument('--older-than-days', type=int, default=DEFAULT_RETENTION_DAYS,
+                        help=f'Archive measurements older than this many days (default {DEFAULT_RETENTION_DAYS})')
+    parser.add_argument('--device-serial', help='Only archive this device')
+    parser.add_argument('--archive-dir', help=f'Archive root (default {measurement_archive.root})')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without changing anything')
+    args = parser.parse_args(argv)
+
+    archive = MeasurementArchive(args.archive_dir) if args.archive_dir else measurement_archive
+
+    app = create_app()
+    with app.app_context():
+        summary = archive_measurements(
+            older_than_days=args.older_than_days,
+            device_serial=args.device_serial,
+            dry_run=args.dry_run,
+            archive=archive
+        )
+
+    print(f"Cutoff: {summary['cutoff']}")
+    print(f"Devices: {summary['devices']}")
+    print(f"Partitions written: {summary['partitions']}{' (dry run)' if args.dry_run else ''}")
+    print(f"Measurements archived: {summary['archived']}{' (dry run)' if args.dry_run else ''}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
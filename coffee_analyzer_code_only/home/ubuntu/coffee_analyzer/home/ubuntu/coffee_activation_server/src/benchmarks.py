@@ -0,0 +1,279 @@
+"""Microbenchmarks for the analysis and matching hot paths.
+
+Run the suite and save a JSON baseline:
+    python src/benchmarks.py run --output benchmarks/baseline.json
+
+Compare a new run against a baseline (exit code 1 on regression):
+    python src/benchmarks.py run --output benchmarks/current.json
+    python src/benchmarks.py compare benchmarks/baseline.json benchmarks/current.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.analysis.coffee_composition import (
+    estimate_co2, estimate_protein, estimate_amino_acids,
+    estimate_minerals, estimate_flavor_compounds, estimate_moisture,
+    get_calibration_data_for_coffee
+)
+from src.models.measurement import Measurement
+from src.routes.blend_profiles import calculate_profile_signature, score_sample_against_signature
+from src.routes.measurements import calculate_value_stats
+
+SAMPLE_SIZES = [1, 100, 10000, 1000000]
+PROFILE_COUNTS = [1, 10, 100, 1000]
+
+ESTIMATORS = {
+    'co2': estimate_co2,
+    'protein': estimate_protein,
+    'amino_acids': estimate_amino_acids,
+    'minerals': estimate_minerals,
+    'flavor_compounds': estimate_flavor_compounds,
+    'moisture': estimate_moisture,
+}
+
+ESTIMATE_FIELDS = [
+    'estimated_co2', 'estimated_protein', 'estimated_amino_acids',
+    'estimated_minerals', 'estimated_flavor_compounds', 'estimated_moisture',
+]
+
+
+# --- Data generators ---
+
+def make_nir_readings(rng, count):
+    return [{f'channel{i}': rng.randint(200, 4000) for i in range(11)} for _ in range(count)]
+
+
+def make_sensor_readings(rng, count):
+    return [[rng.uniform(0, 1000), rng.uniform(0, 1000), rng.uniform(0, 1000)] for _ in range(count)]
+
+
+def make_measurements(rng, count):
+    start = datetime(2025, 1, 1)
+    measurements = []
+    for i in range(count):
+        m = Measurement(
+            id=i + 1,
+            device_serial='R3S-20250101-000001',
+            timestamp=start + timedelta(minutes=i),
+            sample_name=f'Sample {i}',
+            sample_type='espresso',
+            coffee_type=rng.randint(0, 3),
+            coffee_origin=rng.randint(0, 17),
+            measurement_mode=0,
+            analysis_results='{}'
+        )
+        m.nir_channels = make_nir_readings(rng, 1)[0]
+        for field in ESTIMATE_FIELDS:
+            setattr(m, field, rng.uniform(0, 100))
+        measurements.append(m)
+    return measurements
+
+
+# --- Benchmark cases ---
+# Each case returns (setup, func) where func(data) is the timed operation.
+
+def case_estimators(size):
+    def setup(rng):
+        return make_nir_readings(rng, size), get_calibration_data_for_coffee(1, 1)
+
+    def run(data):
+        readings, calibration = data
+        for nir in readings:
+            for estimator in ESTIMATORS.values():
+                estimator(nir, calibration)
+    return setup, run
+
+
+def case_profile_signature(size):
+    def setup(rng):
+        return make_sensor_readings(rng, size)
+
+    def run(readings):
+        calculate_profile_signature(readings)
+    return setup, run
+
+
+def case_match_scoring(profiles):
+    def setup(rng):
+        signatures = [
+            calculate_profile_signature(make_sensor_readings(rng, 10)) for _ in range(profiles)
+        ]
+        # Profiles are stored as JSON text and re-parsed on every match request
+        return make_sensor_readings(rng, 1)[0], [json.dumps(s) for s in signatures]
+
+    def run(data):
+        sample, stored_signatures = data
+        for stored in stored_signatures:
+            score_sample_against_signature(sample, json.loads(stored))
+    return setup, run
+
+
+def case_measurement_to_dict(size):
+    def setup(rng):
+        return make_measurements(rng, size)
+
+    def run(measurements):
+        [m.to_dict() for m in measurements]
+    return setup, run
+
+
+def case_stats_aggregation(size):
+    def setup(rng):
+        return make_measurements(rng, size)
+
+    def run(measurements):
+        for field in ESTIMATE_FIELDS:
+            calculate_value_stats([getattr(m, field) for m in measurements if getattr(m, field) is not None])
+        daily_counts = {}
+        for m in measurements:
+            date_key = m.timestamp.date().isoformat()
+            daily_counts[date_key] = daily_counts.get(date_key, 0) + 1
+    return setup, run
+
+
+def build_cases(max_samples, max_profiles):
+    cases = []
+    for size in SAMPLE_SIZES:
+        if size > max_samples:
+            continue
+        cases.append((f'estimators[samples={size}]', size, case_estimators(size)))
+        cases.append((f'profile_signature[samples={size}]', size, case_profile_signature(size)))
+        cases.append((f'measurement_to_dict[samples={size}]', size, case_measurement_to_dict(size)))
+        cases.append((f'stats_aggregation[samples={size}]', size, case_stats_aggregation(size)))
+    for profiles in PROFILE_COUNTS:
+        if profiles > max_profiles:
+            continue
+        cases.append((f'match_scoring[profiles={profiles}]', profiles, case_match_scoring(profiles)))
+    return cases
+
+
+# --- Runner ---
+
+def time_case(func, data, repeat, min_time):
+    """Return the best per-call time over ``repeat`` rounds of an auto-sized loop"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(data)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(data)
+        timings.append((time.perf_counter() - start) / loops)
+    return min(timings), loops
+
+
+def run_benchmarks(args):
+    results = {}
+    name_filter = args.filter
+    for name, size, (setup, func) in build_cases(args.max_samples, args.max_profiles):
+        if name_filter and name_filter not in name:
+            continue
+        data = setup(random.Random(args.seed))
+        best, loops = time_case(func, data, args.repeat, args.min_time)
+        results[name] = {
+            'size': size,
+            'seconds': best,
+            'per_item_us': round(best / size * 1e6, 4),
+            'loops': loops
+        }
+        print(f'{name:<45} {best * 1000:>12.3f} ms  {results[name]["per_item_us"]:>10.3f} us/item')
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results written to {args.output}')
+    return report
+
+
+def compare_results(baseline, current, threshold):
+    """Compare two result sets; returns a list of (name, baseline, current, change_percent, regressed)"""
+    rows = []
+    for name, base in baseline['results'].items():
+        cur = current['results'].get(name)
+        if cur is None or base['seconds'] <= 0:
+            continue
+        change = (cur['seconds'] - base['seconds']) / base['seconds'] * 100
+        rows.append((name, base['seconds'], cur['seconds'], change, change > threshold))
+    return rows
+
+
+def compare_benchmarks(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    regressions = 0
+    for name, base, cur, change, regressed in rows:
+        flag = 'REGRESSION' if regressed else ''
+        regressions += regressed
+        print(f'{name:<45} {base * 1000:>12.3f} ms -> {cur * 1000:>12.3f} ms  {change:>+8.1f}%  {flag}')
+
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    for name in missing:
+        print(f'{name:<45} missing from current run')
+
+    print(f'{regressions} regression(s) beyond {args.threshold}% threshold')
+    return 1 if regressions else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Coffee analyzer microbenchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark suite')
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--max-samples', type=int, default=10000,
+                            help='Largest sample size to run (up to 1000000)')
+    run_parser.add_argument('--max-profiles', type=int, default=1000)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help='Minimum seconds per timing round')
+    run_parser.add_argument('--filter', help='Only run cases whose name contains this string')
+    run_parser.add_argument('--seed', type=int, default=42)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='Percent slowdown that counts as a regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'run':
+        run_benchmarks(args)
+        return 0
+    return compare_benchmarks(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Rebuild the spectral similarity index from the measurements table and archive.
+
+The index is updated on ingest and catches up with rows from other workers
+at query time; run this to build it from scratch, to switch PCA on or off,
+or after measurements were deleted. Archived measurements are indexed too;
+searches return them only with ``include_archived``.
+
+Example:
+    python src/build_spectral_index.py
+    python src/build_spectral_index.py --pca 6
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.user import db
+from src.analysis.spectral_index import spectral_index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the spectral similarity index.')
+    parser.add_argument('--pca', type=int, default=0,
+                        help='Keep this many principal components (0 = full 11-channel spectra)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows read per query')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    app = create_app()
+    with app.app_context():
+        count = spectral_index.rebuild(db.session, pca_components=args.pca or None, batch_size=args.batch_size)
+    stats = spectral_index.stats()
+    print(f"Indexed {count} spectra ({stats['dimension']} dimensions, {stats['devices']} devices) "
+          f"in {time.perf_counter() - started:.2f} s -> {spectral_index.directory}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Idempotent bulk loader for calibration coefficients and chemical reference ranges.
+
+Reads calibration definitions (JSON list or CSV) and the chemical reference
+data (coffee_chemical_data.json or a CSV), diffs them against the database
+with one query per table, and applies all inserts/updates in a single
+transaction with INSERT ... ON CONFLICT upserts. Re-running with the same
+files changes nothing.
+
+Example:
+    python src/load_calibration_data.py
+    python src/load_calibration_data.py --definitions my_coefficients.csv --dry-run
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.user import db
+from src.models.calibration_data import CalibrationData
+from src.models.chemical_reference import ChemicalReferenceRange
+from src.models.upsert import upsert, replace
+from src.analysis.calibration_resolver import (
+    COEFFICIENT_FIELDS, COFFEE_TYPE_CODES, COFFEE_ORIGIN_CODES, calibration_resolver
+)
+from src.analysis.reference_ranges import DEFAULT_CHEMICAL_DATA_PATH, load_reference_ranges
+from src.analysis.quality_scoring import quality_scorer
+
+DEFAULT_DEFINITIONS_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', 'calibration_definitions.json'
+))
+
+CALIBRATION_KEY = ['coffee_type', 'coffee_origin', 'coffee_variety']
+REFERENCE_KEY = ['variety', 'region', 'component']
+REFERENCE_FIELDS = ['min_value', 'max_value']
+
+
+def _code(value, codes, label):
+    """Accept an integer code or its enum name (e.g. 'BRAZIL')"""
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if text.lstrip('-').isdigit():
+        return int(text)
+    name = text.upper().replace(' ', '_')
+    for prefix in ('ORIGIN_', 'COFFEE_'):
+        if name.startswith(prefix) and name[len(prefix):] in codes:
+            name = name[len(prefix):]
+    if name not in codes:
+        raise ValueError(f'unknown {label}: {value}')
+    return codes[name]
+
+
+def _float_or_none(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def read_calibration_definitions(path):
+    """Calibration rows keyed by (type, origin, variety) from a JSON list or CSV"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            records = list(csv.DictReader(f))
+    else:
+        with open(path) as f:
+            records = json.load(f)
+
+    rows = {}
+    for record in records:
+        key = (
+            _code(record['coffee_type'], COFFEE_TYPE_CODES, 'coffee_type'),
+            _code(record['coffee_origin'], COFFEE_ORIGIN_CODES, 'coffee_origin'),
+            # NULLs never conflict in a unique index, so a missing variety is stored as 'Unknown'
+            (record.get('coffee_variety') or 'Unknown').strip()
+        )
+        row = dict(zip(CALIBRATION_KEY, key))
+        for field in COEFFICIENT_FIELDS:
+            row[field] = _float_or_none(record.get(field))
+        rows[key] = row
+    return rows
+
+
+def diff_rows(desired, existing, fields):
+    """Split desired rows into (inserted, updated, unchanged); updated carries per-field changes"""
+    inserted, updated, unchanged = [], [], []
+    for key, row in desired.items():
+        current = existing.get(key)
+        if current is None:
+            inserted.append(row)
+            continue
+        changes = {
+            field: {'old': current[field], 'new': row[field]}
+            for field in fields if current[field] != row[field]
+        }
+        if changes:
+            updated.append((row, changes))
+        else:
+            unchanged.append(row)
+    return inserted, updated, unchanged
+
+
+def _ensure_schema(session, model):
+    """Create the table and its unique index if an older database lacks them"""
+    bind = session.get_bind()
+    model.__table__.create(bind, checkfirst=True)
+    for index in model.__table__.indexes:
+        index.create(bind, checkfirst=True)
+
+
+def load_calibration(session, definitions, reference_ranges, dry_run=False):
+    """Diff and upsert both datasets in one transaction; returns a change report"""
+    _ensure_schema(session, CalibrationData)
+    _ensure_schema(session, ChemicalReferenceRange)
+
+    calibration_columns = [getattr(CalibrationData, name) for name in CALIBRATION_KEY + COEFFICIENT_FIELDS]
+    existing_calibration = {
+        tuple(row[:3]): dict(zip(CALIBRATION_KEY + COEFFICIENT_FIELDS, row))
+        for row in session.query(*calibration_columns).all()
+    }
+    reference_columns = [getattr(ChemicalReferenceRange, name) for name in REFERENCE_KEY + REFERENCE_FIELDS]
+    existing_references = {
+        tuple(row[:3]): dict(zip(REFERENCE_KEY + REFERENCE_FIELDS, row))
+        for row in session.query(*reference_columns).all()
+    }
+
+    desired_references = {
+        (variety, region, component): {
+            'variety': variety, 'region': region, 'component': component,
+            'min_value': low, 'max_value': high
+        }
+        for variety, region, component, low, high in reference_ranges
+    }
+
+    cal_inserted, cal_updated, cal_unchanged = diff_rows(definitions, existing_calibration, COEFFICIENT_FIELDS)
+    ref_inserted, ref_updated, ref_unchanged = diff_rows(desired_references, existing_references, REFERENCE_FIELDS)
+
+    if not dry_run:
+        calibration_rows = cal_inserted + [row for row, _ in cal_updated]
+        reference_rows = ref_inserted + [row for row, _ in ref_updated]
+        upsert(session, CalibrationData.__table__, calibration_rows, CALIBRATION_KEY,
+               {field: replace for field in COEFFICIENT_FIELDS})
+        upsert(session, ChemicalReferenceRange.__table__, reference_rows, REFERENCE_KEY,
+               {field: replace for field in REFERENCE_FIELDS})
+        session.commit()
+        if calibration_rows:
+            calibration_resolver.invalidate()
+        if reference_rows:
+            quality_scorer.invalidate()
+
+    def describe(rows, keys):
+        return [dict((k, row[k]) for k in keys) for row in rows]
+
+    return {
+        'dry_run': dry_run,
+        'calibration': {
+            'inserted': describe(cal_inserted, CALIBRATION_KEY),
+            'updated': [dict(describe([row], CALIBRATION_KEY)[0], changes=changes) for row, changes in cal_updated],
+            'unchanged': len(cal_unchanged)
+        },
+        'reference_ranges': {
+            'inserted': describe(ref_inserted, REFERENCE_KEY),
+            'updated': [dict(describe([row], REFERENCE_KEY)[0], changes=changes) for row, changes in ref_updated],
+            'unchanged': len(ref_unchanged)
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load calibration coefficients and chemical reference ranges.')
+    parser.add_argument('--definitions', default=DEFAULT_DEFINITIONS_PATH,
+                        help='Calibration definitions (JSON list or CSV)')
+    parser.add_argument('--chemical-data', default=DEFAULT_CHEMICAL_DATA_PATH,
+                        help='Chemical reference ranges (coffee_chemical_data.json or CSV)')
+    parser.add_argument('--skip-chemical-data', action='store_true', help='Only load calibration definitions')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing')
+    parser.add_argument('--json', action='store_true', help='Print the full change report as JSON')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    definitions = read_calibration_definitions(args.definitions)
+    if args.skip_chemical_data:
+        reference_ranges, skipped = [], []
+    else:
+        reference_ranges, skipped = load_reference_ranges(args.chemical_data)
+
+    app = create_app()
+    with app.app_context():
+        report = load_calibration(db.session, definitions, reference_ranges, dry_run=args.dry_run)
+    report['skipped_reference_values'] = skipped
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return 0
+
+    suffix = ' (dry run)' if args.dry_run else ''
+    for name in ('calibration', 'reference_ranges'):
+        section = report[name]
+        print(f"{name}: {len(section['inserted'])} inserted, {len(section['updated'])} updated, "
+              f"{section['unchanged']} unchanged{suffix}")
+        for row in section['updated']:
+            changes = ', '.join(f"{field} {c['old']} -> {c['new']}" for field, c in row['changes'].items())
+            print(f"  updated {tuple(v for k, v in row.items() if k != 'changes')}: {changes}")
+    if skipped:
+        print(f"Skipped {len(skipped)} non-numeric reference values")
+    print(f"Done in {report['elapsed_ms']} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
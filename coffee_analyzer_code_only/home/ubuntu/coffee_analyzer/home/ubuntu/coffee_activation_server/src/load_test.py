@@ -0,0 +1,395 @@
+"""Fleet traffic simulator and load-test harness.
+
+Simulates N ESP32 analyzers speaking the same HTTP protocol as
+main_complete.ino against a running server and reports per-endpoint
+throughput, latency percentiles and error rates.
+
+Example:
+    python src/load_test.py --base-url http://127.0.0.1:5000 --devices 200 --duration 120
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Firmware timing (main_complete.ino), in seconds
+MEASUREMENT_INTERVAL = 5.0      # runCurrentMode() delay
+REPORT_INTERVAL = 300.0         # REPORT_INTERVAL
+SYNC_RETRY_INTERVAL = 60.0      # SYNC_RETRY_INTERVAL
+
+NIR_CHANNELS = 11
+COFFEE_TYPES = [0, 1, 2, 3]
+COFFEE_ORIGINS = list(range(18))
+
+
+class EndpointStats:
+    """Latency samples and status counts for one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.status_counts = {}
+        self.errors = 0
+
+    def record(self, latency, status):
+        self.latencies.append(latency)
+        key = str(status) if status else 'exception'
+        self.status_counts[key] = self.status_counts.get(key, 0) + 1
+        # The firmware treats anything other than 200/201 as a failed call
+        if status not in (200, 201):
+            self.errors += 1
+
+    def summary(self, elapsed):
+        count = len(self.latencies)
+        ordered = sorted(self.latencies)
+        return {
+            'requests': count,
+            'throughput_rps': round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+            'error_rate': round(self.errors / count * 100, 2) if count else 0.0,
+            'status_counts': self.status_counts
+        }
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LoadTestClient:
+    """Minimal asyncio HTTP/1.1 client.
+
+    Opens a new connection per request like the ESP32 HTTPClient does, so the
+    server sees the same connection churn as a real fleet.
+    """
+
+    def __init__(self, base_url, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.stats = {}
+
+    async def request(self, method, path, body=None, label=None):
+        """Send a request and record its latency under ``label``"""
+        label = label or f'{method} {path}'
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        head = (
+            f'{method} {path} HTTP/1.1\r\n'
+            f'Host: {self.host}:{self.port}\r\n'
+            'Connection: close\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n\r\n'
+        ).encode('latin-1')
+
+        status = None
+        response_body = b''
+        start = time.perf_counter()
+        try:
+            status, response_body = await asyncio.wait_for(
+                self._roundtrip(head + payload), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError, ValueError):
+            status = None
+        latency = time.perf_counter() - start
+
+        self.stats.setdefault(label, EndpointStats()).record(latency, status)
+        return status, response_body
+
+    async def _roundtrip(self, raw_request):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(raw_request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+
+            content_length = None
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    content_length = int(value.strip())
+
+            if content_length is not None:
+                body = await reader.readexactly(content_length)
+            else:
+                body = await reader.read()
+            return status, body
+        finally:
+            writer.close()
+
+
+class SimulatedDevice:
+    """One analyzer following the firmware request sequence"""
+
+    def __init__(self, index, client, args, rng):
+        self.client = client
+        self.args = args
+        self.rng = rng
+        self.device_serial = f"R3S-{datetime.utcnow().strftime('%Y%m%d')}-{index:06d}"
+        self.coffee_type = rng.choice(COFFEE_TYPES)
+        self.coffee_origin = rng.choice(COFFEE_ORIGINS)
+        self.measurement_count = 0
+        self.error_count = 0
+        self.online = True
+        self.offline_until = 0.0
+        self.started = time.monotonic()
+        self.pending = []  # (data_type, payload) - the SPIFFS /pending_*.json files
+
+    def now_iso(self):
+        return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+
+    def registration_payload(self):
+        now = self.now_iso()
+        return {
+            'device_serial': self.device_serial,
+            'device_name': f'جهاز تحليل البن - {self.device_serial}',
+            'first_boot_date': now,
+            'first_internet_date': now
+        }
+
+    def report_payload(self):
+        return {
+            'device_serial': self.device_serial,
+            'measurement_count': self.measurement_count,
+            'error_count': self.error_count,
+            'uptime_hours': (time.monotonic() - self.started) / 3600.0,
+            'wifi_signal': self.rng.randint(-90, -40) if self.online else 0,
+            'free_heap': self.rng.randint(90000, 180000),
+            'current_mode': 0,
+            'coffee_type': self.coffee_type,
+            'coffee_origin': self.coffee_origin
+        }
+
+    def measurement_payload(self, calibration):
+        nir = [self.rng.randint(200, 4000) for _ in range(NIR_CHANNELS)]
+
+        def estimate(key, default, a, b):
+            coeff = calibration.get(key) or default
+            return nir[a] * coeff + nir[b] * (coeff / 2)
+
+        return {
+            'device_serial': self.device_serial,
+            'timestamp': self.now_iso(),
+            'coffee_type': self.coffee_type,
+            'coffee_origin': self.coffee_origin,
+            'nir_readings': nir,
+            'estimated_co2': estimate('co2_coeff', 0.1, 0, 1),
+            'estimated_protein': estimate('protein_coeff', 0.05, 2, 3),
+            'estimated_amino_acids': estimate('amino_acids_coeff', 0.02, 4, 5),
+            'estimated_minerals': estimate('minerals_coeff', 0.01, 6, 7),
+            'estimated_flavor_compounds': estimate('flavor_compounds_coeff', 0.03, 8, 9),
+            'estimated_moisture': estimate('moisture_coeff', 0.08, 10, 0)
+        }
+
+    def url_for(self, data_type):
+        return {
+            'report': f'/api/activation/devices/{self.device_serial}/report',
+            'registration': '/api/activation/devices',
+            'measurement': '/api/measurements',
+            'knowledge': '/api/knowledge'
+        }[data_type]
+
+    async def register(self):
+        status, _ = await self.client.request(
+            'POST', '/api/activation/devices', self.registration_payload(),
+            label='POST /api/activation/devices'
+        )
+        if status not in (200, 201):
+            self.pending.append(('registration', self.registration_payload()))
+
+    async def check_status(self):
+        await self.client.request(
+            'GET', f'/api/activation/devices/{self.device_serial}/status',
+            label='GET /api/activation/devices/<serial>/status'
+        )
+
+    async def fetch_calibration(self):
+        status, body = await self.client.request(
+            'GET',
+            f'/api/calibration_data?coffee_type={self.coffee_type}&coffee_origin={self.coffee_origin}',
+            label='GET /api/calibration_data'
+        )
+        if status == 200:
+            try:
+                return json.loads(body).get('calibration_data') or {}
+            except ValueError:
+                pass
+        return {}
+
+    async def send_report(self):
+        payload = self.report_payload()
+        if not self.online:
+            self.pending.append(('report', payload))
+            return
+        status, _ = await self.client.request(
+            'POST', self.url_for('report'), payload,
+            label='POST /api/activation/devices/<serial>/report'
+        )
+        if status != 200:
+            self.pending.append(('report', payload))
+
+    async def take_measurement(self):
+        self.measurement_count += 1
+        if not self.online:
+            # Offline devices skip the upload entirely, like readSensorData()
+            return
+        calibration = await self.fetch_calibration()
+        payload = self.measurement_payload(calibration)
+        status, _ = await self.client.request(
+            'POST', '/api/measurements', payload, label='POST /api/measurements'
+        )
+        if status not in (200, 201):
+            self.error_count += 1
+            self.pending.append(('measurement', payload))
+
+    async def sync_pending(self):
+        """Replay pending files back to back, as syncPendingData() does"""
+        if not self.online or not self.pending:
+            return
+        remaining = []
+        for data_type, payload in self.pending:
+            status, _ = await self.client.request(
+                'POST', self.url_for(data_type), payload,
+                label=f'SYNC {data_type}'
+            )
+            if status not in (200, 201):
+                remaining.append((data_type, payload))
+        self.pending = remaining
+
+    def maybe_toggle_outage(self, tick):
+        """Randomly drop the device offline and bring it back after the outage window"""
+        if self.online:
+            if self.rng.random() < self.args.outage_rate * tick:
+                self.online = False
+                self.offline_until = time.monotonic() + self.args.outage_duration
+        elif time.monotonic() >= self.offline_until:
+            self.online = True
+            return True
+        return False
+
+    async def run(self, deadline):
+        # Stagger boot so the fleet does not start in lockstep
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp_up))
+
+        # setup(): register, check activation, sync leftovers
+        await self.register()
+        await self.check_status()
+        await self.sync_pending()
+
+        tick = self.args.measurement_interval
+        last_report = last_sync = last_status = time.monotonic()
+        while time.monotonic() < deadline:
+            reconnected = self.maybe_toggle_outage(tick)
+            now = time.monotonic()
+
+            if self.online:
+                if now - last_report > self.args.report_interval:
+                    await self.send_report()
+                    last_report = now
+                if reconnected or now - last_sync > self.args.sync_interval:
+                    await self.sync_pending()
+                    last_sync = now
+                if self.args.status_interval and now - last_status > self.args.status_interval:
+                    await self.check_status()
+                    last_status = now
+            elif now - last_report > self.args.report_interval:
+                await self.send_report()
+                last_report = now
+
+            if self.rng.random() < self.args.duty_cycle:
+                await self.take_measurement()
+
+            await asyncio.sleep(tick * self.rng.uniform(0.9, 1.1))
+
+
+async def run_fleet(args):
+    """Run the simulated fleet and return per-endpoint statistics"""
+    client = LoadTestClient(args.base_url, timeout=args.timeout)
+    rng = random.Random(args.seed)
+    devices = [
+        SimulatedDevice(args.serial_offset + i, client, args, random.Random(rng.random()))
+        for i in range(args.devices)
+    ]
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(device.run(deadline) for device in devices))
+    elapsed = time.monotonic() - started
+
+    endpoints = {label: stats.summary(elapsed) for label, stats in sorted(client.stats.items())}
+    total = sum(s['requests'] for s in endpoints.values())
+    errors = sum(client.stats[label].errors for label in endpoints)
+    return {
+        'devices': args.devices,
+        'duration_seconds': round(elapsed, 2),
+        'duty_cycle': args.duty_cycle,
+        'total_requests': total,
+        'throughput_rps': round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        'error_rate': round(errors / total * 100, 2) if total else 0.0,
+        'endpoints': endpoints
+    }
+
+
+def print_results(results):
+    print(f"Devices: {results['devices']}  Duration: {results['duration_seconds']}s  "
+          f"Duty cycle: {results['duty_cycle']}")
+    print(f"Total requests: {results['total_requests']}  "
+          f"Throughput: {results['throughput_rps']} req/s  Errors: {results['error_rate']}%")
+    print()
+    header = f"{'Endpoint':<48}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>8}"
+    print(header)
+    print('-' * len(header))
+    for label, s in results['endpoints'].items():
+        print(f"{label:<48}{s['requests']:>8}{s['throughput_rps']:>9}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['error_rate']:>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate an ESP32 analyzer fleet against the server.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--devices', type=int, default=50, help='Fleet size')
+    parser.add_argument('--duration', type=float, default=60.0, help='Test length in seconds')
+    parser.add_argument('--duty-cycle', type=float, default=1.0,
+                        help='Fraction of loop ticks that take a measurement (0-1)')
+    parser.add_argument('--measurement-interval', type=float, default=MEASUREMENT_INTERVAL)
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL)
+    parser.add_argument('--sync-interval', type=float, default=SYNC_RETRY_INTERVAL)
+    parser.add_argument('--status-interval', type=float, default=0.0,
+                        help='Seconds between status polls after boot (0 = boot only, like the firmware)')
+    parser.add_argument('--outage-rate', type=float, default=0.0,
+                        help='Per-second probability that a device loses connectivity')
+    parser.add_argument('--outage-duration', type=float, default=30.0)
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='Seconds over which devices boot')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--serial-offset', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run_fleet(args))
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -11,14 +11,41 @@ from src.models.device import Device
 from src.models.device_report import DeviceReport
 from src.models.blend_profile import BlendProfile, BlendSample
 from src.models.measurement import Measurement # Import the new Measurement model
+from src.models.fleet_rollup import FleetWeeklyRollup, FleetWeeklyHistogram
+from src.models.daily_aggregate import MeasurementDailyAgg
+from src.models.knowledge_entry import KnowledgeEntry
+from src.models.idempotency import ensure_idempotency_columns
+from src.models.migrations import upgrade_schema
+from src.models.read_routing import replica_router
+from src.models import (
+    device, device_report, blend_profile, measurement, fleet_rollup, daily_aggregate,
+    knowledge_entry, calibration_data, chemical_reference
+)
 from src.routes.user import user_bp
 from src.routes.activation import activation_bp
 from src.routes.reports import reports_bp
 from src.routes.blend_profiles import blend_profiles_bp
 from src.routes.measurements import measurements_bp # Import the new measurements blueprint
 from src.routes.calibration import calibration_bp # Import the new calibration blueprint
+from src.routes.live_feed import live_feed_bp
+from src.routes.fleet_analytics import fleet_analytics_bp
+from src.routes.similarity import similarity_bp
+from src.routes.knowledge import knowledge_bp
+from src.analysis.quality_scoring import quality_scorer
+from src.monitoring.metrics import init_metrics
+from src.monitoring.slow_query_log import init_slow_query_log
+from src.monitoring.rate_limit import init_rate_limit
+from src.monitoring.compression import init_compression
+from src.monitoring.response_cache import init_response_cache
+from src.monitoring.stream_budget import init_stream_budget
 
-def create_app():
+# Each model module declares its own SQLAlchemy instance; all of them share the app database
+MODEL_DATABASES = [db] + [module.db for module in (
+    device, device_report, blend_profile, measurement, fleet_rollup, daily_aggregate,
+    knowledge_entry, calibration_data, chemical_reference
+)]
+
+def create_app(config=None):
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
     app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
@@ -31,13 +58,48 @@ def create_app():
     app.register_blueprint(blend_profiles_bp, url_prefix='/api/blend')
     app.register_blueprint(measurements_bp, url_prefix='/api') # Register the new measurements blueprint
     app.register_blueprint(calibration_bp, url_prefix='/api/calibration') # Register the new calibration blueprint
+    app.register_blueprint(live_feed_bp, url_prefix='/api') # Server-Sent Events feed for dashboards
+    app.register_blueprint(fleet_analytics_bp, url_prefix='/api') # Fleet-wide rollup analytics
+    app.register_blueprint(similarity_bp, url_prefix='/api') # Spectral nearest-neighbour search
+    app.register_blueprint(knowledge_bp, url_prefix='/api') # Knowledge entries uploaded by devices
 
     # uncomment if you need to use database
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db.init_app(app)
+    # Overrides (e.g. a test database) applied before anything is initialized
+    app.config.update(config or {})
+    for model_db in MODEL_DATABASES:
+        # Flask-SQLAlchemy refuses a second instance under app.extensions['sqlalchemy']
+        app.extensions.pop('sqlalchemy', None)
+        model_db.init_app(app)
+        with app.app_context():
+            model_db.create_all()
+    app.extensions['sqlalchemy'] = db
     with app.app_context():
-        db.create_all()
+        # Tables created by older versions get the columns added since
+        upgrade_schema(db.engine)
+        # Databases created before ingest deduplication get the key column and unique indexes
+        ensure_idempotency_columns(db.engine, (Measurement, KnowledgeEntry, DeviceReport))
+
+    # Reporting reads on SQLALCHEMY_REPLICA_URL, with a read-your-writes window after client writes
+    replica_router.init_app(app)
+
+    # Reference ranges for ingest-time quality scoring (chemical_reference_ranges, else the JSON file)
+    with app.app_context():
+        quality_scorer.load()
+
+    # Per-route request/DB metrics at /metrics
+    init_metrics(app)
+    # Opt-in slow-query log (SLOW_QUERY_LOG_ENABLED / SLOW_QUERY_THRESHOLD_MS)
+    init_slow_query_log(app)
+    # Per-device and global token buckets on device-facing endpoints (429 + Retry-After)
+    init_rate_limit(app)
+    # gzip request bodies on ingest; negotiated gzip/brotli responses (COMPRESSION_*)
+    init_compression(app)
+    # Versioned cache for per-device stats/listing responses (RESPONSE_CACHE_*)
+    init_response_cache(app)
+    # Cap on long polls and live streams holding a worker thread (STREAM_THREAD_BUDGET)
+    init_stream_budget(app)
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
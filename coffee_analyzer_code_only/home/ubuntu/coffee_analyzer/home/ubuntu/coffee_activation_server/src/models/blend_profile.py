@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import json
+import numpy as np
 
 db = SQLAlchemy()
 
@@ -14,6 +15,9 @@ class BlendProfile(db.Model):
     description = db.Column(db.Text, default='')
     sample_count = db.Column(db.Integer, default=0)
     profile_signature = db.Column(db.Text, default='{}')  # JSON string with average readings and statistics
+    # Full-spectrum signature: per-channel mean (11 float64) and covariance (11x11 float64) as raw bytes
+    spectrum_mean = db.Column(db.LargeBinary, nullable=True)
+    spectrum_covariance = db.Column(db.LargeBinary, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -23,6 +27,18 @@ class BlendProfile(db.Model):
     def __repr__(self):
         return f'<BlendProfile {self.profile_name} for {self.device_id}>'
     
+    @property
+    def spectral_signature(self):
+        """Per-channel mean and standard deviation of the sample spectra (None for reading-only profiles)"""
+        if not self.spectrum_mean or not self.spectrum_covariance:
+            return None
+        mean = np.frombuffer(self.spectrum_mean, dtype=np.float64)
+        covariance = np.frombuffer(self.spectrum_covariance, dtype=np.float64).reshape(len(mean), len(mean))
+        return {
+            'mean': mean.tolist(),
+            'std': np.sqrt(np.diag(covariance)).tolist()
+        }
+    
     def to_dict(self):
         """Convert profile object to dictionary"""
         signature_dict = {}
@@ -38,6 +54,7 @@ class BlendProfile(db.Model):
             'description': self.description,
             'sample_count': self.sample_count,
             'profile_signature': signature_dict,
+            'spectral_signature': self.spectral_signature,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -52,6 +69,7 @@ class BlendSample(db.Model):
     sensor_reading_1 = db.Column(db.Float, default=0.0)
     sensor_reading_2 = db.Column(db.Float, default=0.0)
     sensor_reading_3 = db.Column(db.Float, default=0.0)
+    spectrum = db.Column(db.LargeBinary, nullable=True)  # NIR channels 0-10 as packed float32
     chemical_data = db.Column(db.Text, default='{}')  # JSON string with chemical analysis if available
     notes = db.Column(db.Text, default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -74,6 +92,7 @@ class BlendSample(db.Model):
             'sensor_reading_1': self.sensor_reading_1,
             'sensor_reading_2': self.sensor_reading_2,
             'sensor_reading_3': self.sensor_reading_3,
+            'spectrum': self.spectrum_array.tolist() if self.spectrum else None,
             'chemical_data': chemical_data_dict,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -83,4 +102,12 @@ class BlendSample(db.Model):
     def sensor_readings_array(self):
         """Get sensor readings as array for calculations"""
         return [self.sensor_reading_1, self.sensor_reading_2, self.sensor_reading_3]
-
+    
+    @property
+    def spectrum_array(self):
+        """NIR spectrum as a float32 array (None if the sample has no spectrum)"""
+        return np.frombuffer(self.spectrum, dtype=np.float32) if self.spectrum else None
+    
+    @spectrum_array.setter
+    def spectrum_array(self, values):
+        self.spectrum = np.ascontiguousarray(values, dtype=np.float32).tobytes() if values is not None else None
@@ -5,6 +5,10 @@ db = SQLAlchemy()
 class CalibrationData(db.Model):
     """Model for storing reference chemical composition data for coffee calibration."""
     __tablename__ = 'calibration_data'
+    __table_args__ = (
+        # One row per (type, origin, variety); target of the loader's ON CONFLICT upserts
+        db.Index('uq_calibration_data_key', 'coffee_type', 'coffee_origin', 'coffee_variety', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     coffee_type = db.Column(db.Integer, nullable=False) # 0: Green, 1: Roasted, 2: Ground
@@ -0,0 +1,33 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+
+db = SQLAlchemy()
+
+class ChemicalReferenceRange(db.Model):
+    """Reference composition range for a coffee variety/region (from coffee_chemical_data.json)"""
+    __tablename__ = 'chemical_reference_ranges'
+    __table_args__ = (
+        db.Index('uq_chemical_reference_key', 'variety', 'region', 'component', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    variety = db.Column(db.String(50), nullable=False)    # arabica, robusta
+    region = db.Column(db.String(120), nullable=False)    # general, ethiopia_southwest, ...
+    component = db.Column(db.String(120), nullable=False) # caffeine_percent, proteins_percent, ...
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ChemicalReferenceRange {self.variety}/{self.region} {self.component}: {self.min_value}-{self.max_value}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'variety': self.variety,
+            'region': self.region,
+            'component': self.component,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,214 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+import math
+
+from src.models.upsert import upsert, add, nullable_minimum, nullable_maximum
+from src.models.fleet_rollup import ROLLUP_COMPONENTS, UNKNOWN
+
+db = SQLAlchemy()
+
+# Aggregated estimate -> Measurement attribute (same set as the fleet rollup)
+DAILY_COMPONENTS = ROLLUP_COMPONENTS
+
+
+class MeasurementDailyAgg(db.Model):
+    """Per (device, UTC day, coffee type, coffee origin) running aggregates of each estimate.
+
+    For every component in DAILY_COMPONENTS there are ``<c>_count``,
+    ``<c>_sum``, ``<c>_sum_sq``, ``<c>_min`` and ``<c>_max`` columns, so any
+    day-aligned window is answered by summing rows, standard deviation included.
+    """
+    __tablename__ = 'measurement_daily_agg'
+    __table_args__ = (
+        db.UniqueConstraint('device_serial', 'day', 'coffee_type', 'coffee_origin', name='uq_measurement_daily_agg'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_serial = db.Column(db.String(32), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    coffee_type = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    coffee_origin = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    measurement_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MeasurementDailyAgg {self.device_serial} {self.day} {self.coffee_type}/{self.coffee_origin}>'
+
+
+for _component in DAILY_COMPONENTS:
+    setattr(MeasurementDailyAgg, f'{_component}_count', db.Column(db.Integer, nullable=False, default=0))
+    setattr(MeasurementDailyAgg, f'{_component}_sum', db.Column(db.Float, nullable=False, default=0.0))
+    setattr(MeasurementDailyAgg, f'{_component}_sum_sq', db.Column(db.Float, nullable=False, default=0.0))
+    setattr(MeasurementDailyAgg, f'{_component}_min', db.Column(db.Float, nullable=True))
+    setattr(MeasurementDailyAgg, f'{_component}_max', db.Column(db.Float, nullable=True))
+
+
+DAILY_KEY = ['device_serial', 'day', 'coffee_type', 'coffee_origin']
+DAILY_UPDATE = {'measurement_count': add}
+for _component in DAILY_COMPONENTS:
+    DAILY_UPDATE.update({
+        f'{_component}_count': add,
+        f'{_component}_sum': add,
+        f'{_component}_sum_sq': add,
+        f'{_component}_min': nullable_minimum,
+        f'{_component}_max': nullable_maximum,
+    })
+
+# Measurement columns behind one aggregate contribution, in tuple order
+SOURCE_COLUMNS = ['device_serial', 'coffee_type', 'coffee_origin', 'timestamp'] + list(DAILY_COMPONENTS.values())
+
+
+def day_for(timestamp):
+    return timestamp.date() if isinstance(timestamp, datetime) else timestamp
+
+
+def _empty_row(device_serial, day, coffee_type, coffee_origin):
+    row = {'device_serial': device_serial, 'day': day, 'coffee_type': coffee_type,
+           'coffee_origin': coffee_origin, 'measurement_count': 0}
+    for component in DAILY_COMPONENTS:
+        row.update({f'{component}_count': 0, f'{component}_sum': 0.0, f'{component}_sum_sq': 0.0,
+                    f'{component}_min': None, f'{component}_max': None})
+    return row
+
+
+def _daily_rows(measurements):
+    """Aggregate source tuples (see SOURCE_COLUMNS) into one row per group"""
+    groups = {}
+    components = list(DAILY_COMPONENTS)
+    for device_serial, coffee_type, coffee_origin, timestamp, *values in measurements:
+        key = (device_serial, day_for(timestamp), UNKNOWN if coffee_type is None else coffee_type,
+               UNKNOWN if coffee_origin is None else coffee_origin)
+        row = groups.get(key)
+        if row is None:
+            row = groups[key] = _empty_row(*key)
+        row['measurement_count'] += 1
+        for component, value in zip(components, values):
+            if value is None:
+                continue
+            value = float(value)
+            row[f'{component}_count'] += 1
+            row[f'{component}_sum'] += value
+            row[f'{component}_sum_sq'] += value * value
+            low, high = row[f'{component}_min'], row[f'{component}_max']
+            row[f'{component}_min'] = value if low is None else min(low, value)
+            row[f'{component}_max'] = value if high is None else max(high, value)
+    return list(groups.values())
+
+
+def apply_daily_aggregates(session, measurements):
+    """Fold source tuples into the daily aggregate table (caller's transaction); returns the group count"""
+    rows = _daily_rows(measurements)
+    upsert(session, MeasurementDailyAgg.__table__, rows, DAILY_KEY, DAILY_UPDATE)
+    return len(rows)
+
+
+def record_measurement(session, measurement):
+    """Update the daily aggregate for one ingested measurement"""
+    return apply_daily_aggregates(session, [tuple(getattr(measurement, name) for name in SOURCE_COLUMNS)])
+
+
+def _source_rows(session, device_serial, start=None, end=None, batch_size=5000):
+    """Source tuples for one device from the hot table plus its archived partitions (ids deduplicated)"""
+    from src.models.measurement import Measurement
+    from src.models.measurement_archive import measurement_archive
+
+    columns = [Measurement.id] + [getattr(Measurement, name) for name in SOURCE_COLUMNS]
+    query = session.query(*columns).filter(Measurement.device_serial == device_serial,
+                                           Measurement.timestamp.isnot(None))
+    if start is not None:
+        query = query.filter(Measurement.timestamp >= start)
+    if end is not None:
+        query = query.filter(Measurement.timestamp < end)
+
+    hot_ids = set()
+    for row in query.execution_options(yield_per=batch_size):
+        hot_ids.add(row[0])
+        yield tuple(row[1:])
+
+    for row in measurement_archive.read(device_serial, ['id'] + SOURCE_COLUMNS, start, end):
+        timestamp = row[4]
+        if row[0] in hot_ids or timestamp is None or (end is not None and timestamp >= end):
+            continue
+        yield tuple(row[1:])
+
+
+def refresh_day(session, device_serial, day):
+    """Recompute one device-day from raw rows (after an edit changed stored estimates)"""
+    session.execute(MeasurementDailyAgg.__table__.delete().where(
+        MeasurementDailyAgg.device_serial == device_serial, MeasurementDailyAgg.day == day
+    ))
+    start = datetime.combine(day, datetime.min.time())
+    return apply_daily_aggregates(session, _source_rows(session, device_serial, start, start + timedelta(days=1)))
+
+
+def rebuild_daily_aggregates(session, batch_size=5000):
+    """Recompute the daily aggregate table from the measurements table and the archive"""
+    from src.models.device import Device
+    from src.models.measurement import Measurement
+
+    session.execute(MeasurementDailyAgg.__table__.delete())
+
+    serials = {serial for (serial,) in session.query(Measurement.device_serial).distinct()}
+    serials.update(serial for (serial,) in session.query(Device.device_serial))
+
+    counted = 0
+    for device_serial in sorted(serials):
+        rows = list(_source_rows(session, device_serial, batch_size=batch_size))
+        counted += len(rows)
+        apply_daily_aggregates(session, rows)
+    session.commit()
+    return counted
+
+
+def _component_stats(count, total, total_sq, low, high):
+    if not count:
+        return {}
+    mean = total / count
+    return {
+        'count': count,
+        'average': round(mean, 2),
+        'std': round(math.sqrt(max(total_sq / count - mean * mean, 0.0)), 4),
+        'min': low,
+        'max': high,
+    }
+
+
+def window_stats(session, device_serial, start_day, end_day, coffee_type=None, coffee_origin=None):
+    """Statistics for the days ``start_day``..``end_day`` (inclusive) summed from aggregate rows"""
+    query = session.query(MeasurementDailyAgg).filter(
+        MeasurementDailyAgg.device_serial == device_serial,
+        MeasurementDailyAgg.day >= start_day,
+        MeasurementDailyAgg.day <= end_day
+    )
+    if coffee_type is not None:
+        query = query.filter(MeasurementDailyAgg.coffee_type == coffee_type)
+    if coffee_origin is not None:
+        query = query.filter(MeasurementDailyAgg.coffee_origin == coffee_origin)
+
+    totals = {component: [0, 0.0, 0.0, None, None] for component in DAILY_COMPONENTS}
+    daily_counts = {}
+    coffee_types = {}
+    total_measurements = 0
+    for row in query:
+        total_measurements += row.measurement_count
+        day_key = row.day.isoformat()
+        daily_counts[day_key] = daily_counts.get(day_key, 0) + row.measurement_count
+        if row.coffee_type != UNKNOWN:
+            type_key = str(row.coffee_type)
+            coffee_types[type_key] = coffee_types.get(type_key, 0) + row.measurement_count
+        for component, entry in totals.items():
+            count = getattr(row, f'{component}_count')
+            if not count:
+                continue
+            entry[0] += count
+            entry[1] += getattr(row, f'{component}_sum')
+            entry[2] += getattr(row, f'{component}_sum_sq')
+            low, high = getattr(row, f'{component}_min'), getattr(row, f'{component}_max')
+            entry[3] = low if entry[3] is None else min(entry[3], low)
+            entry[4] = high if entry[4] is None else max(entry[4], high)
+
+    return {
+        'total_measurements': total_measurements,
+        'statistics': {component: _component_stats(*entry) for component, entry in totals.items()},
+        'coffee_type_distribution': coffee_types,
+        'daily_measurement_counts': dict(sorted(daily_counts.items())),
+    }
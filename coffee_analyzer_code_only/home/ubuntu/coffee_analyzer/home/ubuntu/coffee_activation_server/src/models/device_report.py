@@ -7,6 +7,9 @@ db = SQLAlchemy()
 class DeviceReport(db.Model):
     """Model for device operation reports"""
     __tablename__ = 'device_reports'
+    __table_args__ = (
+        db.Index('uq_device_reports_idempotency', 'device_id', 'idempotency_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_id = db.Column(db.String(32), nullable=False, index=True)
@@ -18,6 +21,7 @@ class DeviceReport(db.Model):
     current_mode = db.Column(db.Integer, default=0) # Operating mode
     additional_data = db.Column(db.Text, default='{}')  # JSON string for extra data
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Deduplicates retried uploads per device
     
     def __repr__(self):
         return f'<DeviceReport {self.device_id}: {self.measurement_count} measurements, {self.error_count} errors>'
@@ -0,0 +1,236 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+import math
+
+from src.models.upsert import upsert, add, minimum, maximum
+
+db = SQLAlchemy()
+
+# Unknown origin/type are stored as -1 so they take part in the unique key
+UNKNOWN = -1
+
+# Rollup component -> Measurement attribute
+ROLLUP_COMPONENTS = {
+    'co2': 'estimated_co2',
+    'protein': 'estimated_protein',
+    'amino_acids': 'estimated_amino_acids',
+    'minerals': 'estimated_minerals',
+    'flavor_compounds': 'estimated_flavor_compounds',
+    'moisture': 'estimated_moisture',
+    'quality_score': 'quality_score',
+}
+
+# Log-spaced histogram bins (relative accuracy ~1%) so percentiles need no fixed value range
+HISTOGRAM_GAMMA = 1.02
+_LOG_GAMMA = math.log(HISTOGRAM_GAMMA)
+ZERO_BIN = -(2 ** 31)  # Values <= 0
+
+
+class FleetWeeklyRollup(db.Model):
+    """Per (origin, type, ISO week, component) running aggregates across all devices"""
+    __tablename__ = 'fleet_weekly_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('coffee_origin', 'coffee_type', 'week_start', 'component', name='uq_fleet_weekly_rollup'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    coffee_origin = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    coffee_type = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    week_start = db.Column(db.Date, nullable=False, index=True)
+    component = db.Column(db.String(32), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    total_sq = db.Column(db.Float, nullable=False, default=0.0)
+    min_value = db.Column(db.Float, nullable=True)
+    max_value = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<FleetWeeklyRollup {self.coffee_origin}/{self.coffee_type} {self.week_start} {self.component}>'
+
+
+class FleetWeeklyHistogram(db.Model):
+    """Log-spaced value histogram behind the rollup percentiles"""
+    __tablename__ = 'fleet_weekly_histogram'
+    __table_args__ = (
+        db.UniqueConstraint('coffee_origin', 'coffee_type', 'week_start', 'component', 'bin',
+                            name='uq_fleet_weekly_histogram'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    coffee_origin = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    coffee_type = db.Column(db.Integer, nullable=False, default=UNKNOWN)
+    week_start = db.Column(db.Date, nullable=False, index=True)
+    component = db.Column(db.String(32), nullable=False)
+    bin = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+def week_start_for(timestamp):
+    """Monday of the timestamp's ISO week"""
+    day = timestamp.date() if isinstance(timestamp, datetime) else timestamp
+    return day - timedelta(days=day.weekday())
+
+
+def histogram_bin(value):
+    if value <= 0:
+        return ZERO_BIN
+    return int(math.floor(math.log(value) / _LOG_GAMMA))
+
+
+def bin_value(index):
+    """Representative value of a histogram bin"""
+    if index == ZERO_BIN:
+        return 0.0
+    return 2 * HISTOGRAM_GAMMA ** (index + 1) / (HISTOGRAM_GAMMA + 1)
+
+
+def _rollup_rows(measurements):
+    """Aggregate (origin, type, timestamp, {component: value}) tuples into rollup and histogram rows"""
+    stats = {}
+    bins = {}
+    for origin, coffee_type, timestamp, values in measurements:
+        key = (UNKNOWN if origin is None else origin, UNKNOWN if coffee_type is None else coffee_type,
+               week_start_for(timestamp))
+        for component, value in values.items():
+            if value is None:
+                continue
+            value = float(value)
+            entry = stats.get(key + (component,))
+            if entry is None:
+                stats[key + (component,)] = [1, value, value * value, value, value]
+            else:
+                entry[0] += 1
+                entry[1] += value
+                entry[2] += value * value
+                entry[3] = min(entry[3], value)
+                entry[4] = max(entry[4], value)
+            bin_key = key + (component, histogram_bin(value))
+            bins[bin_key] = bins.get(bin_key, 0) + 1
+
+    stat_rows = [
+        {'coffee_origin': o, 'coffee_type': t, 'week_start': w, 'component': c,
+         'count': n, 'total': s, 'total_sq': sq, 'min_value': lo, 'max_value': hi}
+        for (o, t, w, c), (n, s, sq, lo, hi) in stats.items()
+    ]
+    bin_rows = [
+        {'coffee_origin': o, 'coffee_type': t, 'week_start': w, 'component': c, 'bin': b, 'count': n}
+        for (o, t, w, c, b), n in bins.items()
+    ]
+    return stat_rows, bin_rows
+
+
+ROLLUP_KEY = ['coffee_origin', 'coffee_type', 'week_start', 'component']
+ROLLUP_UPDATE = {'count': add, 'total': add, 'total_sq': add, 'min_value': minimum, 'max_value': maximum}
+HISTOGRAM_KEY = ROLLUP_KEY + ['bin']
+HISTOGRAM_UPDATE = {'count': add}
+
+
+def apply_rollup(session, measurements):
+    """Fold measurements into the rollup tables (two upsert statements, caller's transaction)"""
+    stat_rows, bin_rows = _rollup_rows(measurements)
+    upsert(session, FleetWeeklyRollup.__table__, stat_rows, ROLLUP_KEY, ROLLUP_UPDATE)
+    upsert(session, FleetWeeklyHistogram.__table__, bin_rows, HISTOGRAM_KEY, HISTOGRAM_UPDATE)
+    return {(row['coffee_origin'], row['coffee_type'], row['week_start']) for row in stat_rows}
+
+
+def record_measurement(session, measurement):
+    """Update the rollup for one ingested measurement; returns the touched (origin, type, week) keys"""
+    values = {component: getattr(measurement, attribute) for component, attribute in ROLLUP_COMPONENTS.items()}
+    return apply_rollup(session, [(measurement.coffee_origin, measurement.coffee_type, measurement.timestamp, values)])
+
+
+def _group_filter(column, value):
+    return column.is_(None) | (column == UNKNOWN) if value == UNKNOWN else column == value
+
+
+def _source_rows(session, serials, start=None, end=None, coffee_origin=None, coffee_type=None, batch_size=5000):
+    """(origin, type, timestamp, values) from the hot table plus the given devices' archived partitions.
+
+    The hot table is read for every device; archived rows are read only for
+    ``serials`` and skipped when the hot table still holds their id.
+    """
+    from src.models.measurement import Measurement
+    from src.models.measurement_archive import measurement_archive
+
+    attributes = list(ROLLUP_COMPONENTS.values())
+    columns = [Measurement.id, Measurement.coffee_origin, Measurement.coffee_type, Measurement.timestamp] + \
+        [getattr(Measurement, attribute) for attribute in attributes]
+    query = session.query(*columns).filter(Measurement.timestamp.isnot(None))
+    if start is not None:
+        query = query.filter(Measurement.timestamp >= start)
+    if end is not None:
+        query = query.filter(Measurement.timestamp < end)
+    if coffee_origin is not None:
+        query = query.filter(_group_filter(Measurement.coffee_origin, coffee_origin))
+    if coffee_type is not None:
+        query = query.filter(_group_filter(Measurement.coffee_type, coffee_type))
+
+    hot_ids = set()
+    for row in query.execution_options(yield_per=batch_size):
+        hot_ids.add(row[0])
+        yield row[1], row[2], row[3], dict(zip(ROLLUP_COMPONENTS, row[4:]))
+
+    names = ['id', 'coffee_origin', 'coffee_type', 'timestamp'] + attributes
+    for serial in sorted(serials):
+        for row in measurement_archive.read(serial, names, start, end):
+            if row[0] in hot_ids or row[3] is None or (end is not None and row[3] >= end):
+                continue
+            if coffee_origin is not None and (UNKNOWN if row[1] is None else row[1]) != coffee_origin:
+                continue
+            if coffee_type is not None and (UNKNOWN if row[2] is None else row[2]) != coffee_type:
+                continue
+            yield row[1], row[2], row[3], dict(zip(ROLLUP_COMPONENTS, row[4:]))
+
+
+def refresh_group(session, coffee_origin, coffee_type, week_start, device_serial=None, batch_size=5000):
+    """Recompute one (origin, type, week) group from raw rows (after an edit changed stored estimates).
+
+    Archived partitions are opened only for ``device_serial`` and the devices
+    the daily aggregate lists for that group and week.
+    """
+    from src.models.daily_aggregate import MeasurementDailyAgg
+
+    coffee_origin = UNKNOWN if coffee_origin is None else coffee_origin
+    coffee_type = UNKNOWN if coffee_type is None else coffee_type
+    for model in (FleetWeeklyHistogram, FleetWeeklyRollup):
+        session.execute(model.__table__.delete().where(
+            model.coffee_origin == coffee_origin, model.coffee_type == coffee_type, model.week_start == week_start
+        ))
+
+    serials = {serial for (serial,) in session.query(MeasurementDailyAgg.device_serial).filter(
+        MeasurementDailyAgg.coffee_origin == coffee_origin,
+        MeasurementDailyAgg.coffee_type == coffee_type,
+        MeasurementDailyAgg.day >= week_start,
+        MeasurementDailyAgg.day < week_start + timedelta(days=7)
+    ).distinct()}
+    if device_serial is not None:
+        serials.add(device_serial)
+
+    start = datetime.combine(week_start, datetime.min.time())
+    apply_rollup(session, _source_rows(session, serials, start, start + timedelta(days=7),
+                                       coffee_origin, coffee_type, batch_size))
+    return {(coffee_origin, coffee_type, week_start)}
+
+
+def rebuild_rollup(session, batch_size=5000):
+    """Recompute both rollup tables from the measurements table and the archive"""
+    from src.models.device import Device
+    from src.models.measurement import Measurement
+
+    session.execute(FleetWeeklyHistogram.__table__.delete())
+    session.execute(FleetWeeklyRollup.__table__.delete())
+
+    serials = {serial for (serial,) in session.query(Measurement.device_serial).distinct()}
+    serials.update(serial for (serial,) in session.query(Device.device_serial))
+
+    # Aggregated while streaming: memory grows with the number of groups, not measurements
+    counted = [0]
+
+    def measurements():
+        for row in _source_rows(session, serials, batch_size=batch_size):
+            counted[0] += 1
+            yield row
+
+    apply_rollup(session, measurements())
+    session.commit()
+    return counted[0]
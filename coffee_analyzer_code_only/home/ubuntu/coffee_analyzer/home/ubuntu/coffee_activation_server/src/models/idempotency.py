@@ -0,0 +1,98 @@
+"""Idempotency keys for device ingest (measurements, knowledge entries, reports).
+
+Devices retry uploads whenever a response is lost, so every ingest row carries
+an ``idempotency_key`` that is unique per device. The key is the client's
+``Idempotency-Key`` header (or ``idempotency_key`` field) when one is sent;
+otherwise it is derived from the device, the payload timestamp and a hash of
+the canonical payload, so a byte-identical retry maps to the same row.
+
+Rows are written with INSERT ... ON CONFLICT DO NOTHING against the
+(device, idempotency_key) unique index; a conflicting retry inserts nothing
+and the caller answers with the id of the row stored the first time.
+"""
+import hashlib
+import json
+
+from src.models.migrations import add_missing_columns
+from src.models.upsert import insert_for
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+KEY_LENGTH = 64
+
+
+def _sha256(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def payload_digest(data):
+    """Hash of the payload in canonical form (sorted keys, compact separators)"""
+    payload = {k: v for k, v in data.items() if k != IDEMPOTENCY_FIELD}
+    return _sha256(json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str))
+
+
+def idempotency_key(owner, data, headers=None):
+    """Client-supplied key, or sha256(owner | timestamp | payload hash)"""
+    key = (headers.get(IDEMPOTENCY_HEADER) if headers is not None else None) or data.get(IDEMPOTENCY_FIELD)
+    if key is not None and str(key).strip():
+        key = str(key).strip()
+        # Over-long client keys are hashed down to the column width
+        return key if len(key) <= KEY_LENGTH else _sha256(key)
+    return _sha256(f'{owner}|{data.get("timestamp", "")}|{payload_digest(data)}')
+
+
+def row_values(instance):
+    """Column values of an unsaved model instance for a Core INSERT.
+
+    Unset columns with a scalar default take it on the instance too, so the
+    instance matches the stored row; other unset columns are left to the database.
+    """
+    values = {}
+    for column in instance.__table__.columns:
+        if column.primary_key:
+            continue
+        value = getattr(instance, column.key)
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+            setattr(instance, column.key, value)
+        if value is not None:
+            values[column.name] = value
+    return values
+
+
+def existing_id(session, model, owner_column, owner, key):
+    """Id of the row already stored under (owner, key), or None"""
+    return session.query(model.id).filter(
+        getattr(model, owner_column) == owner, model.idempotency_key == key
+    ).scalar()
+
+
+def insert_once(session, instance, owner_column):
+    """INSERT ... ON CONFLICT DO NOTHING for a keyed instance; returns (row id, created).
+
+    On success the instance's id is set so callers can keep using it; on a
+    conflict nothing is written and the original row's id is returned.
+    """
+    model = type(instance)
+    table = model.__table__
+    stmt, dialect = insert_for(session, table)
+    stmt = stmt.values(row_values(instance))
+    if dialect in ('mysql', 'mariadb'):
+        # No DO NOTHING on MySQL; a no-op assignment leaves the original row untouched
+        stmt = stmt.on_duplicate_key_update(idempotency_key=table.c.idempotency_key)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[owner_column, 'idempotency_key'])
+
+    result = session.execute(stmt)
+    # A MySQL no-op update reports the matched row but no new primary key
+    if result.rowcount == 1 and result.inserted_primary_key and result.inserted_primary_key[0]:
+        instance.id = result.inserted_primary_key[0]
+        return instance.id, True
+    owner = getattr(instance, owner_column)
+    return existing_id(session, model, owner_column, owner, instance.idempotency_key), False
+
+
+def ensure_idempotency_columns(engine, models):
+    """Add idempotency_key and its unique index to tables created before the column existed"""
+    for model in models:
+        add_missing_columns(engine, model, ['idempotency_key'])
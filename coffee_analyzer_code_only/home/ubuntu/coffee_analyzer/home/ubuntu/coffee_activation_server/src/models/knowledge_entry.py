@@ -7,6 +7,9 @@ db = SQLAlchemy()
 class KnowledgeEntry(db.Model):
     """Model for knowledge base entries awaiting owner approval"""
     __tablename__ = 'knowledge_entries'
+    __table_args__ = (
+        db.Index('uq_knowledge_entries_idempotency', 'device_serial', 'idempotency_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_serial = db.Column(db.String(32), nullable=False, index=True)
@@ -16,6 +19,7 @@ class KnowledgeEntry(db.Model):
     coffee_type = db.Column(db.Integer, nullable=True) # 0: Green, 1: Roasted, 2: Ground
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     approved = db.Column(db.Boolean, default=False) # Flag for owner approval
+    idempotency_key = db.Column(db.String(64), nullable=True) # Deduplicates retried uploads per device
     
     def __repr__(self):
         return f'<KnowledgeEntry {self.device_serial}: {self.sample_name or "Unknown"} (Approved: {self.approved})>'
@@ -7,6 +7,10 @@ db = SQLAlchemy()
 class Measurement(db.Model):
     """Model for coffee measurement data including NIR readings and estimated CO2"""
     __tablename__ = 'measurements'
+    __table_args__ = (
+        # Retried uploads conflict here and are stored once (see src/models/idempotency.py)
+        db.Index('uq_measurements_idempotency', 'device_serial', 'idempotency_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_serial = db.Column(db.String(32), nullable=False, index=True)
@@ -37,6 +41,13 @@ class Measurement(db.Model):
     # Analysis results (if available)
     analysis_results = db.Column(db.Text, nullable=True)  # JSON string for detailed analysis
     
+    # Ingest-time anomaly detection against the device's own history
+    is_anomaly = db.Column(db.Boolean, default=False, index=True)
+    anomaly_flags = db.Column(db.Text, nullable=True)  # JSON list of flagged features
+    
+    # Client-supplied or payload-derived deduplication key (unique per device)
+    idempotency_key = db.Column(db.String(64), nullable=True)
+    
     def __repr__(self):
         return f'<Measurement {self.device_serial}: {self.sample_name or "Unknown"} at {self.timestamp}>'
     
@@ -44,6 +55,7 @@ class Measurement(db.Model):
         """Convert measurement object to dictionary"""
         nir_data_dict = {}
         analysis_results_dict = {}
+        anomaly_flags_list = []
         
         try:
             nir_data_dict = json.loads(self.nir_data) if self.nir_data else {}
@@ -54,6 +66,11 @@ class Measurement(db.Model):
             analysis_results_dict = json.loads(self.analysis_results) if self.analysis_results else {}
         except:
             analysis_results_dict = {}
+        
+        try:
+            anomaly_flags_list = json.loads(self.anomaly_flags) if self.anomaly_flags else []
+        except:
+            anomaly_flags_list = []
             
         return {
             'id': self.id,
@@ -73,7 +90,9 @@ class Measurement(db.Model):
             'measurement_mode': self.measurement_mode,
             'quality_score': self.quality_score,
             'notes': self.notes,
-            'analysis_results': analysis_results_dict
+            'analysis_results': analysis_results_dict,
+            'is_anomaly': bool(self.is_anomaly),
+            'anomaly_flags': anomaly_flags_list
         }
     
     @property
@@ -0,0 +1,238 @@
+"""Time-partitioned Parquet archive for old measurements.
+
+Measurements older than the retention age are moved out of the ``measurements``
+table into one compressed Parquet file per device per month::
+
+    <archive root>/<device_serial>/<YYYY-MM>.parquet
+
+Readers combine the hot table with the archived partitions that overlap the
+requested date range; partitions outside the range are never opened.
+"""
+import os
+from calendar import monthrange
+from datetime import datetime, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from src.models.measurement import Measurement, db
+
+DEFAULT_ARCHIVE_DIR = os.environ.get(
+    'MEASUREMENT_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'archive', 'measurements')
+)
+DEFAULT_RETENTION_DAYS = 180
+COMPRESSION = 'zstd'
+DELETE_CHUNK_SIZE = 500
+
+
+def _arrow_schema():
+    types = {
+        'id': pa.int64(),
+        'timestamp': pa.timestamp('us'),
+        'coffee_type': pa.int32(),
+        'coffee_origin': pa.int32(),
+        'measurement_mode': pa.int32(),
+        'is_anomaly': pa.bool_(),
+    }
+    fields = []
+    for column in Measurement.__table__.columns:
+        if column.name in types:
+            fields.append(pa.field(column.name, types[column.name]))
+        elif isinstance(column.type, db.Float):
+            fields.append(pa.field(column.name, pa.float64()))
+        else:
+            fields.append(pa.field(column.name, pa.string()))
+    return pa.schema(fields)
+
+
+def _safe_serial(device_serial):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in device_serial)
+
+
+class MeasurementArchive:
+    """Reads and writes the per-device, per-month Parquet partitions"""
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR):
+        self.root = root
+
+    def device_dir(self, device_serial):
+        return os.path.join(self.root, _safe_serial(device_serial))
+
+    def partition_path(self, device_serial, year, month):
+        return os.path.join(self.device_dir(device_serial), f'{year:04d}-{month:02d}.parquet')
+
+    def partitions(self, device_serial, start_date=None, end_date=None):
+        """(year, month, path) of the device's partitions overlapping [start_date, end_date]"""
+        directory = self.device_dir(device_serial)
+        if not os.path.isdir(directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.parquet'):
+                continue
+            try:
+                year, month = int(name[:4]), int(name[5:7])
+            except ValueError:
+                continue
+            month_start = datetime(year, month, 1)
+            month_end = datetime(year, month, monthrange(year, month)[1], 23, 59, 59, 999999)
+            # Partition pruning by date
+            if start_date is not None and month_end < start_date:
+                continue
+            if end_date is not None and month_start > end_date:
+                continue
+            result.append((year, month, os.path.join(directory, name)))
+        return result
+
+    def has_partitions(self, device_serial, start_date=None, end_date=None):
+        return bool(self.partitions(device_serial, start_date, end_date))
+
+    def write_partition(self, device_serial, year, month, rows):
+        """Merge rows (dicts) into a month partition; rewrites the file atomically"""
+        if pq is None:
+            raise RuntimeError('pyarrow is required to archive measurements')
+        schema = _arrow_schema()
+        path = self.partition_path(device_serial, year, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        table = pa.Table.from_pylist(rows, schema=schema)
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=schema)
+            # Re-archiving the same ids (e.g. after an interrupted run) keeps the newest copy
+            new_ids = set(table.column('id').to_pylist())
+            keep = [i not in new_ids for i in existing.column('id').to_pylist()]
+            table = pa.concat_tables([existing.filter(pa.array(keep, type=pa.bool_())), table])
+        table = table.sort_by([('timestamp', 'ascending'), ('id', 'ascending')])
+
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression=COMPRESSION)
+        os.replace(tmp_path, path)
+        return table.num_rows
+
+    def read(self, device_serial, columns, start_date=None, end_date=None,
+             coffee_type=None, coffee_origin=None, not_null=None):
+        """Archived rows as tuples ordered like ``columns``"""
+        partitions = self.partitions(device_serial, start_date, end_date)
+        if not partitions or pq is None:
+            return []
+
+        filters = []
+        if start_date is not None:
+            filters.append(('timestamp', '>=', start_date))
+        if end_date is not None:
+            filters.append(('timestamp', '<=', end_date))
+        if coffee_type is not None:
+            filters.append(('coffee_type', '==', coffee_type))
+        if coffee_origin is not None:
+            filters.append(('coffee_origin', '==', coffee_origin))
+
+        rows = []
+        for _, _, path in partitions:
+            table = pq.read_table(path, columns=list(columns), filters=filters or None)
+            if not_null is not None:
+                table = table.filter(table.column(not_null).is_valid())
+            arrays = [table.column(name).to_pylist() for name in columns]
+            rows.extend(zip(*arrays))
+        return rows
+
+
+measurement_archive = MeasurementArchive()
+
+
+def combined_rows(query, device_serial, names, start_date=None, end_date=None,
+                  coffee_type=None, coffee_origin=None, not_null=None, archive=None):
+    """Rows for ``names`` from the hot query plus overlapping archived partitions.
+
+    ``query`` must already carry the same filters; the result is ordered by
+    timestamp. Without archived partitions in range this is just the projected
+    hot query.
+    """
+    archive = archive or measurement_archive
+    selected = list(names)
+    for required in ('id', 'timestamp'):
+        if required not in selected:
+            selected.append(required)
+
+    columns = [getattr(Measurement, name) for name in selected]
+    hot_rows = query.with_entities(*columns).order_by(None).order_by(Measurement.timestamp).all()
+    archived_rows = archive.read(device_serial, selected, start_date, end_date,
+                                 coffee_type, coffee_origin, not_null)
+    if not archived_rows:
+        rows = hot_rows
+    else:
+        id_index = selected.index('id')
+        hot_ids = {row[id_index] for row in hot_rows}
+        rows = [row for row in archived_rows if row[id_index] not in hot_ids]
+        rows.extend(hot_rows)
+        timestamp_index = selected.index('timestamp')
+        rows.sort(key=lambda row: row[timestamp_index])
+
+    width = len(names)
+    if width == len(selected):
+        return [tuple(row) for row in rows]
+    return [tuple(row[:width]) for row in rows]
+
+
+def archive_measurements(older_than_days=DEFAULT_RETENTION_DAYS, device_serial=None,
+                         dry_run=False, archive=None, batch_size=5000):
+    """Move measurements older than the retention age into the archive.
+
+    Each device is processed month by month: the partition is written first
+    and the hot rows are deleted afterwards, so an interrupted run only leaves
+    rows in both places (readers de-duplicate by id) and never loses data.
+    """
+    archive = archive or measurement_archive
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    table = Measurement.__table__
+
+    serial_query = db.session.query(Measurement.device_serial).filter(Measurement.timestamp < cutoff)
+    if device_serial:
+        serial_query = serial_query.filter(Measurement.device_serial == device_serial)
+    serials = [row[0] for row in serial_query.distinct().all()]
+
+    summary = {'cutoff': cutoff.isoformat(), 'devices': 0, 'partitions': 0, 'archived': 0, 'dry_run': dry_run}
+    for serial in serials:
+        summary['devices'] += 1
+        rows_query = db.session.query(*table.columns).filter(
+            Measurement.device_serial == serial,
+            Measurement.timestamp < cutoff
+        ).order_by(Measurement.timestamp, Measurement.id).execution_options(yield_per=batch_size)
+
+        current_month = None
+        month_rows = []
+        archived_ids = []
+        for row in rows_query:
+            row = dict(row._mapping)
+            month = (row['timestamp'].year, row['timestamp'].month)
+            if month != current_month and month_rows:
+                archived_ids.extend(_flush_month(archive, serial, current_month, month_rows, dry_run, summary))
+                month_rows = []
+            current_month = month
+            month_rows.append(row)
+        if month_rows:
+            archived_ids.extend(_flush_month(archive, serial, current_month, month_rows, dry_run, summary))
+
+        if dry_run:
+            continue
+        # Delete only after the device's partitions are safely on disk
+        for i in range(0, len(archived_ids), DELETE_CHUNK_SIZE):
+            db.session.execute(
+                table.delete().where(table.c.id.in_(archived_ids[i:i + DELETE_CHUNK_SIZE]))
+            )
+        db.session.commit()
+
+    return summary
+
+
+def _flush_month(archive, device_serial, month, rows, dry_run, summary):
+    """Write one month partition; returns the archived ids"""
+    summary['partitions'] += 1
+    summary['archived'] += len(rows)
+    if not dry_run:
+        archive.write_partition(device_serial, month[0], month[1], rows)
+    return [row['id'] for row in rows]
@@ -0,0 +1,51 @@
+"""Additive schema upgrades for databases created by an older version.
+
+``create_all()`` only creates missing tables, so columns added to an existing
+model never reach a database that already has the table. ``upgrade_schema``
+adds them with ALTER TABLE ... ADD COLUMN (plus any index on them) when the
+app starts. Added columns must be nullable; existing rows get NULL.
+"""
+from sqlalchemy import inspect, text
+
+from src.models.blend_profile import BlendProfile, BlendSample
+from src.models.measurement import Measurement
+
+# Columns added to existing tables after their first release
+ADDED_COLUMNS = [
+    (Measurement, ('is_anomaly', 'anomaly_flags')),
+    (BlendProfile, ('spectrum_mean', 'spectrum_covariance')),
+    (BlendSample, ('spectrum',)),
+]
+
+
+def add_missing_columns(engine, model, names):
+    """ALTER TABLE ... ADD COLUMN for each of ``names`` the table lacks, then create their indexes"""
+    table = model.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    quote = engine.dialect.identifier_preparer.quote
+
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'
+            ))
+        added.append(name)
+
+    for index in table.indexes:
+        if any(column.name in names for column in index.columns):
+            index.create(engine, checkfirst=True)
+    return added
+
+
+def upgrade_schema(engine):
+    """Bring tables created by older versions up to the current models"""
+    for model, names in ADDED_COLUMNS:
+        add_missing_columns(engine, model, names)
@@ -0,0 +1,119 @@
+"""Read/write split: reporting reads go to a replica, everything else to the primary.
+
+Set ``SQLALCHEMY_REPLICA_URL`` (app config or environment variable) to a read
+replica of the primary database. Reporting routes take their session from
+``read_session(db)``; without a replica configured, that is simply the
+primary session, so ingest and reporting behave as before.
+
+Read-your-writes: after a client's write request (POST/PUT/PATCH/DELETE)
+succeeds, that client's reads stay on the primary for
+``READ_YOUR_WRITES_SECONDS`` (default 5) to cover replica lag. The window is
+carried in a cookie, so it holds across worker processes, and is also
+remembered per client address for clients that don't keep cookies (relayed
+to the other workers over src/monitoring/worker_bus.py). That
+fallback is coarse: every client behind the same NAT or reverse proxy shares
+one address, so one of them writing pins all of them to the primary for the
+window. Behind a proxy, set ``remote_addr`` from the forwarded header (e.g.
+werkzeug's ``ProxyFix``) so clients are told apart at all.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.monitoring.worker_bus import worker_bus
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+STICKY_COOKIE = 'primary_until'
+DEFAULT_WINDOW_SECONDS = 5.0
+MAX_TRACKED_CLIENTS = 10000
+
+
+class ReplicaRouter:
+    """Hands out replica sessions for reads unless the client recently wrote"""
+
+    def __init__(self):
+        self.engine = None
+        self.window = DEFAULT_WINDOW_SECONDS
+        self._sessionmaker = None
+        self._recent_writers = OrderedDict()  # client address -> primary-until timestamp
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._sessionmaker is not None
+
+    def init_app(self, app):
+        self.engine = None
+        self._sessionmaker = None
+        with self._lock:
+            self._recent_writers.clear()
+        url = app.config.get('SQLALCHEMY_REPLICA_URL', os.environ.get('SQLALCHEMY_REPLICA_URL'))
+        self.window = float(app.config.get(
+            'READ_YOUR_WRITES_SECONDS', os.environ.get('READ_YOUR_WRITES_SECONDS', DEFAULT_WINDOW_SECONDS)
+        ))
+        if not url:
+            return
+        self.engine = create_engine(url, **app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS', {}))
+        self._sessionmaker = sessionmaker(bind=self.engine)
+        app.after_request(self._mark_write)
+        app.teardown_appcontext(self._close_session)
+
+    def sticky(self):
+        """True while the current client is inside its read-your-writes window"""
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        with self._lock:
+            until = self._recent_writers.get(request.remote_addr)
+        return until is not None and until > now
+
+    def session(self, primary_db):
+        if not self.enabled or not has_request_context() or self.sticky():
+            return primary_db.session
+        session = g.get('_replica_session')
+        if session is None:
+            session = self._sessionmaker()
+            g._replica_session = session
+        return session
+
+    def _mark_write(self, response):
+        if request.method not in WRITE_METHODS or response.status_code >= 400 or self.window <= 0:
+            return response
+        until = time.time() + self.window
+        response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=math.ceil(self.window),
+                            httponly=True, samesite='Lax')
+        self.remember_writer([request.remote_addr, until])
+        worker_bus.publish('read_routing', [request.remote_addr, until])
+        return response
+
+    def remember_writer(self, writer):
+        address, until = writer
+        with self._lock:
+            self._recent_writers[address] = until
+            self._recent_writers.move_to_end(address)
+            while len(self._recent_writers) > MAX_TRACKED_CLIENTS:
+                self._recent_writers.popitem(last=False)
+
+    @staticmethod
+    def _close_session(exc):
+        session = g.pop('_replica_session', None)
+        if session is not None:
+            session.close()
+
+
+replica_router = ReplicaRouter()
+worker_bus.subscribe('read_routing', replica_router.remember_writer)
+
+
+def read_session(db):
+    """Session for a read-only reporting query: the replica when safe, else ``db.session``"""
+    return replica_router.session(db)
@@ -0,0 +1,277 @@
+"""Projection-based serializers for list and export responses.
+
+Instead of hydrating ORM objects and calling ``to_dict()`` (which re-parses the
+JSON text columns and formats each timestamp field by field), these
+serializers select only the requested columns as row tuples and encode the
+whole response in one go. With orjson >= 3.9 stored JSON text is checked and
+passed through as ``orjson.Fragment``; older orjson versions and the stdlib
+``json`` module (when orjson is missing) decode it and encode plain dicts.
+Stored text that is not valid JSON is emitted as ``{}``/``[]``, like to_dict().
+"""
+import json
+from datetime import date, datetime
+
+from flask import Response
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+# orjson.Fragment (3.9+) embeds stored JSON text without decoding it
+FRAGMENTS = orjson is not None and hasattr(orjson, 'Fragment')
+
+from src.models.blend_profile import BlendSample
+from src.models.device import Device
+from src.models.device_report import DeviceReport
+from src.models.knowledge_entry import KnowledgeEntry
+from src.models.measurement import Measurement
+
+# Field kinds
+PLAIN = 'plain'
+TIMESTAMP = 'timestamp'   # date/datetime -> ISO 8601 string
+JSON_TEXT = 'json'        # JSON stored as text -> emitted unparsed
+JSON_LIST_TEXT = 'json_list'  # as JSON_TEXT, but ``[]`` when empty
+FLOAT32_BLOB = 'float32_blob'  # packed float32 array -> list of numbers
+
+
+class RawJSON:
+    """Already-encoded JSON embedded as-is in a response (or its decoded ``value`` without fragments)"""
+    __slots__ = ('text', 'value')
+
+    def __init__(self, text=None, value=None):
+        self.text = text
+        self.value = value
+
+
+class FieldSpec:
+    """Ordered output fields for a model: name -> (column, kind)"""
+
+    def __init__(self, fields, computed=None):
+        self.fields = fields
+        # name -> (source field names, function(row_dict) -> value)
+        self.computed = computed or {}
+        self.names = list(fields) + list(self.computed)
+
+    def resolve(self, fields_param, default=None):
+        """Validate a ``fields=`` query argument; returns (names, unknown names)"""
+        if not fields_param:
+            return list(default or self.names), []
+        requested = [name.strip() for name in fields_param.split(',') if name.strip()]
+        unknown = [name for name in requested if name not in self.fields and name not in self.computed]
+        return requested, unknown
+
+
+MEASUREMENT_FIELDS = FieldSpec({
+    'id': (Measurement.id, PLAIN),
+    'device_serial': (Measurement.device_serial, PLAIN),
+    'timestamp': (Measurement.timestamp, TIMESTAMP),
+    'nir_data': (Measurement.nir_data, JSON_TEXT),
+    'estimated_co2': (Measurement.estimated_co2, PLAIN),
+    'estimated_protein': (Measurement.estimated_protein, PLAIN),
+    'estimated_amino_acids': (Measurement.estimated_amino_acids, PLAIN),
+    'estimated_minerals': (Measurement.estimated_minerals, PLAIN),
+    'estimated_flavor_compounds': (Measurement.estimated_flavor_compounds, PLAIN),
+    'estimated_moisture': (Measurement.estimated_moisture, PLAIN),
+    'sample_name': (Measurement.sample_name, PLAIN),
+    'sample_type': (Measurement.sample_type, PLAIN),
+    'coffee_type': (Measurement.coffee_type, PLAIN),
+    'coffee_origin': (Measurement.coffee_origin, PLAIN),
+    'measurement_mode': (Measurement.measurement_mode, PLAIN),
+    'quality_score': (Measurement.quality_score, PLAIN),
+    'notes': (Measurement.notes, PLAIN),
+    'analysis_results': (Measurement.analysis_results, JSON_TEXT),
+    'is_anomaly': (Measurement.is_anomaly, PLAIN),
+    'anomaly_flags': (Measurement.anomaly_flags, JSON_LIST_TEXT),
+})
+
+
+def _days_since(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return (datetime.utcnow() - value).days
+    return (datetime.utcnow().date() - value).days
+
+
+DEVICE_FIELDS = FieldSpec({
+    'id': (Device.id, PLAIN),
+    'device_id': (Device.device_id, PLAIN),
+    'device_serial': (Device.device_serial, PLAIN),
+    'device_name': (Device.device_name, PLAIN),
+    'activation_level': (Device.activation_level, PLAIN),
+    'activation_key': (Device.activation_key, PLAIN),
+    'manufacture_date': (Device.manufacture_date, TIMESTAMP),
+    'first_boot_date': (Device.first_boot_date, TIMESTAMP),
+    'first_internet_date': (Device.first_internet_date, TIMESTAMP),
+    'created_at': (Device.created_at, TIMESTAMP),
+    'last_seen': (Device.last_seen, TIMESTAMP),
+    'updated_at': (Device.updated_at, TIMESTAMP),
+}, computed={
+    'days_since_manufacture': (['manufacture_date'], lambda row: _days_since(row['manufacture_date'])),
+    'days_since_first_boot': (['first_boot_date'], lambda row: _days_since(row['first_boot_date'])),
+    'days_since_first_internet': (['first_internet_date'], lambda row: _days_since(row['first_internet_date'])),
+})
+
+DEVICE_REPORT_FIELDS = FieldSpec({
+    'id': (DeviceReport.id, PLAIN),
+    'device_id': (DeviceReport.device_id, PLAIN),
+    'measurement_count': (DeviceReport.measurement_count, PLAIN),
+    'error_count': (DeviceReport.error_count, PLAIN),
+    'uptime_hours': (DeviceReport.uptime_hours, PLAIN),
+    'wifi_signal': (DeviceReport.wifi_signal, PLAIN),
+    'free_heap': (DeviceReport.free_heap, PLAIN),
+    'current_mode': (DeviceReport.current_mode, PLAIN),
+    'additional_data': (DeviceReport.additional_data, JSON_TEXT),
+    'created_at': (DeviceReport.created_at, TIMESTAMP),
+})
+
+BLEND_SAMPLE_FIELDS = FieldSpec({
+    'id': (BlendSample.id, PLAIN),
+    'profile_id': (BlendSample.profile_id, PLAIN),
+    'sample_name': (BlendSample.sample_name, PLAIN),
+    'sensor_reading_1': (BlendSample.sensor_reading_1, PLAIN),
+    'sensor_reading_2': (BlendSample.sensor_reading_2, PLAIN),
+    'sensor_reading_3': (BlendSample.sensor_reading_3, PLAIN),
+    'spectrum': (BlendSample.spectrum, FLOAT32_BLOB),
+    'chemical_data': (BlendSample.chemical_data, JSON_TEXT),
+    'notes': (BlendSample.notes, PLAIN),
+    'created_at': (BlendSample.created_at, TIMESTAMP),
+})
+
+KNOWLEDGE_ENTRY_FIELDS = FieldSpec({
+    'id': (KnowledgeEntry.id, PLAIN),
+    'device_serial': (KnowledgeEntry.device_serial, PLAIN),
+    'sample_name': (KnowledgeEntry.sample_name, PLAIN),
+    'chemical_data': (KnowledgeEntry.chemical_data, JSON_TEXT),
+    'sensor_data': (KnowledgeEntry.sensor_data, JSON_TEXT),
+    'coffee_type': (KnowledgeEntry.coffee_type, PLAIN),
+    'timestamp': (KnowledgeEntry.timestamp, TIMESTAMP),
+    'approved': (KnowledgeEntry.approved, PLAIN),
+})
+
+
+# --- Encoding ---
+
+def _stored_value(value, empty='{}'):
+    """Decoded stored JSON, or ``empty`` when the column is empty/not JSON (matches to_dict())"""
+    if value and value.lstrip()[:1] in ('{', '['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return json.loads(empty)
+
+
+def _stored_text(value, empty='{}'):
+    """Stored JSON text when it is valid as-is; otherwise re-encoded (e.g. NaN) or ``empty``"""
+    if value and value.lstrip()[:1] in ('{', '['):
+        try:
+            orjson.loads(value)
+            return value
+        except orjson.JSONDecodeError:
+            pass
+    return orjson.dumps(_stored_value(value, empty))
+
+
+def stored_json(value, empty='{}'):
+    """Stored JSON text column as a RawJSON to embed in a :func:`json_response` payload"""
+    if FRAGMENTS:
+        return RawJSON(_stored_text(value, empty))
+    return RawJSON(value=_stored_value(value, empty))
+
+
+def _blob_floats(value):
+    """Packed float32 bytes as a list of floats (None when empty)"""
+    return np.frombuffer(value, dtype=np.float32).tolist() if value else None
+
+
+def _default(value):
+    """Types neither encoder handles natively"""
+    if isinstance(value, RawJSON):
+        if value.text is None:
+            return value.value
+        return orjson.Fragment(value.text) if FRAGMENTS else json.loads(value.text)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def serialize_query(query, spec, fields=None):
+    """Run ``query`` as a column projection and encode its rows as a JSON array.
+
+    Returns ``(RawJSON, row_count)``; the RawJSON can be embedded in a
+    response built with :func:`json_response`.
+    """
+    fields = fields or spec.names
+    selected = source_fields(spec, fields)
+    columns = [spec.fields[name][0] for name in selected]
+    rows = query.with_entities(*columns).all()
+    return encode_rows(rows, spec, selected, fields), len(rows)
+
+
+def source_fields(spec, fields):
+    """Stored columns needed to produce ``fields`` (computed fields expanded)"""
+    selected = []
+    for name in fields:
+        if name in spec.fields:
+            if name not in selected:
+                selected.append(name)
+        else:
+            for source in spec.computed[name][0]:
+                if source not in selected:
+                    selected.append(source)
+    return selected
+
+
+def encode_rows(rows, spec, selected, fields):
+    """Encode projected row tuples (ordered as ``selected``) to a JSON array"""
+    index = {name: i for i, name in enumerate(selected)}
+    output = []
+    for name in fields:
+        if name in spec.fields:
+            output.append((name, index[name], spec.fields[name][1], None))
+        else:
+            output.append((name, None, 'computed', spec.computed[name][1]))
+    needs_row_dict = any(kind == 'computed' for _, _, kind, _ in output)
+
+    items = []
+    for row in rows:
+        row_dict = dict(zip(selected, row)) if needs_row_dict else None
+        item = {}
+        for name, i, kind, func in output:
+            if kind in (JSON_TEXT, JSON_LIST_TEXT):
+                empty = '[]' if kind == JSON_LIST_TEXT else '{}'
+                if FRAGMENTS:
+                    item[name] = orjson.Fragment(_stored_text(row[i], empty))
+                else:
+                    item[name] = _stored_value(row[i], empty)
+            elif kind == FLOAT32_BLOB:
+                item[name] = _blob_floats(row[i])
+            elif kind == 'computed':
+                item[name] = func(row_dict)
+            else:
+                item[name] = row[i]
+        items.append(item)
+    if FRAGMENTS:
+        return RawJSON(orjson.dumps(items))
+    return RawJSON(value=items)
+
+
+def dumps(payload):
+    """Encode a response payload that may contain RawJSON fragments"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Fast replacement for ``jsonify(payload), status``"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def unknown_fields_response(unknown):
+    return json_response({
+        'success': False,
+        'message': f"حقول غير معروفة: {', '.join(unknown)}"
+    }, 400)
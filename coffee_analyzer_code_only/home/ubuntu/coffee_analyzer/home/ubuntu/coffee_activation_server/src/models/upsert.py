@@ -0,0 +1,94 @@
+"""Dialect-aware INSERT ... ON CONFLICT helpers (SQLite, PostgreSQL, MySQL)."""
+from sqlalchemy import func
+
+
+def _dialect_name(session, table):
+    return session.get_bind(clause=table.select()).dialect.name
+
+
+def insert_for(session, table):
+    """Dialect-specific INSERT construct supporting conflict clauses"""
+    dialect = _dialect_name(session, table)
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'upsert is not supported for {dialect}')
+    return insert(table), dialect
+
+
+def least(dialect, a, b):
+    """Two-argument minimum (SQLite's scalar min(), LEAST elsewhere)"""
+    return func.min(a, b) if dialect == 'sqlite' else func.least(a, b)
+
+
+def greatest(dialect, a, b):
+    """Two-argument maximum (SQLite's scalar max(), GREATEST elsewhere)"""
+    return func.max(a, b) if dialect == 'sqlite' else func.greatest(a, b)
+
+
+# Rows per multi-row INSERT (keeps bind parameters under SQLite's limit)
+UPSERT_CHUNK_SIZE = 500
+
+
+def upsert(session, table, rows, key_columns, update_columns):
+    """Insert rows, updating conflicting rows on ``key_columns``.
+
+    ``update_columns`` maps a column name to a function
+    ``(dialect, existing_column, inserted_column) -> expression``. An empty
+    mapping turns the statement into INSERT ... DO NOTHING.
+    """
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        _upsert_chunk(session, table, rows[i:i + UPSERT_CHUNK_SIZE], key_columns, update_columns)
+
+
+def _upsert_chunk(session, table, rows, key_columns, update_columns):
+    stmt, dialect = insert_for(session, table)
+    stmt = stmt.values(rows)
+
+    if dialect in ('mysql', 'mariadb'):
+        inserted = stmt.inserted
+        if update_columns:
+            set_ = {name: update(dialect, table.c[name], inserted[name]) for name, update in update_columns.items()}
+        else:
+            # MySQL has no DO NOTHING; a no-op assignment on the first key column
+            set_ = {key_columns[0]: table.c[key_columns[0]]}
+        stmt = stmt.on_duplicate_key_update(**set_)
+    else:
+        excluded = stmt.excluded
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={name: update(dialect, table.c[name], excluded[name]) for name, update in update_columns.items()}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key_columns)
+    return session.execute(stmt)
+
+
+def add(dialect, existing, inserted):
+    return existing + inserted
+
+
+def minimum(dialect, existing, inserted):
+    return least(dialect, existing, inserted)
+
+
+def maximum(dialect, existing, inserted):
+    return greatest(dialect, existing, inserted)
+
+
+def replace(dialect, existing, inserted):
+    return inserted
+
+
+def nullable_minimum(dialect, existing, inserted):
+    """Minimum for nullable columns: NULL on either side means "no value yet", not NULL"""
+    return func.coalesce(least(dialect, existing, inserted), existing, inserted)
+
+
+def nullable_maximum(dialect, existing, inserted):
+    return func.coalesce(greatest(dialect, existing, inserted), existing, inserted)
@@ -0,0 +1,213 @@
+"""Compressed request and response bodies.
+
+Requests sent with ``Content-Encoding: gzip`` are decompressed before Flask
+parses them, so ingest routes see plain JSON. Decompression stops at
+``COMPRESSION_MAX_REQUEST_SIZE`` bytes of output (413 beyond it) to guard
+against decompression bombs. Brotli request bodies are refused (415): the
+brotli package can't bound the output of a single decompression step.
+
+Responses are compressed with the best encoding the client accepts (brotli,
+then gzip). Buffered JSON/CSV responses are compressed once they reach
+``COMPRESSION_MIN_SIZE`` bytes; streamed responses (the live feed) are
+compressed chunk by chunk with a flush after each chunk, so events are not
+held back in the compressor. Strong ETags become weak on compressed responses.
+
+Disable with ``COMPRESSION_ENABLED=false`` (app config or environment).
+"""
+import io
+import json
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REQUEST_ENCODINGS = ('gzip',)
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/event-stream'}
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_MAX_REQUEST_SIZE = 16 * 1024 * 1024
+GZIP_LEVEL = 6
+# Brotli's higher qualities are too slow for dynamic responses
+BROTLI_QUALITY = 5
+READ_CHUNK = 64 * 1024
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+def _gzip_decompressor():
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def decompress_stream(stream, max_size, content_length=None):
+    """Decompress a gzip request body read from ``stream``; raises RequestTooLarge past ``max_size``"""
+    decompressor = _gzip_decompressor()
+
+    def feed(chunk):
+        # Bound each step's output so a small bomb can't expand all at once
+        out = decompressor.decompress(chunk, max_size + 1)
+        while decompressor.unconsumed_tail and len(out) <= max_size:
+            out += decompressor.decompress(decompressor.unconsumed_tail, max_size + 1 - len(out))
+        return out
+
+    output = bytearray()
+    remaining = content_length
+    while remaining is None or remaining > 0:
+        chunk = stream.read(READ_CHUNK if remaining is None else min(READ_CHUNK, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        output += feed(chunk)
+        if len(output) > max_size:
+            raise RequestTooLarge()
+    output += decompressor.flush()
+    if len(output) > max_size:
+        raise RequestTooLarge()
+    if not decompressor.eof:
+        raise zlib.error('truncated gzip stream')
+    return bytes(output)
+
+
+class DecompressRequestMiddleware:
+    """WSGI middleware replacing a compressed request body with its decompressed bytes"""
+
+    def __init__(self, wsgi_app, max_size=DEFAULT_MAX_REQUEST_SIZE):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.wsgi_app(environ, start_response)
+        if encoding not in REQUEST_ENCODINGS:
+            return self._error(start_response, '415 Unsupported Media Type',
+                               f'ترميز المحتوى غير مدعوم: {encoding}')
+
+        content_length = environ.get('CONTENT_LENGTH')
+        try:
+            body = decompress_stream(
+                environ['wsgi.input'], self.max_size, int(content_length) if content_length else None
+            )
+        except RequestTooLarge:
+            return self._error(start_response, '413 Request Entity Too Large',
+                               'حجم البيانات بعد فك الضغط يتجاوز الحد المسموح به')
+        except Exception:
+            return self._error(start_response, '400 Bad Request', 'تعذر فك ضغط البيانات المرسلة')
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        return self.wsgi_app(environ, start_response)
+
+    @staticmethod
+    def _error(start_response, status, message):
+        body = json.dumps({'success': False, 'message': message}, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
+
+
+def negotiate_encoding(accept_encodings):
+    """Best of br/gzip the client accepts (by q-value), or None"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_chunks(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each so the client sees it immediately"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+        def process(chunk):
+            return compressor.process(chunk) + compressor.flush()
+
+        def finish():
+            return compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+        def process(chunk):
+            return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish():
+            return compressor.flush()
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield process(chunk)
+        yield finish()
+    finally:
+        # Let the wrapped generator run its cleanup (e.g. live feed unsubscribe)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response, min_size=DEFAULT_MIN_SIZE):
+    """Compress a response in place when the client accepts it and it is worth it"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        if response.direct_passthrough:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    return response
+
+
+def _setting(app, name, default, cast=int):
+    return cast(app.config.get(name, os.environ.get(name, default)))
+
+
+def init_compression(app):
+    """Install request decompression and negotiated response compression unless disabled"""
+    enabled = app.config.get('COMPRESSION_ENABLED',
+                             os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    if not enabled:
+        return
+
+    app.wsgi_app = DecompressRequestMiddleware(
+        app.wsgi_app, _setting(app, 'COMPRESSION_MAX_REQUEST_SIZE', DEFAULT_MAX_REQUEST_SIZE)
+    )
+    min_size = _setting(app, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+    @app.after_request
+    def _compress_response(response):
+        return compress_response(response, min_size)
@@ -0,0 +1,228 @@
+"""Request and database metrics exposed in Prometheus text format.
+
+Counters are kept in per-thread shards so the request path never takes a lock;
+shards are merged only when /metrics is scraped. Shards belonging to finished
+threads are folded into a retired shard so the threaded dev server (one thread
+per request) does not grow the shard list without bound.
+"""
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# name -> (type, help, buckets)
+METRIC_DEFINITIONS = {
+    'http_requests_total': ('counter', 'Total HTTP requests by route and status code', None),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency in seconds', LATENCY_BUCKETS),
+    'http_requests_in_flight': ('gauge', 'HTTP requests currently being served', None),
+    'http_request_db_queries': ('histogram', 'Database queries issued per HTTP request', QUERY_COUNT_BUCKETS),
+    'http_request_db_duration_seconds': ('histogram', 'Database time per HTTP request in seconds', LATENCY_BUCKETS),
+    'db_queries_total': ('counter', 'Total database queries by originating route', None),
+    'db_query_duration_seconds_total': ('counter', 'Total database time in seconds by originating route', None),
+}
+
+
+class _Shard:
+    """Metric values written by a single thread"""
+    __slots__ = ('thread', 'values', 'histograms')
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.values = {}      # (name, labels) -> float
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+
+class MetricsRegistry:
+    """Lock-free (per-thread) metrics storage with Prometheus rendering"""
+
+    def __init__(self, definitions=None):
+        self.definitions = definitions or METRIC_DEFINITIONS
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name, labels=(), value=1.0):
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0.0) + value
+
+    def dec(self, name, labels=(), value=1.0):
+        self.inc(name, labels, -value)
+
+    def observe(self, name, labels, value):
+        buckets = self.definitions[name][2]
+        histograms = self._shard().histograms
+        key = (name, labels)
+        hist = histograms.get(key)
+        if hist is None:
+            hist = [0] * (len(buckets) + 2)
+            histograms[key] = hist
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += value
+        hist[-1] += 1
+
+    def _merge_into(self, target, shard):
+        for key, value in shard.values.copy().items():
+            target.values[key] = target.values.get(key, 0.0) + value
+        for key, hist in shard.histograms.copy().items():
+            merged = target.histograms.get(key)
+            if merged is None:
+                target.histograms[key] = list(hist)
+            else:
+                for i, count in enumerate(hist):
+                    merged[i] += count
+
+    def collect(self):
+        """Merge all shards into a single snapshot"""
+        with self._shards_lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread is not None and not shard.thread.is_alive():
+                    self._merge_into(self._retired, shard)
+                else:
+                    live.append(shard)
+            self._shards = live
+
+            snapshot = _Shard()
+            self._merge_into(snapshot, self._retired)
+            for shard in live:
+                self._merge_into(snapshot, shard)
+        return snapshot
+
+    def render(self):
+        """Render the current snapshot in Prometheus text exposition format"""
+        snapshot = self.collect()
+        lines = []
+        for name, (metric_type, help_text, buckets) in self.definitions.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if metric_type == 'histogram':
+                for (metric, labels), hist in sorted(snapshot.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, hist):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(bound)),))} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {hist[-1]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(hist[-2])}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {hist[-1]}')
+            else:
+                for (metric, labels), value in sorted(snapshot.values.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+def _route_labels():
+    """Blueprint and route template for the current request (bounded cardinality)"""
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return (('blueprint', request.blueprint or ''), ('endpoint', rule))
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_db_queries = 0
+    g._metrics_db_time = 0.0
+    registry.inc('http_requests_in_flight')
+
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    registry.dec('http_requests_in_flight')
+
+    duration = time.perf_counter() - start
+    route = _route_labels()
+    method = (('method', request.method),)
+    status = g.pop('_metrics_status', 500 if exc is not None else 200)
+
+    registry.inc('http_requests_total', route + method + (('status', str(status)),))
+    registry.observe('http_request_duration_seconds', route + method, duration)
+    registry.observe('http_request_db_queries', route, g.pop('_metrics_db_queries', 0))
+    registry.observe('http_request_db_duration_seconds', route, g.pop('_metrics_db_time', 0.0))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    if has_request_context() and '_metrics_start' in g:
+        g._metrics_db_queries += 1
+        g._metrics_db_time += elapsed
+        route = _route_labels()
+    else:
+        route = (('blueprint', ''), ('endpoint', ''))
+    registry.inc('db_queries_total', route)
+    registry.inc('db_query_duration_seconds_total', route, elapsed)
+
+
+def metrics_view():
+    """Expose collected metrics for Prometheus scraping"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    """Install request middleware, the SQLAlchemy timing hook and the /metrics route"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    # Listen on the Engine class so every engine (one per SQLAlchemy instance) is covered
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics_view)
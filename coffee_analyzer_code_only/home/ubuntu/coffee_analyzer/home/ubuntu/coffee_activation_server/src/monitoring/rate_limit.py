@@ -0,0 +1,257 @@
+"""Token-bucket admission control for the device-facing endpoints.
+
+Every device-originated request (measurement and knowledge uploads, reports,
+activation status polls) takes one token from the device's bucket and one
+from a fleet-wide bucket. Buckets refill continuously at ``rate`` tokens per
+second up to ``burst``, so an offline device can flush a backlog in a burst
+but a misbehaving one is held to the steady rate.
+
+Device requests are not authenticated, so the serial a request names is only
+trusted together with the address it comes from: the device bucket is keyed
+on both. A client naming another device's serial fills a bucket of its own
+and cannot get the real device throttled. Behind a proxy, set ``remote_addr``
+from the forwarded header (e.g. werkzeug's ``ProxyFix``).
+
+Rejected requests get 429 with a ``Retry-After`` hint. For the global bucket
+the hint grows with the backlog of recently rejected requests (which drains at
+the global rate), so a reconnect wave is told to come back spread over time
+instead of all at once; admitted throughput stays at the global rate.
+
+Bucket state lives in a backend shared by all workers on the host: a small
+SQLite file by default (``RATE_LIMIT_BACKEND=sqlite``), or process memory
+(``memory``) for a single-process server. Settings come from app config or
+environment variables: ``RATE_LIMIT_ENABLED``, ``RATE_LIMIT_DEVICE_RATE``,
+``RATE_LIMIT_DEVICE_BURST``, ``RATE_LIMIT_GLOBAL_RATE``,
+``RATE_LIMIT_GLOBAL_BURST``, ``RATE_LIMIT_MAX_RETRY_AFTER`` and
+``RATE_LIMIT_STORE`` (SQLite path). If the backend fails, requests are
+admitted rather than rejected.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Endpoints called by the ESP32 firmware
+RATE_LIMITED_ENDPOINTS = {
+    'measurements.receive_measurement',
+    'knowledge.receive_knowledge_entry',
+    'reports.receive_device_report',
+    'activation.get_device_status',
+}
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'rate_limits.db')
+GLOBAL_KEY = 'global'
+BACKLOG_KEY = 'global:backlog'
+# Buckets idle this long are full again and can be forgotten
+IDLE_EXPIRY_SECONDS = 3600
+PRUNE_EVERY = 10000
+
+
+class TokenBucket:
+    """Refill rate (tokens/second) and capacity"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+
+    def level(self, state, now):
+        """Tokens available now, given the stored (tokens, updated) state"""
+        if state is None:
+            return self.burst
+        tokens, updated = state
+        return min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+
+    def wait(self, tokens):
+        """Seconds until one token is available"""
+        return max(0.0, 1.0 - tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+def admit(states, now, device_key, device_bucket, global_bucket, max_retry_after):
+    """Take one token from both buckets or none; returns (new states, retry_after or None)"""
+    device_tokens = device_bucket.level(states.get(device_key), now)
+    global_tokens = global_bucket.level(states.get(GLOBAL_KEY), now)
+    backlog = states.get(BACKLOG_KEY)
+    depth = max(0.0, backlog[0] - (now - backlog[1]) * global_bucket.rate) if backlog else 0.0
+
+    if device_tokens < 1.0:
+        # A single noisy device waits for its own bucket; it doesn't join the fleet backlog
+        retry_after = device_bucket.wait(device_tokens)
+        updates = {}
+    elif global_tokens < 1.0:
+        # Queue position: each rejected request is told to come back one slot later
+        depth += 1.0
+        retry_after = global_bucket.wait(global_tokens) + depth / global_bucket.rate
+        updates = {BACKLOG_KEY: (depth, now)}
+    else:
+        return {
+            device_key: (device_tokens - 1.0, now),
+            GLOBAL_KEY: (global_tokens - 1.0, now),
+            BACKLOG_KEY: (depth, now),
+        }, None
+    return updates, min(retry_after, max_retry_after)
+
+
+class MemoryBucketStore:
+    """Bucket state in process memory (one worker process)"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+        self._transactions = 0
+
+    def transact(self, keys, update):
+        with self._lock:
+            states = {key: self._states[key] for key in keys if key in self._states}
+            new_states, result = update(states)
+            self._states.update(new_states)
+            self._transactions += 1
+            if self._transactions % PRUNE_EVERY == 0:
+                cutoff = time.time() - IDLE_EXPIRY_SECONDS
+                self._states = {k: v for k, v in self._states.items() if v[1] >= cutoff}
+        return result
+
+
+class SQLiteBucketStore:
+    """Bucket state in a SQLite file shared by the worker processes on one host"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._transactions = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Bucket state is disposable; don't pay for fsync on every request
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def transact(self, keys, update):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ','.join('?' * len(keys))
+            rows = connection.execute(
+                f'SELECT key, tokens, updated FROM rate_limit_buckets WHERE key IN ({placeholders})', list(keys)
+            ).fetchall()
+            new_states, result = update({key: (tokens, updated) for key, tokens, updated in rows})
+            if new_states:
+                connection.executemany(
+                    'INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                    [(key, tokens, updated) for key, (tokens, updated) in new_states.items()]
+                )
+            self._transactions += 1
+            if self._transactions % PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM rate_limit_buckets WHERE updated < ?',
+                                   (time.time() - IDLE_EXPIRY_SECONDS,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return result
+
+
+class RateLimiter:
+    """Per-device and global token buckets over a shared store"""
+
+    def __init__(self, store=None, device_rate=1.0, device_burst=30, global_rate=500.0,
+                 global_burst=1000, max_retry_after=300):
+        self.store = store or MemoryBucketStore()
+        self.device_bucket = TokenBucket(device_rate, device_burst)
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_retry_after = max_retry_after
+
+    def check(self, device, now=None):
+        """None if the request is admitted, otherwise seconds the client should wait"""
+        now = time.time() if now is None else now
+        device_key = f'device:{device}'
+        return self.store.transact(
+            (device_key, GLOBAL_KEY, BACKLOG_KEY),
+            lambda states: admit(states, now, device_key, self.device_bucket,
+                                 self.global_bucket, self.max_retry_after)
+        )
+
+
+def request_device():
+    """Bucket identity of the current request: the claimed device (URL serial/id, then JSON body) at the client address"""
+    view_args = request.view_args or {}
+    device = view_args.get('device_serial') or view_args.get('device_id')
+    if not device:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            device = data.get('device_serial') or data.get('device_id')
+    address = f'addr:{request.remote_addr}'
+    return f'{device}@{address}' if device else address
+
+
+def rate_limited_response(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({
+        'success': False,
+        'message': 'تم تجاوز حد الطلبات المسموح به، يرجى إعادة المحاولة لاحقاً',
+        'retry_after': seconds
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def _setting(app, name, default, cast=float):
+    return cast(app.config.get(name, os.environ.get(name, default)))
+
+
+def init_rate_limit(app):
+    """Install admission control on the device-facing endpoints unless disabled"""
+    enabled = app.config.get('RATE_LIMIT_ENABLED',
+                             os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    if not enabled:
+        return None
+
+    backend = _setting(app, 'RATE_LIMIT_BACKEND', 'sqlite', str)
+    if backend == 'memory':
+        store = MemoryBucketStore()
+    elif backend == 'sqlite':
+        store = SQLiteBucketStore(_setting(app, 'RATE_LIMIT_STORE', DEFAULT_STORE_PATH, str))
+    else:
+        raise ValueError(f'Unknown RATE_LIMIT_BACKEND: {backend}')
+
+    limiter = RateLimiter(
+        store,
+        device_rate=_setting(app, 'RATE_LIMIT_DEVICE_RATE', 1.0),
+        device_burst=_setting(app, 'RATE_LIMIT_DEVICE_BURST', 30),
+        global_rate=_setting(app, 'RATE_LIMIT_GLOBAL_RATE', 500.0),
+        global_burst=_setting(app, 'RATE_LIMIT_GLOBAL_BURST', 1000),
+        max_retry_after=_setting(app, 'RATE_LIMIT_MAX_RETRY_AFTER', 300)
+    )
+
+    @app.before_request
+    def _admit_device_request():
+        if request.endpoint not in RATE_LIMITED_ENDPOINTS:
+            return None
+        try:
+            retry_after = limiter.check(request_device())
+        except Exception:
+            # Fail open: a broken limiter must not take ingest down with it
+            logger.exception('Rate limiter unavailable; admitting request')
+            return None
+        if retry_after is not None:
+            return rate_limited_response(retry_after)
+        return None
+
+    app.extensions['rate_limiter'] = limiter
+    return limiter
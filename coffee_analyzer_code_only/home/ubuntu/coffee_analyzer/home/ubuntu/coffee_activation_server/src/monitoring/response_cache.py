@@ -0,0 +1,271 @@
+"""Response cache for per-device statistics and listing endpoints.
+
+Views decorated with ``@cached_response(scope)`` are cached under
+(endpoint, scope, scope version, normalized query args). The scope names the
+data a response depends on, e.g. ``measurements:<serial>``; ingest calls
+``response_cache.bump(scope)`` after committing, which changes the version
+part of every key for that scope, so stale responses are never served again
+and simply age out. Entries also expire after a TTL.
+
+Backends:
+    memory  per-process LRU with a byte cap (default). Versions are per
+            process too; bumps are relayed to the other workers over the
+            worker bus (src/monitoring/worker_bus.py), and the TTL bounds
+            staleness if a relayed bump is lost.
+    redis   any Redis-compatible client (``get``/``set(ex=)``/``incr``/``setnx``),
+            shared by all workers. Configure the server with
+            ``maxmemory`` and ``maxmemory-policy allkeys-lru`` for the memory cap.
+
+Settings (app config or environment): ``RESPONSE_CACHE_ENABLED``,
+``RESPONSE_CACHE_BACKEND``, ``RESPONSE_CACHE_REDIS_URL``, ``RESPONSE_CACHE_TTL``,
+``RESPONSE_CACHE_MAX_BYTES``, ``RESPONSE_CACHE_MAX_ENTRIES``.
+
+With a read replica (src/models/read_routing.py) a response computed from a
+lagging replica right after a bump can be cached; the TTL bounds how long.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, jsonify, make_response, request
+
+from src.monitoring.worker_bus import worker_bus
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 10000
+CACHE_HEADER = 'X-Cache'
+
+
+def pack_response(response):
+    """status + mimetype + body as one bytes value"""
+    header = json.dumps([response.status_code, response.mimetype]).encode('utf-8')
+    return header + b'\n' + response.get_data()
+
+
+def unpack_response(value):
+    header, body = value.split(b'\n', 1)
+    status, mimetype = json.loads(header)
+    return Response(body, status=status, mimetype=mimetype)
+
+
+class MemoryCacheBackend:
+    """LRU of packed responses with TTL, an entry cap and a byte cap"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}            # never evicted: losing one could resurrect old entries
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def version(self, scope):
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def bump(self, scope):
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class RedisCacheBackend:
+    """Packed responses and version counters in a Redis-compatible store"""
+
+    def __init__(self, client, prefix='response-cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def _version_key(self, scope):
+        return f'{self.prefix}version:{scope}'
+
+    def version(self, scope):
+        key = self._version_key(scope)
+        value = self.client.get(key)
+        if value is None:
+            # Start from the clock rather than 0: if the server evicts a counter,
+            # the recreated one can't repeat a version that still has entries
+            self.client.setnx(key, int(time.time() * 1000))
+            value = self.client.get(key)
+        return int(value)
+
+    def bump(self, scope):
+        self.version(scope)
+        self.client.incr(self._version_key(scope))
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    """Versioned response cache over a pluggable backend"""
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL_SECONDS):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def bump(self, *scopes):
+        """Invalidate everything cached for these scopes (call after the ingest commit)"""
+        for scope in scopes:
+            self.backend.bump(scope)
+        if scopes and isinstance(self.backend, MemoryCacheBackend):
+            # Shared backends are already seen by every worker
+            worker_bus.publish('response_cache', list(scopes))
+
+    def bump_local(self, scopes):
+        for scope in scopes:
+            self.backend.bump(scope)
+
+    def key(self, scope):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f'{request.endpoint}|{scope}|{self.backend.version(scope)}|{args}'
+
+    def stats(self):
+        return dict(self.backend.stats(), hits=self.hits, misses=self.misses, ttl=self.ttl)
+
+
+response_cache = ResponseCache()
+worker_bus.subscribe('response_cache', response_cache.bump_local)
+
+
+def cached_response(scope):
+    """Cache a view's successful responses; ``scope(**view_args)`` names the data it depends on"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled:
+                return view(*args, **kwargs)
+            try:
+                key = response_cache.key(scope(**kwargs))
+                cached = response_cache.backend.get(key)
+            except Exception:
+                # Cache backend unavailable: serve uncached
+                return view(*args, **kwargs)
+
+            if cached is not None:
+                response_cache.hits += 1
+                response = unpack_response(cached)
+                response.headers[CACHE_HEADER] = 'HIT'
+                return response
+
+            response_cache.misses += 1
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                try:
+                    response_cache.backend.set(key, pack_response(response), response_cache.ttl)
+                except Exception:
+                    pass
+            response.headers[CACHE_HEADER] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def measurements_scope(device_serial, **_):
+    return f'measurements:{device_serial}'
+
+
+def reports_scope(device_id, **_):
+    return f'reports:{device_id}'
+
+
+def blend_profiles_scope(device_id, **_):
+    return f'blend_profiles:{device_id}'
+
+
+def _setting(app, name, default, cast=str):
+    return cast(app.config.get(name, os.environ.get(name, default)))
+
+
+def init_response_cache(app):
+    """Configure the response cache backend from app config / environment"""
+    enabled = app.config.get('RESPONSE_CACHE_ENABLED',
+                             os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    response_cache.enabled = enabled
+    if not enabled:
+        return
+
+    backend_name = _setting(app, 'RESPONSE_CACHE_BACKEND', 'memory')
+    if backend_name == 'redis':
+        if redis is None:
+            raise RuntimeError('RESPONSE_CACHE_BACKEND=redis requires the redis package')
+        client = redis.Redis.from_url(_setting(app, 'RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+        backend = RedisCacheBackend(client)
+    elif backend_name == 'memory':
+        backend = MemoryCacheBackend(
+            max_bytes=_setting(app, 'RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES, int),
+            max_entries=_setting(app, 'RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES, int)
+        )
+    else:
+        raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {backend_name}')
+    response_cache.configure(backend, _setting(app, 'RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS, float))
+
+    app.add_url_rule('/api/response-cache/stats', 'response_cache_stats', get_response_cache_stats)
+
+
+def get_response_cache_stats():
+    """Hit/miss counters and backend size"""
+    return jsonify({
+        'success': True,
+        'cache': response_cache.stats()
+    }), 200
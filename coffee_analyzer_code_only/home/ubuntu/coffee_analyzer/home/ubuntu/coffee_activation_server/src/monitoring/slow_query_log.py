@@ -0,0 +1,233 @@
+"""Opt-in slow-query log with query-plan capture.
+
+Enable with ``SLOW_QUERY_LOG_ENABLED`` (app config or environment variable) and
+tune ``SLOW_QUERY_THRESHOLD_MS``. Statements slower than the threshold are
+logged with their originating route and redacted bind parameters, grouped by
+statement shape, and the query plan of each shape is captured the first time
+it shows up. The top shapes are served at ``/api/slow-queries``.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+
+
+def normalize_statement(statement):
+    """Reduce a statement to its shape: literals and expanded IN lists become placeholders"""
+    shape = _WHITESPACE_RE.sub(' ', statement).strip()
+    shape = _STRING_LITERAL_RE.sub('?', shape)
+    shape = _NUMBER_LITERAL_RE.sub('?', shape)
+    shape = _PLACEHOLDER_LIST_RE.sub('(?...)', shape)
+    return shape
+
+
+def redact_value(value):
+    """Keep only the type (and length for text/bytes) of a bind parameter"""
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__}:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def redact_parameters(parameters, executemany=False):
+    if executemany:
+        return f'<{len(parameters)} parameter sets>'
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_value(value) for value in parameters]
+    return redact_value(parameters)
+
+
+def explain_query_plan(cursor, dialect_name, statement, parameters):
+    """Run the dialect's EXPLAIN on a raw DBAPI cursor (bypassing engine events)"""
+    if dialect_name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect_name in ('postgresql', 'mysql', 'mariadb'):
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+
+    # This runs inside the caller's transaction, and on PostgreSQL a failed statement
+    # aborts the whole transaction; a savepoint confines the failure to the EXPLAIN
+    use_savepoint = dialect_name != 'sqlite'
+    explain_cursor = cursor.connection.cursor()
+    try:
+        if use_savepoint:
+            explain_cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            plan = [' | '.join(str(col) for col in row) for row in explain_cursor.fetchall()]
+        except Exception as e:
+            if use_savepoint:
+                explain_cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            plan = [f'plan unavailable: {e}']
+        if use_savepoint:
+            explain_cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        return plan
+    except Exception as e:
+        return [f'plan unavailable: {e}']
+    finally:
+        explain_cursor.close()
+
+
+class SlowQueryLog:
+    """Aggregates slow statements by shape"""
+
+    def __init__(self, threshold_ms=100.0, max_shapes=500, recent_size=200):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.shapes = {}
+        self.recent = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+
+    def record(self, statement, parameters, duration_ms, route, cursor=None,
+               dialect_name=None, executemany=False):
+        shape = normalize_statement(statement)
+        fingerprint = hashlib.sha1(shape.encode('utf-8')).hexdigest()[:16]
+        redacted = redact_parameters(parameters, executemany)
+        now = datetime.utcnow().isoformat()
+
+        with self._lock:
+            entry = self.shapes.get(fingerprint)
+            is_new = entry is None
+            if is_new:
+                if len(self.shapes) >= self.max_shapes:
+                    # Drop the shape with the least accumulated time
+                    victim = min(self.shapes, key=lambda k: self.shapes[k]['total_ms'])
+                    del self.shapes[victim]
+                entry = {
+                    'fingerprint': fingerprint,
+                    'statement': shape,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'routes': {},
+                    'plan': None,
+                    'first_seen': now,
+                    'last_seen': now,
+                    'last_parameters': None
+                }
+                self.shapes[fingerprint] = entry
+
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['routes'][route] = entry['routes'].get(route, 0) + 1
+            entry['last_seen'] = now
+            entry['last_parameters'] = redacted
+
+            self.recent.append({
+                'fingerprint': fingerprint,
+                'duration_ms': round(duration_ms, 3),
+                'route': route,
+                'parameters': redacted,
+                'timestamp': now
+            })
+
+        # Capture the plan outside the lock, only on first occurrence of the shape
+        if is_new and cursor is not None and not executemany:
+            entry['plan'] = explain_query_plan(cursor, dialect_name, statement, parameters)
+
+        logger.warning('Slow query (%.1f ms) from %s [%s]: %s params=%s',
+                       duration_ms, route, fingerprint, shape, redacted)
+
+    def top(self, limit=10, sort='total_ms'):
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry['routes'])) for entry in self.shapes.values()]
+        for entry in entries:
+            entry['avg_ms'] = round(entry['total_ms'] / entry['count'], 3) if entry['count'] else 0.0
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+        entries.sort(key=lambda e: e.get(sort, 0), reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.shapes.clear()
+            self.recent.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _current_route():
+    if not has_request_context():
+        return 'background'
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    return f'{request.method} {rule}'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_slow_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_slow_query_start')
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    if duration_ms < slow_query_log.threshold_ms:
+        return
+    slow_query_log.record(
+        statement, parameters, duration_ms, _current_route(),
+        cursor=cursor, dialect_name=conn.dialect.name, executemany=executemany
+    )
+
+
+def get_slow_queries():
+    """Top-N slow statement shapes"""
+    limit = request.args.get('limit', 10, type=int)
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'count'):
+        sort = 'total_ms'
+    include_recent = request.args.get('recent', 'false') == 'true'
+
+    response = {
+        'success': True,
+        'threshold_ms': slow_query_log.threshold_ms,
+        'queries': slow_query_log.top(limit, sort),
+        'total_shapes': len(slow_query_log.shapes)
+    }
+    if include_recent:
+        response['recent'] = list(slow_query_log.recent)
+    return jsonify(response), 200
+
+
+def init_slow_query_log(app):
+    """Install the slow-query hooks and report route when enabled"""
+    enabled = app.config.get('SLOW_QUERY_LOG_ENABLED',
+                             os.environ.get('SLOW_QUERY_LOG_ENABLED', '').lower() in ('1', 'true', 'yes'))
+    if not enabled:
+        return
+
+    slow_query_log.threshold_ms = float(app.config.get(
+        'SLOW_QUERY_THRESHOLD_MS', os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)
+    ))
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.add_url_rule('/api/slow-queries', 'slow_queries', get_slow_queries)
@@ -0,0 +1,67 @@
+"""Per-worker budget for requests that hold a thread open.
+
+Long-polled status checks (``?wait=``) and live-feed streams each occupy one
+worker thread for as long as they stay open. Under gunicorn's ``gthread``
+workers, letting them take every thread would leave none for ingest. The
+budget caps how many such requests a worker holds at once. ``src/serve.py``
+sets it from ``--threads`` and keeps ``reserved_threads(threads)`` free for
+ordinary requests. A long poll over the budget is answered immediately, like
+a plain conditional poll; a live stream over it gets 503.
+
+Settings (app config or environment): ``STREAM_THREAD_BUDGET``. When it is
+unset (the development server, which starts a thread per request) there is
+no cap.
+"""
+import os
+import threading
+
+MIN_RESERVED_THREADS = 4
+
+
+def reserved_threads(threads):
+    """Threads per worker kept free for non-streaming requests"""
+    return max(MIN_RESERVED_THREADS, threads // 4)
+
+
+def budget_for_threads(threads):
+    """Stream budget for a worker with ``threads`` threads"""
+    return max(threads - reserved_threads(threads), 0)
+
+
+class StreamBudget:
+    """Counts held requests against an optional limit"""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a slot; False when the budget is exhausted"""
+        with self._lock:
+            if self.limit is not None and self._active >= self.limit:
+                self.rejected += 1
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active = max(self._active - 1, 0)
+
+    @property
+    def active(self):
+        return self._active
+
+    def stats(self):
+        return {'active': self._active, 'limit': self.limit, 'rejected': self.rejected}
+
+
+stream_budget = StreamBudget()
+
+
+def init_stream_budget(app):
+    """Configure the budget from app config / environment"""
+    limit = app.config.get('STREAM_THREAD_BUDGET', os.environ.get('STREAM_THREAD_BUDGET'))
+    stream_budget.limit = int(limit) if limit not in (None, '') else None
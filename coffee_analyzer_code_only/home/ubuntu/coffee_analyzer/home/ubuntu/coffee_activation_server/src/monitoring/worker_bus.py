@@ -0,0 +1,153 @@
+"""Best-effort message relay between the worker processes of one server.
+
+Several components keep state in process memory: the live-feed broker, the
+activation notifier, the response and fleet-analytics caches and the
+read-your-writes map. When ``src/serve.py`` runs more than one worker, each
+worker binds a Unix datagram socket in a shared directory. Those components
+``publish`` their events on a channel, and every other worker's receiver
+thread hands the events to the handler ``subscribe``d for that channel, which
+applies them locally.
+
+Delivery is fire-and-forget. A peer that is gone or has a full receive buffer
+misses the message, the same way a slow live-feed consumer is dropped. Every
+relayed piece of state still has its own fallback (TTL expiry, the long-poll
+recheck, the read-your-writes cookie). Without ``start()`` (the development
+server, tests) ``publish`` does nothing and all state stays local.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_BYTES = 64 * 1024
+PEER_REFRESH_SECONDS = 1.0
+SOCKET_SUFFIX = '.sock'
+
+
+class WorkerBus:
+    """Channels of JSON messages fanned out to the other workers"""
+
+    def __init__(self):
+        self.directory = None
+        self._handlers = {}
+        self._receiver = None
+        self._sender = None
+        self._path = None
+        self._peers = []
+        self._peers_at = 0.0
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def started(self):
+        return self._receiver is not None
+
+    def subscribe(self, channel, handler):
+        """Call ``handler(payload)`` for messages other workers publish on ``channel``"""
+        self._handlers[channel] = handler
+
+    def start(self, directory, name=None):
+        """Bind this process's socket in ``directory`` and start receiving (call after fork)"""
+        self.stop()
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._path = os.path.join(directory, f'{name or os.getpid()}{SOCKET_SUFFIX}')
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self._path)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._receiver = receiver
+        self._peers_at = 0.0
+        threading.Thread(target=self._receive, args=(receiver,), name='worker-bus', daemon=True).start()
+
+    def stop(self):
+        receiver, self._receiver = self._receiver, None
+        if receiver is None:
+            return
+        try:
+            # Wakes the receiver thread out of recv()
+            receiver.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        receiver.close()
+        self._sender.close()
+        self._sender = None
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+    def publish(self, channel, payload):
+        """Send ``payload`` to every other worker; returns the number of peers reached"""
+        sender = self._sender
+        if sender is None:
+            return 0
+        data = json.dumps([channel, payload], ensure_ascii=False, default=str).encode('utf-8')
+        if len(data) > MAX_MESSAGE_BYTES:
+            logger.warning('Worker bus message on %s too large (%d bytes)', channel, len(data))
+            return 0
+        reached = 0
+        for path in self._current_peers():
+            try:
+                sender.sendto(data, path)
+                reached += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker exited without removing its socket
+                self._forget(path)
+            except OSError:
+                # Receive buffer full (or a socket being replaced): the peer misses this one
+                self.dropped += 1
+        self.sent += reached
+        return reached
+
+    def _current_peers(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._peers_at >= PEER_REFRESH_SECONDS:
+                try:
+                    names = os.listdir(self.directory)
+                except OSError:
+                    names = []
+                self._peers = [
+                    os.path.join(self.directory, name) for name in names
+                    if name.endswith(SOCKET_SUFFIX) and os.path.join(self.directory, name) != self._path
+                ]
+                self._peers_at = now
+            return list(self._peers)
+
+    def _forget(self, path):
+        with self._lock:
+            if path in self._peers:
+                self._peers.remove(path)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _receive(self, receiver):
+        while True:
+            try:
+                data = receiver.recv(MAX_MESSAGE_BYTES)
+            except OSError:
+                return  # Socket closed by stop()
+            if not data and self._receiver is not receiver:
+                return
+            try:
+                channel, payload = json.loads(data)
+                handler = self._handlers.get(channel)
+                if handler is not None:
+                    self.received += 1
+                    handler(payload)
+            except Exception:
+                logger.exception('Failed to apply a worker bus message')
+
+
+worker_bus = WorkerBus()
@@ -0,0 +1,73 @@
+"""Bulk factory provisioning of devices.
+
+Reads R3S-YYYYMMDD-XXXXXX serials (one per line, or the first column of a CSV)
+and registers them in a single transaction.
+
+Example:
+    python src/provision_devices.py batch_serials.txt --activation-level basic --output batch_keys.csv
+"""
+import argparse
+import csv
+import os
+import sys
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.routes.activation import VALID_ACTIVATION_LEVELS, provision_devices
+
+
+def read_serials(path):
+    serials = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if row and row[0].strip() and not row[0].strip().lower().startswith(('#', 'serial', 'device_serial')):
+                serials.append(row[0])
+    return serials
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Provision a batch of devices from a serial list.')
+    parser.add_argument('serials_file', help='Text/CSV file with one serial per line')
+    parser.add_argument('--device-name', default=None)
+    parser.add_argument('--activation-level', choices=VALID_ACTIVATION_LEVELS, default=None,
+                        help='Activate devices at this level and generate their keys')
+    parser.add_argument('--output', help='Write created devices (serial, id, level, key) to this CSV')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and report without inserting')
+    args = parser.parse_args(argv)
+
+    serials = read_serials(args.serials_file)
+    print(f"Read {len(serials)} serials from {args.serials_file}")
+
+    app = create_app()
+    with app.app_context():
+        result = provision_devices(
+            serials,
+            device_name=args.device_name,
+            activation_level=args.activation_level,
+            dry_run=args.dry_run
+        )
+
+    print(f"Created: {len(result['created'])}{' (dry run)' if args.dry_run else ''}")
+    print(f"Skipped (already registered): {len(result['skipped_existing'])}")
+    print(f"Invalid serials: {len(result['invalid'])}")
+    for serial in result['invalid'][:20]:
+        print(f"  invalid: {serial}")
+
+    if args.output and result['created']:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['device_serial', 'device_id', 'activation_level', 'activation_key', 'manufacture_date'])
+            for device in result['created']:
+                writer.writerow([
+                    device['device_serial'], device['device_id'], device['activation_level'],
+                    device['activation_key'], device['manufacture_date'] or ''
+                ])
+        print(f"Wrote {len(result['created'])} devices to {args.output}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
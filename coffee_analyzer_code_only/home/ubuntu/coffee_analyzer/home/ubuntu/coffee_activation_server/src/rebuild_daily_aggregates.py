@@ -0,0 +1,30 @@
+"""Rebuild the per-device daily aggregate table from raw measurements.
+
+The aggregate is maintained incrementally on ingest; run this once after
+deploying it (to backfill existing and archived measurements) or to repair
+drift.
+
+Example:
+    python src/rebuild_daily_aggregates.py
+"""
+import os
+import sys
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.user import db
+from src.models.daily_aggregate import rebuild_daily_aggregates
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        count = rebuild_daily_aggregates(db.session)
+    print(f"Rebuilt daily aggregates from {count} measurements")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Rebuild the fleet-wide weekly rollup tables from raw measurements.
+
+Both the measurements table and the archived Parquet partitions are read,
+so archived weeks keep their statistics.
+
+The rollup is maintained incrementally on ingest; run this once after
+deploying it (to backfill existing measurements) or to repair drift.
+
+Example:
+    python src/rebuild_fleet_rollup.py
+"""
+import os
+import sys
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.user import db
+from src.models.fleet_rollup import rebuild_rollup
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        count = rebuild_rollup(db.session)
+    print(f"Rebuilt fleet rollup from {count} measurements (hot and archived)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,94 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
+from sqlalchemy.orm.attributes import set_committed_value
 from src.models.device import Device, db
-from datetime import datetime
+from src.models.serializers import DEVICE_FIELDS, serialize_query, json_response, unknown_fields_response
+from src.monitoring.stream_budget import stream_budget
+from src.monitoring.worker_bus import worker_bus
+from datetime import datetime, timedelta
+import hashlib
+import re
 import secrets
 import string
+import threading
+import time
 
 activation_bp = Blueprint('activation', __name__)
 
+VALID_ACTIVATION_LEVELS = ['basic', 'professional', 'advanced', 'custom', 'blend_profiles']
+
+ACTIVATION_KEY_PREFIXES = {
+    'basic': 'BAS-',
+    'professional': 'PRO-',
+    'advanced': 'ADV-',
+    'custom': 'CUS-',
+    'blend_profiles': 'BLP-'
+}
+
+# Factory serial format: R3S-YYYYMMDD-XXXXXX
+SERIAL_PATTERN = re.compile(r'^R3S-\d{8}-[A-Z0-9]{6}$')
+
+# Status polling
+LAST_SEEN_WRITE_INTERVAL = timedelta(seconds=60)  # Throttle last_seen writes from status polls
+MAX_LONG_POLL_SECONDS = 60
+LONG_POLL_RECHECK_SECONDS = 5  # Re-read the device periodically to catch changes from other workers
+
+class ActivationNotifier:
+    """Wakes long-polling status requests when a device's activation changes"""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+    
+    def version(self, device_serial):
+        with self._condition:
+            return self._versions.get(device_serial, 0)
+    
+    def notify(self, device_serial):
+        self.notify_local(device_serial)
+        worker_bus.publish('activation', device_serial)
+    
+    def notify_local(self, device_serial):
+        with self._condition:
+            self._versions[device_serial] = self._versions.get(device_serial, 0) + 1
+            self._condition.notify_all()
+    
+    def wait(self, device_serial, since_version, timeout):
+        """Block until the device's version moves past since_version or timeout expires"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._versions.get(device_serial, 0) != since_version, timeout
+            )
+
+activation_notifier = ActivationNotifier()
+# Activations handled by other workers wake this worker's long polls too
+worker_bus.subscribe('activation', activation_notifier.notify_local)
+
+# Status response fields covered by the ETag. last_seen is left out: it moves on every
+# report and poll, and updated_at with it (onupdate), without any activation change.
+STATUS_ETAG_FIELDS = (
+    'activation_level', 'activation_key', 'device_id', 'device_serial', 'device_name',
+    'manufacture_date', 'first_boot_date', 'first_internet_date'
+)
+
+def device_status_etag(device):
+    """ETag for the activation state a device cares about"""
+    raw = '|'.join(str(getattr(device, field) or '') for field in STATUS_ETAG_FIELDS)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+def touch_last_seen(device):
+    """Record device contact without bumping updated_at, at most once per LAST_SEEN_WRITE_INTERVAL"""
+    now = datetime.utcnow()
+    if device.last_seen and now - device.last_seen < LAST_SEEN_WRITE_INTERVAL:
+        return
+    # Core UPDATE keeps updated_at unchanged
+    db.session.execute(
+        Device.__table__.update()
+        .where(Device.__table__.c.id == device.id)
+        .values(last_seen=now, updated_at=Device.__table__.c.updated_at)
+    )
+    db.session.commit()
+    set_committed_value(device, 'last_seen', now)
+
 # Generate activation keys
 def generate_activation_key(prefix="", length=12):
     """Generate a secure activation key with optional prefix"""
@@ -13,6 +96,101 @@ def generate_activation_key(prefix="", length=12):
     key = ''.join(secrets.choice(chars) for _ in range(length))
     return f"{prefix}{key}" if prefix else key
 
+def generate_device_activation_key(device_serial, activation_level):
+    """Generate an activation key for a device at a given level"""
+    key_prefix = ACTIVATION_KEY_PREFIXES.get(activation_level, 'UNK-')
+    # Include device serial in key generation for uniqueness
+    device_suffix = device_serial.split('-')[-1][:4]  # Last 4 chars of serial
+    return generate_activation_key(key_prefix + device_suffix + '-', 8)
+
+def provision_devices(serials, device_name=None, activation_level=None, dry_run=False):
+    """Register a batch of factory serials in a single transaction.
+    
+    Existing device ids and serials are fetched once; new device ids (and
+    activation keys when an activation level is given) are generated in memory
+    against that set, and all rows are inserted with one executemany.
+    Returns a dict with the created devices and the skipped/invalid serials.
+    """
+    if activation_level is not None and activation_level not in VALID_ACTIVATION_LEVELS:
+        raise ValueError(f'Invalid activation level: {activation_level}')
+    
+    # Normalize, de-duplicate (keeping order) and validate
+    requested = []
+    seen = set()
+    invalid = []
+    for serial in serials:
+        serial = (serial or '').strip().upper()
+        if not serial or serial in seen:
+            continue
+        seen.add(serial)
+        if SERIAL_PATTERN.match(serial):
+            requested.append(serial)
+        else:
+            invalid.append(serial)
+    
+    # One fetch of everything that could collide
+    existing_ids = set()
+    existing_serials = set()
+    for device_id, device_serial in Device.query.with_entities(Device.device_id, Device.device_serial).all():
+        existing_ids.add(device_id)
+        existing_serials.add(device_serial)
+    
+    now = datetime.utcnow()
+    date_cache = {}
+    rows = []
+    skipped = []
+    for serial in requested:
+        if serial in existing_serials:
+            skipped.append(serial)
+            continue
+        
+        device_id = Device.generate_device_id()
+        while device_id in existing_ids:
+            device_id = Device.generate_device_id()
+        existing_ids.add(device_id)
+        
+        # Serials from one production batch share a date; parse each date once
+        date_part = serial[4:12]
+        if date_part not in date_cache:
+            date_cache[date_part] = Device.parse_serial_date(serial)
+        
+        level = activation_level or 'basic'
+        rows.append({
+            'device_id': device_id,
+            'device_serial': serial,
+            'device_name': device_name or 'جهاز جديد',
+            'activation_level': level,
+            'activation_key': generate_device_activation_key(serial, level) if activation_level else '',
+            'manufacture_date': date_cache[date_part],
+            'created_at': now,
+            'last_seen': now,
+            'updated_at': now
+        })
+    
+    if rows and not dry_run:
+        try:
+            db.session.execute(Device.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    return {
+        'created': [
+            {
+                'device_serial': row['device_serial'],
+                'device_id': row['device_id'],
+                'activation_level': row['activation_level'],
+                'activation_key': row['activation_key'],
+                'manufacture_date': row['manufacture_date'].isoformat() if row['manufacture_date'] else None
+            }
+            for row in rows
+        ],
+        'skipped_existing': skipped,
+        'invalid': invalid,
+        'dry_run': dry_run
+    }
+
 @activation_bp.route('/devices', methods=['POST'])
 def register_device():
     """Register a new device with serial number"""
@@ -113,10 +291,61 @@ def register_device():
             'message': f'خطأ في تسجيل الجهاز: {str(e)}'
         }), 500
 
+@activation_bp.route('/devices/provision', methods=['POST'])
+def bulk_provision_devices():
+    """Register a batch of factory serials in one transaction"""
+    try:
+        data = request.get_json() or {}
+        serials = data.get('serials', [])
+        activation_level = data.get('activation_level')
+        
+        if not isinstance(serials, list) or not serials:
+            return jsonify({
+                'success': False,
+                'message': 'قائمة الأرقام التسلسلية مطلوبة'
+            }), 400
+        
+        if activation_level is not None and activation_level not in VALID_ACTIVATION_LEVELS:
+            return jsonify({
+                'success': False,
+                'message': 'مستوى التفعيل غير صحيح'
+            }), 400
+        
+        result = provision_devices(
+            serials,
+            device_name=data.get('device_name'),
+            activation_level=activation_level,
+            dry_run=bool(data.get('dry_run', False))
+        )
+        
+        return jsonify({
+            'success': True,
+            'created_count': len(result['created']),
+            'skipped_count': len(result['skipped_existing']),
+            'invalid_count': len(result['invalid']),
+            **result,
+            'message': f"تم تسجيل {len(result['created'])} جهاز بنجاح"
+        }), 201 if result['created'] and not result['dry_run'] else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في تسجيل الأجهزة: {str(e)}'
+        }), 500
+
 @activation_bp.route('/devices/<device_serial>/status', methods=['GET'])
 def get_device_status(device_serial):
-    """Get current activation status for a device using serial number"""
+    """Get current activation status for a device using serial number.
+    
+    Supports conditional requests (If-None-Match -> 304) and long polling:
+    with ``?wait=N`` and a matching ETag the request is held for up to N
+    seconds until the activation changes.
+    """
     try:
+        wait = max(0, min(request.args.get('wait', 0, type=int), MAX_LONG_POLL_SECONDS))
+        since_version = activation_notifier.version(device_serial)
+        
         device = Device.query.filter_by(device_serial=device_serial).first()
         
         if not device:
@@ -125,11 +354,35 @@ def get_device_status(device_serial):
                 'message': 'الجهاز غير موجود'
             }), 404
         
+        etag = device_status_etag(device)
+        if request.if_none_match.contains_weak(etag):
+            # A held poll occupies a worker thread; over the budget it is answered at once
+            if wait and stream_budget.acquire():
+                try:
+                    deadline = time.monotonic() + wait
+                    while request.if_none_match.contains_weak(etag):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        activation_notifier.wait(device_serial, since_version,
+                                                 min(remaining, LONG_POLL_RECHECK_SECONDS))
+                        since_version = activation_notifier.version(device_serial)
+                        # End the transaction so the device is re-read from the database
+                        db.session.commit()
+                        etag = device_status_etag(device)
+                finally:
+                    stream_budget.release()
+            
+            if request.if_none_match.contains_weak(etag):
+                touch_last_seen(device)
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+        
         # Update last seen timestamp
-        device.last_seen = datetime.utcnow()
-        db.session.commit()
+        touch_last_seen(device)
         
-        return jsonify({
+        response = make_response(jsonify({
             'success': True,
             'device_id': device.device_id,
             'device_serial': device.device_serial,
@@ -140,7 +393,9 @@ def get_device_status(device_serial):
             'first_boot_date': device.first_boot_date.isoformat() if device.first_boot_date else None,
             'first_internet_date': device.first_internet_date.isoformat() if device.first_internet_date else None,
             'last_seen': device.last_seen.isoformat()
-        }), 200
+        }), 200)
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         return jsonify({
@@ -156,8 +411,7 @@ def activate_device(device_serial):
         activation_level = data.get('activation_level', 'basic')
         
         # Validate activation level
-        valid_levels = ['basic', 'professional', 'advanced', 'custom', 'blend_profiles']
-        if activation_level not in valid_levels:
+        if activation_level not in VALID_ACTIVATION_LEVELS:
             return jsonify({
                 'success': False,
                 'message': 'مستوى التفعيل غير صحيح'
@@ -172,17 +426,7 @@ def activate_device(device_serial):
             }), 404
         
         # Generate new activation key for this device and level
-        key_prefix = {
-            'basic': 'BAS-',
-            'professional': 'PRO-',
-            'advanced': 'ADV-',
-            'custom': 'CUS-',
-            'blend_profiles': 'BLP-'
-        }.get(activation_level, 'UNK-')
-        
-        # Include device serial in key generation for uniqueness
-        device_suffix = device_serial.split('-')[-1][:4]  # Last 4 chars of serial
-        activation_key = generate_activation_key(key_prefix + device_suffix + '-', 8)
+        activation_key = generate_device_activation_key(device_serial, activation_level)
         
         device.activation_level = activation_level
         device.activation_key = activation_key
@@ -190,6 +434,9 @@ def activate_device(device_serial):
         
         db.session.commit()
         
+        # Wake any long-polling status requests for this device
+        activation_notifier.notify(device_serial)
+        
         return jsonify({
             'success': True,
             'device_serial': device_serial,
@@ -209,68 +456,21 @@ def activate_device(device_serial):
 def list_devices():
     """List all registered devices"""
     try:
-        devices = Device.query.all()
-        device_list = []
-        
-        for device in devices:
-            device_data = device.to_dict()
-            # Add calculated fields
-            device_data['days_since_manufacture'] = None
-            device_data['days_since_first_boot'] = None
-            device_data['days_since_first_internet'] = None
-            
-            if device.manufacture_date:
-                device_data['days_since_manufacture'] = (datetime.utcnow().date() - device.manufacture_date).days
-            
-            if device.first_boot_date:
-                device_data['days_since_first_boot'] = (datetime.utcnow() - device.first_boot_date).days
-            
-            if device.first_internet_date:
-                device_data['days_since_first_internet'] = (datetime.utcnow() - device.first_internet_date).days
-            
-            device_list.append(device_data)
+        fields, unknown_fields = DEVICE_FIELDS.resolve(request.args.get('fields'))
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
         
-        return jsonify({
+        # Calculated days_since_* fields are derived from the projected date columns
+        device_list, total_count = serialize_query(Device.query, DEVICE_FIELDS, fields)
+        
+        return json_response({
             'success': True,
             'devices': device_list,
-            'total_count': len(device_list)
-        }), 200
+            'total_count': total_count
+        }, 200)
         
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'خطأ في استرجاع قائمة الأجهزة: {str(e)}'
         }), 500
-
-@activation_bp.route('/devices/<device_serial>/report', methods=['POST'])
-def receive_device_report(device_serial):
-    """Receive operational report from device"""
-    try:
-        data = request.get_json()
-        
-        device = Device.query.filter_by(device_serial=device_serial).first()
-        
-        if not device:
-            return jsonify({
-                'success': False,
-                'message': 'الجهاز غير موجود'
-            }), 404
-        
-        # Update last seen timestamp
-        device.last_seen = datetime.utcnow()
-        db.session.commit()
-        
-        # Store report data (this would typically go to a separate reports table)
-        # For now, just acknowledge receipt
-        
-        return jsonify({
-            'success': True,
-            'message': 'تم استلام التقرير بنجاح'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'خطأ في استلام التقرير: {str(e)}'
-        }), 500
-
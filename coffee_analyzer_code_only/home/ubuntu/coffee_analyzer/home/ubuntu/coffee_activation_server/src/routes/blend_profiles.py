@@ -1,13 +1,26 @@
 from flask import Blueprint, request, jsonify
 from src.models.device import Device, db
 from src.models.blend_profile import BlendProfile, BlendSample
+from src.models.measurement import Measurement
+from src.monitoring.response_cache import response_cache, cached_response, blend_profiles_scope
+from src.models.serializers import (
+    BLEND_SAMPLE_FIELDS, encode_rows, json_response, stored_json, unknown_fields_response
+)
+from src.analysis.anomaly_detection import extract_features, ESTIMATE_FEATURES
+from src.analysis.spectral_index import spectrum_vector
+from src.analysis.spectral_profiles import (
+    SPECTRUM_CHANNELS, spectral_signature, encode_array, decode_array, cholesky_cache, mahalanobis_distances
+)
 import json
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime
 
 blend_profiles_bp = Blueprint('blend_profiles', __name__)
 
+MAX_BATCH_SAMPLES = 1000
+# Stored measurements are matched on the NIR channels that feed the three sensor readings
+MEASUREMENT_READING_CHANNELS = slice(len(ESTIMATE_FEATURES), len(ESTIMATE_FEATURES) + 3)
+
 @blend_profiles_bp.route('/devices/<device_id>/profiles', methods=['POST'])
 def create_blend_profile(device_id):
     """Create a new blend profile for a device"""
@@ -50,35 +63,33 @@ def create_blend_profile(device_id):
         db.session.flush()  # Get the profile ID
         
         # Add samples to the profile
+        readings = []
+        spectra = []
         for sample_data in samples:
+            sample_readings, spectrum = sample_inputs(sample_data)
             sample = BlendSample(
                 profile_id=new_profile.id,
                 sample_name=sample_data.get('sample_name', ''),
-                sensor_reading_1=sample_data.get('sensor_reading_1', 0),
-                sensor_reading_2=sample_data.get('sensor_reading_2', 0),
-                sensor_reading_3=sample_data.get('sensor_reading_3', 0),
+                sensor_reading_1=sample_readings[0],
+                sensor_reading_2=sample_readings[1],
+                sensor_reading_3=sample_readings[2],
                 chemical_data=json.dumps(sample_data.get('chemical_data', {})),
                 notes=sample_data.get('notes', '')
             )
+            sample.spectrum_array = spectrum
             db.session.add(sample)
+            readings.append(sample_readings)
+            if spectrum is not None:
+                spectra.append(spectrum)
         
         # Calculate and store profile signature (average of all samples)
-        avg_reading_1 = sum(s.get('sensor_reading_1', 0) for s in samples) / len(samples)
-        avg_reading_2 = sum(s.get('sensor_reading_2', 0) for s in samples) / len(samples)
-        avg_reading_3 = sum(s.get('sensor_reading_3', 0) for s in samples) / len(samples)
-        
-        signature = {
-            'avg_reading_1': avg_reading_1,
-            'avg_reading_2': avg_reading_2,
-            'avg_reading_3': avg_reading_3,
-            'std_reading_1': np.std([s.get('sensor_reading_1', 0) for s in samples]),
-            'std_reading_2': np.std([s.get('sensor_reading_2', 0) for s in samples]),
-            'std_reading_3': np.std([s.get('sensor_reading_3', 0) for s in samples])
-        }
+        signature = calculate_profile_signature(readings)
+        store_spectral_signature(new_profile, signature, spectra)
         
         new_profile.profile_signature = json.dumps(signature)
         
         db.session.commit()
+        response_cache.bump(blend_profiles_scope(device_id))
         
         return jsonify({
             'success': True,
@@ -86,6 +97,7 @@ def create_blend_profile(device_id):
             'profile_name': profile_name,
             'sample_count': len(samples),
             'signature': signature,
+            'spectral_signature': new_profile.spectral_signature,
             'message': 'تم إنشاء التوليفة المرجعية بنجاح'
         }), 201
         
@@ -97,40 +109,54 @@ def create_blend_profile(device_id):
         }), 500
 
 @blend_profiles_bp.route('/devices/<device_id>/profiles', methods=['GET'])
+@cached_response(blend_profiles_scope)
 def get_blend_profiles(device_id):
     """Get all blend profiles for a device"""
     try:
-        profiles = BlendProfile.query.filter_by(device_id=device_id).all()
+        sample_fields, unknown_fields = BLEND_SAMPLE_FIELDS.resolve(request.args.get('sample_fields'))
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
+        
+        profiles = BlendProfile.query.filter_by(device_id=device_id).with_entities(
+            BlendProfile.id, BlendProfile.profile_name, BlendProfile.description,
+            BlendProfile.sample_count, BlendProfile.created_at, BlendProfile.profile_signature
+        ).all()
+        
+        # Get samples for all profiles in one projected query, grouped by profile
+        selected = list(dict.fromkeys(['profile_id'] + sample_fields))
+        samples_by_profile = {}
+        if profiles:
+            sample_rows = BlendSample.query.filter(
+                BlendSample.profile_id.in_([p.id for p in profiles])
+            ).order_by(BlendSample.id).with_entities(
+                *[BLEND_SAMPLE_FIELDS.fields[name][0] for name in selected]
+            ).all()
+            for row in sample_rows:
+                samples_by_profile.setdefault(row[0], []).append(row)
         
         profile_list = []
         for profile in profiles:
-            # Get samples for this profile
-            samples = BlendSample.query.filter_by(profile_id=profile.id).all()
-            
             profile_data = {
                 'id': profile.id,
                 'profile_name': profile.profile_name,
                 'description': profile.description,
                 'sample_count': profile.sample_count,
                 'created_at': profile.created_at.isoformat(),
-                'samples': [sample.to_dict() for sample in samples]
+                'samples': encode_rows(samples_by_profile.get(profile.id, []), BLEND_SAMPLE_FIELDS, selected, sample_fields)
             }
             
-            # Add signature if available
+            # Add signature if available (stored JSON is passed through when valid)
             if profile.profile_signature:
-                try:
-                    profile_data['signature'] = json.loads(profile.profile_signature)
-                except:
-                    profile_data['signature'] = {}
+                profile_data['signature'] = stored_json(profile.profile_signature)
             
             profile_list.append(profile_data)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'device_id': device_id,
             'profiles': profile_list,
             'total_count': len(profile_list)
-        }), 200
+        }, 200)
         
     except Exception as e:
         return jsonify({
@@ -144,79 +170,27 @@ def match_sample_to_profiles(device_id):
     try:
         data = request.get_json()
         
-        # Get sample readings
-        sample_readings = [
-            data.get('sensor_reading_1', 0),
-            data.get('sensor_reading_2', 0),
-            data.get('sensor_reading_3', 0)
-        ]
+        # Get sample readings (and the full spectrum when sent)
+        sample_readings, spectrum = sample_inputs(data)
         
-        if not any(sample_readings):
+        if not any(sample_readings) and spectrum is None:
             return jsonify({
                 'success': False,
                 'message': 'قراءات المستشعر مطلوبة'
             }), 400
         
         # Get all profiles for this device
-        profiles = BlendProfile.query.filter_by(device_id=device_id).all()
+        signatures = load_profile_signatures(device_id)
         
-        if not profiles:
+        if not signatures.total_profiles:
             return jsonify({
                 'success': False,
                 'message': 'لا توجد توليفات مرجعية محفوظة لهذا الجهاز'
             }), 404
         
-        matches = []
-        
-        for profile in profiles:
-            if not profile.profile_signature:
-                continue
-                
-            try:
-                signature = json.loads(profile.profile_signature)
-                
-                # Calculate similarity using cosine similarity
-                profile_readings = [
-                    signature.get('avg_reading_1', 0),
-                    signature.get('avg_reading_2', 0),
-                    signature.get('avg_reading_3', 0)
-                ]
-                
-                # Calculate cosine similarity
-                similarity = cosine_similarity([sample_readings], [profile_readings])[0][0]
-                match_percentage = max(0, min(100, similarity * 100))
-                
-                # Calculate Euclidean distance for additional metric
-                distance = np.linalg.norm(np.array(sample_readings) - np.array(profile_readings))
-                
-                # Consider standard deviation for tolerance
-                tolerance_score = 100
-                for i, reading in enumerate(sample_readings):
-                    std_key = f'std_reading_{i+1}'
-                    if std_key in signature and signature[std_key] > 0:
-                        deviation = abs(reading - profile_readings[i]) / signature[std_key]
-                        tolerance_score = min(tolerance_score, max(0, 100 - deviation * 20))
-                
-                # Combined score (weighted average)
-                combined_score = (match_percentage * 0.6 + tolerance_score * 0.4)
-                
-                matches.append({
-                    'profile_id': profile.id,
-                    'profile_name': profile.profile_name,
-                    'description': profile.description,
-                    'match_percentage': round(match_percentage, 1),
-                    'tolerance_score': round(tolerance_score, 1),
-                    'combined_score': round(combined_score, 1),
-                    'distance': round(distance, 2),
-                    'recommendation': get_match_recommendation(combined_score)
-                })
-                
-            except Exception as e:
-                print(f"Error processing profile {profile.id}: {e}")
-                continue
-        
-        # Sort by combined score (highest first)
-        matches.sort(key=lambda x: x['combined_score'], reverse=True)
+        # One row of the samples x profiles score matrix, sorted by combined score
+        scores = score_samples(signatures, [sample_readings], [spectrum])
+        matches = ranked_matches(signatures.profiles, scores, 0)
         
         # Get best match
         best_match = matches[0] if matches else None
@@ -227,7 +201,7 @@ def match_sample_to_profiles(device_id):
             'sample_readings': sample_readings,
             'matches': matches,
             'best_match': best_match,
-            'total_profiles': len(profiles),
+            'total_profiles': signatures.total_profiles,
             'analyzed_at': datetime.utcnow().isoformat()
         }), 200
         
@@ -237,6 +211,106 @@ def match_sample_to_profiles(device_id):
             'message': f'خطأ في مطابقة العينة: {str(e)}'
         }), 500
 
+@blend_profiles_bp.route('/devices/<device_id>/match/batch', methods=['POST'])
+def match_samples_batch(device_id):
+    """Match many samples (or stored measurements) against all blend profiles in one call"""
+    try:
+        data = request.get_json() or {}
+        samples = data.get('samples') or []
+        measurement_ids = data.get('measurement_ids') or []
+        top = data.get('top')
+        
+        if not samples and not measurement_ids:
+            return jsonify({
+                'success': False,
+                'message': 'العينات أو معرفات القياسات مطلوبة'
+            }), 400
+        
+        if not isinstance(samples, list) or not all(isinstance(sample, dict) for sample in samples):
+            return jsonify({
+                'success': False,
+                'message': 'العينات يجب أن تكون قائمة من الكائنات'
+            }), 400
+        
+        if not isinstance(measurement_ids, list) or not all(
+                isinstance(m_id, int) and not isinstance(m_id, bool) for m_id in measurement_ids):
+            return jsonify({
+                'success': False,
+                'message': 'معرفات القياسات يجب أن تكون قائمة من الأعداد الصحيحة'
+            }), 400
+        
+        if len(samples) + len(measurement_ids) > MAX_BATCH_SAMPLES:
+            return jsonify({
+                'success': False,
+                'message': f'الحد الأقصى للعينات في الطلب الواحد هو {MAX_BATCH_SAMPLES}'
+            }), 400
+        
+        signatures = load_profile_signatures(device_id)
+        if not signatures.total_profiles:
+            return jsonify({
+                'success': False,
+                'message': 'لا توجد توليفات مرجعية محفوظة لهذا الجهاز'
+            }), 404
+        
+        # Collect every sample as a row of the readings matrix
+        rows = []
+        readings = []
+        spectra = []
+        invalid_samples = []
+        for index, sample in enumerate(samples):
+            sample_readings, spectrum = sample_inputs(sample)
+            if not any(sample_readings) and spectrum is None:
+                invalid_samples.append(index)
+                continue
+            rows.append({'index': index, 'sample_name': sample.get('sample_name', ''), 'sample_readings': sample_readings})
+            readings.append(sample_readings)
+            spectra.append(spectrum)
+        
+        missing_measurement_ids = []
+        if measurement_ids:
+            device = Device.query.filter_by(device_id=device_id).first()
+            stored = {}
+            if device:
+                stored = dict(Measurement.query.filter(
+                    Measurement.id.in_(measurement_ids),
+                    Measurement.device_serial == device.device_serial
+                ).with_entities(Measurement.id, Measurement.nir_data).all())
+            for measurement_id in measurement_ids:
+                if measurement_id not in stored:
+                    missing_measurement_ids.append(measurement_id)
+                    continue
+                sample_readings = measurement_readings(stored[measurement_id])
+                rows.append({'measurement_id': measurement_id, 'sample_readings': sample_readings})
+                readings.append(sample_readings)
+                spectra.append(spectrum_vector(stored[measurement_id]))
+        
+        # One samples x profiles matrix computation for the whole batch
+        results = []
+        if rows:
+            scores = score_samples(signatures, readings, spectra)
+            for i, row in enumerate(rows):
+                matches = ranked_matches(signatures.profiles, scores, i)
+                row['best_match'] = matches[0] if matches else None
+                row['matches'] = matches[:top] if isinstance(top, int) and top > 0 else matches
+                results.append(row)
+        
+        return jsonify({
+            'success': True,
+            'device_id': device_id,
+            'results': results,
+            'total_samples': len(results),
+            'invalid_samples': invalid_samples,
+            'missing_measurement_ids': missing_measurement_ids,
+            'total_profiles': signatures.total_profiles,
+            'analyzed_at': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في مطابقة العينات: {str(e)}'
+        }), 500
+
 @blend_profiles_bp.route('/devices/<device_id>/profiles/<int:profile_id>', methods=['DELETE'])
 def delete_blend_profile(device_id, profile_id):
     """Delete a blend profile and all its samples"""
@@ -258,6 +332,7 @@ def delete_blend_profile(device_id, profile_id):
         # Delete the profile
         db.session.delete(profile)
         db.session.commit()
+        response_cache.bump(blend_profiles_scope(device_id))
         
         return jsonify({
             'success': True,
@@ -289,15 +364,17 @@ def add_sample_to_profile(device_id, profile_id):
             }), 404
         
         # Create new sample
+        sample_readings, spectrum = sample_inputs(data)
         new_sample = BlendSample(
             profile_id=profile_id,
             sample_name=data.get('sample_name', ''),
-            sensor_reading_1=data.get('sensor_reading_1', 0),
-            sensor_reading_2=data.get('sensor_reading_2', 0),
-            sensor_reading_3=data.get('sensor_reading_3', 0),
+            sensor_reading_1=sample_readings[0],
+            sensor_reading_2=sample_readings[1],
+            sensor_reading_3=sample_readings[2],
             chemical_data=json.dumps(data.get('chemical_data', {})),
             notes=data.get('notes', '')
         )
+        new_sample.spectrum_array = spectrum
         
         db.session.add(new_sample)
         
@@ -308,28 +385,22 @@ def add_sample_to_profile(device_id, profile_id):
         all_samples = BlendSample.query.filter_by(profile_id=profile_id).all()
         all_samples.append(new_sample)  # Include the new sample
         
-        avg_reading_1 = sum(s.sensor_reading_1 for s in all_samples) / len(all_samples)
-        avg_reading_2 = sum(s.sensor_reading_2 for s in all_samples) / len(all_samples)
-        avg_reading_3 = sum(s.sensor_reading_3 for s in all_samples) / len(all_samples)
-        
-        signature = {
-            'avg_reading_1': avg_reading_1,
-            'avg_reading_2': avg_reading_2,
-            'avg_reading_3': avg_reading_3,
-            'std_reading_1': np.std([s.sensor_reading_1 for s in all_samples]),
-            'std_reading_2': np.std([s.sensor_reading_2 for s in all_samples]),
-            'std_reading_3': np.std([s.sensor_reading_3 for s in all_samples])
-        }
+        signature = calculate_profile_signature([s.sensor_readings_array for s in all_samples])
+        store_spectral_signature(
+            profile, signature, [s.spectrum_array for s in all_samples if s.spectrum is not None]
+        )
         
         profile.profile_signature = json.dumps(signature)
         
         db.session.commit()
+        response_cache.bump(blend_profiles_scope(device_id))
         
         return jsonify({
             'success': True,
             'sample_id': new_sample.id,
             'profile_id': profile_id,
             'updated_signature': signature,
+            'spectral_signature': profile.spectral_signature,
             'message': 'تم إضافة العينة وتحديث التوليفة بنجاح'
         }), 201
         
@@ -340,6 +411,200 @@ def add_sample_to_profile(device_id, profile_id):
             'message': f'خطأ في إضافة العينة: {str(e)}'
         }), 500
 
+def calculate_profile_signature(readings):
+    """Calculate a profile signature (average and standard deviation per sensor) from sample readings"""
+    readings_array = np.asarray(readings, dtype=float).reshape(-1, 3)
+    averages = readings_array.mean(axis=0)
+    stds = readings_array.std(axis=0)
+    
+    return {
+        'avg_reading_1': float(averages[0]),
+        'avg_reading_2': float(averages[1]),
+        'avg_reading_3': float(averages[2]),
+        'std_reading_1': float(stds[0]),
+        'std_reading_2': float(stds[1]),
+        'std_reading_3': float(stds[2])
+    }
+
+class ProfileSignatures:
+    """A device's parsed profile signatures, ready for matrix scoring"""
+
+    def __init__(self, profiles, averages, stds, total_profiles, spectral):
+        self.profiles = profiles              # rows with a usable signature
+        self.averages = averages              # (profiles, 3) sensor reading averages
+        self.stds = stds                      # (profiles, 3) sensor reading standard deviations
+        self.total_profiles = total_profiles  # including profiles without a signature
+        self.spectral = spectral              # [(column, spectrum mean, Cholesky factor)]
+
+def load_profile_signatures(device_id):
+    """Parse every stored profile signature of a device once"""
+    rows = BlendProfile.query.filter_by(device_id=device_id).with_entities(
+        BlendProfile.id, BlendProfile.profile_name, BlendProfile.description, BlendProfile.profile_signature,
+        BlendProfile.spectrum_mean, BlendProfile.spectrum_covariance
+    ).all()
+    
+    profiles = []
+    signatures = []
+    spectral = []
+    for row in rows:
+        if not row.profile_signature:
+            continue
+        try:
+            signatures.append(json.loads(row.profile_signature))
+            profiles.append(row)
+        except Exception as e:
+            print(f"Error processing profile {row.id}: {e}")
+            continue
+        if row.spectrum_mean and row.spectrum_covariance:
+            spectral.append((
+                len(profiles) - 1,
+                decode_array(row.spectrum_mean),
+                cholesky_cache.factor(row.id, row.spectrum_covariance)
+            ))
+    
+    averages, stds = signature_arrays(signatures)
+    return ProfileSignatures(profiles, averages, stds, len(rows), spectral)
+
+def store_spectral_signature(profile, signature, spectra):
+    """Set a profile's spectral mean/covariance from its sample spectra (cleared when there are none)"""
+    if spectra:
+        mean, covariance = spectral_signature(spectra)
+        profile.spectrum_mean = encode_array(mean)
+        profile.spectrum_covariance = encode_array(covariance)
+    else:
+        profile.spectrum_mean = None
+        profile.spectrum_covariance = None
+    signature['spectral_samples'] = len(spectra)
+
+def sample_inputs(data):
+    """(sensor readings 1-3, NIR spectrum or None) of a posted sample.
+
+    Samples sent with only ``nir_readings`` use their first three channels as
+    sensor readings, as stored measurements do.
+    """
+    nir_readings = data.get('nir_readings')
+    spectrum = spectrum_vector(nir_readings) if nir_readings is not None else None
+    readings = [
+        data.get('sensor_reading_1', 0),
+        data.get('sensor_reading_2', 0),
+        data.get('sensor_reading_3', 0)
+    ]
+    if not any(readings) and spectrum is not None:
+        readings = [float(v) for v in spectrum[:3]]
+    return readings, spectrum
+
+def signature_arrays(signatures):
+    """(averages, stds) arrays of shape (profiles, 3) from signature dicts"""
+    averages = np.array([
+        [s.get(f'avg_reading_{i}', 0) for i in range(1, 4)] for s in signatures
+    ], dtype=float).reshape(-1, 3)
+    stds = np.array([
+        [s.get(f'std_reading_{i}', 0) for i in range(1, 4)] for s in signatures
+    ], dtype=float).reshape(-1, 3)
+    return averages, stds
+
+def measurement_readings(nir_data):
+    """Sensor readings 1-3 of a stored measurement (its first three NIR channels)"""
+    try:
+        nir_readings = json.loads(nir_data) if nir_data else {}
+    except ValueError:
+        nir_readings = {}
+    values = extract_features({}, nir_readings)[MEASUREMENT_READING_CHANNELS]
+    return [float(v) if not np.isnan(v) else 0.0 for v in values]
+
+def score_samples_against_signatures(samples, averages, stds):
+    """Score every sample against every profile signature.
+
+    Returns match_percentage, tolerance_score, combined_score and distance as
+    (samples, profiles) arrays, with the same definitions as
+    ``score_sample_against_signature``.
+    """
+    samples = np.asarray(samples, dtype=float).reshape(-1, 3)
+    
+    # Cosine similarity (zero vectors score 0)
+    norms = np.outer(np.linalg.norm(samples, axis=1), np.linalg.norm(averages, axis=1))
+    dots = samples @ averages.T
+    similarity = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+    match_percentage = np.clip(similarity * 100, 0, 100)
+    
+    # Euclidean distance for additional metric
+    diff = samples[:, None, :] - averages[None, :, :]
+    distance = np.sqrt((diff ** 2).sum(axis=2))
+    
+    # Consider standard deviation for tolerance (sensors with zero std are skipped)
+    spread = stds[None, :, :]
+    deviation = np.divide(np.abs(diff), spread, out=np.zeros_like(diff), where=spread > 0)
+    tolerance_score = np.maximum(0, 100 - deviation * 20).min(axis=2)
+    
+    # Combined score (weighted average)
+    combined_score = match_percentage * 0.6 + tolerance_score * 0.4
+    
+    return {
+        'match_percentage': match_percentage,
+        'tolerance_score': tolerance_score,
+        'combined_score': combined_score,
+        'distance': distance
+    }
+
+def score_samples(signatures, readings, spectra):
+    """Samples x profiles scores: Mahalanobis-based where both sides have a spectrum, sensor readings otherwise"""
+    scores = score_samples_against_signatures(readings, signatures.averages, signatures.stds)
+    scores['mahalanobis_distance'] = np.full(scores['combined_score'].shape, np.nan)
+    
+    with_spectrum = [i for i, spectrum in enumerate(spectra) if spectrum is not None]
+    if not with_spectrum or not signatures.spectral:
+        return scores
+    
+    rows = np.array(with_spectrum)
+    sample_spectra = np.array([spectra[i] for i in with_spectrum], dtype=float)
+    sample_norms = np.linalg.norm(sample_spectra, axis=1)
+    for column, mean, factor in signatures.spectral:
+        mahalanobis = mahalanobis_distances(sample_spectra, mean, factor)
+        
+        norms = sample_norms * np.linalg.norm(mean)
+        similarity = np.divide(sample_spectra @ mean, norms, out=np.zeros_like(norms), where=norms > 0)
+        match_percentage = np.clip(similarity * 100, 0, 100)
+        # Per-channel RMS of the Mahalanobis distance is ~1 for a typical profile sample
+        tolerance_score = np.maximum(0, 100 - 20 * mahalanobis / np.sqrt(SPECTRUM_CHANNELS))
+        
+        scores['match_percentage'][rows, column] = match_percentage
+        scores['tolerance_score'][rows, column] = tolerance_score
+        scores['combined_score'][rows, column] = match_percentage * 0.6 + tolerance_score * 0.4
+        scores['distance'][rows, column] = np.linalg.norm(sample_spectra - mean, axis=1)
+        scores['mahalanobis_distance'][rows, column] = mahalanobis
+    return scores
+
+def ranked_matches(profiles, scores, row):
+    """Match entries of one sample (a row of the score matrix), highest combined score first"""
+    matches = [
+        {
+            'profile_id': profile.id,
+            'profile_name': profile.profile_name,
+            'description': profile.description,
+            'match_percentage': round(float(scores['match_percentage'][row, j]), 1),
+            'tolerance_score': round(float(scores['tolerance_score'][row, j]), 1),
+            'combined_score': round(float(scores['combined_score'][row, j]), 1),
+            'distance': round(float(scores['distance'][row, j]), 2),
+            **_spectral_fields(scores, row, j),
+            'recommendation': get_match_recommendation(scores['combined_score'][row, j])
+        }
+        for j, profile in enumerate(profiles)
+    ]
+    matches.sort(key=lambda x: x['combined_score'], reverse=True)
+    return matches
+
+def _spectral_fields(scores, row, column):
+    mahalanobis = scores.get('mahalanobis_distance')
+    if mahalanobis is None or np.isnan(mahalanobis[row, column]):
+        return {'method': 'sensor_readings'}
+    return {'method': 'spectrum', 'mahalanobis_distance': round(float(mahalanobis[row, column]), 3)}
+
+def score_sample_against_signature(sample_readings, signature):
+    """Score a sample against a profile signature (cosine similarity, distance and tolerance)"""
+    averages, stds = signature_arrays([signature])
+    scores = score_samples_against_signatures([sample_readings], averages, stds)
+    return {key: float(value[0, 0]) for key, value in scores.items()}
+
 def get_match_recommendation(score):
     """Get recommendation text based on match score"""
     if score >= 90:
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.calibration_data import CalibrationData, db
 from src.models.user import User
+from src.analysis.calibration_resolver import calibration_resolver
 
 calibration_bp = Blueprint("calibration", __name__)
 
@@ -11,33 +12,27 @@ def is_owner(user_id):
 
 @calibration_bp.route("/calibration_data", methods=["GET"])
 def get_calibration_data():
-    """Retrieve calibration data based on coffee type and origin."""
+    """Retrieve calibration data based on coffee type and origin.
+
+    Specific rows are merged over the global defaults, so every coefficient is populated.
+    """
     try:
         coffee_type = request.args.get("coffee_type", type=int)
         coffee_origin = request.args.get("coffee_origin", type=int)
         coffee_variety = request.args.get("coffee_variety", type=str)
 
-        query = CalibrationData.query
-
-        if coffee_type is not None:
-            query = query.filter_by(coffee_type=coffee_type)
-        if coffee_origin is not None:
-            query = query.filter_by(coffee_origin=coffee_origin)
-        if coffee_variety is not None:
-            query = query.filter_by(coffee_variety=coffee_variety)
-
-        calibration_entry = query.first()
-
-        if calibration_entry:
-            return jsonify({
-                "success": True,
-                "calibration_data": calibration_entry.to_dict()
-            }), 200
-        else:
-            return jsonify({
-                "success": False,
-                "message": "لم يتم العثور على بيانات معايرة لهذا النوع والأصل."
-            }), 404
+        values, sources = calibration_resolver.resolve_with_sources(coffee_type, coffee_origin, coffee_variety)
+
+        return jsonify({
+            "success": True,
+            "calibration_data": dict(
+                values,
+                coffee_type=coffee_type,
+                coffee_origin=coffee_origin,
+                coffee_variety=coffee_variety
+            ),
+            "resolved_from": sources
+        }), 200
 
     except Exception as e:
         return jsonify({
@@ -76,6 +71,7 @@ def add_calibration_data():
         )
         db.session.add(new_entry)
         db.session.commit()
+        calibration_resolver.invalidate()
 
         return jsonify({"success": True, "message": "تمت إضافة بيانات المعايرة بنجاح.", "id": new_entry.id}), 201
 
@@ -103,6 +99,7 @@ def update_calibration_data(entry_id):
                 setattr(entry, key, value)
         
         db.session.commit()
+        calibration_resolver.invalidate()
 
         return jsonify({"success": True, "message": "تم تحديث بيانات المعايرة بنجاح.", "id": entry.id}), 200
 
@@ -127,6 +124,7 @@ def delete_calibration_data(entry_id):
 
         db.session.delete(entry)
         db.session.commit()
+        calibration_resolver.invalidate()
 
         return jsonify({"success": True, "message": "تم حذف بيانات المعايرة بنجاح."
         }), 200
@@ -0,0 +1,200 @@
+from flask import Blueprint, request, jsonify
+from src.models.fleet_rollup import (
+    FleetWeeklyRollup, FleetWeeklyHistogram, ROLLUP_COMPONENTS, UNKNOWN,
+    bin_value, week_start_for, db
+)
+from src.monitoring.worker_bus import worker_bus
+from datetime import date, datetime, timedelta
+import math
+import threading
+import time
+
+fleet_analytics_bp = Blueprint('fleet_analytics', __name__)
+
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 256
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+class AnalyticsCache:
+    """TTL cache for fleet analytics results, invalidated by ingest.
+
+    Each entry remembers the (origin, type, week range) it covers; recording a
+    measurement drops only the entries whose scope includes it, in this worker
+    and (through the worker bus) in the others. The TTL bounds staleness when a
+    relayed invalidation is lost.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, scope, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, scope, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Evict the entry closest to expiry
+                victim = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[victim]
+            self._entries[key] = (time.monotonic() + self.ttl, scope, value)
+
+    def invalidate(self, touched):
+        """Drop entries covering any of the touched (origin, type, week_start) keys"""
+        self.invalidate_local(touched)
+        if touched:
+            worker_bus.publish('analytics_cache', [[o, t, week.isoformat()] for o, t, week in touched])
+
+    def invalidate_local(self, touched):
+        with self._lock:
+            stale = [
+                key for key, (_, (origin, coffee_type, first_week), _) in self._entries.items()
+                if any(
+                    (origin is None or origin == o) and
+                    (coffee_type is None or coffee_type == t) and
+                    week >= first_week
+                    for o, t, week in touched
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+analytics_cache = AnalyticsCache()
+worker_bus.subscribe('analytics_cache', lambda touched: analytics_cache.invalidate_local(
+    [(o, t, date.fromisoformat(week)) for o, t, week in touched]
+))
+
+def histogram_percentiles(bins, count, percentiles, min_value, max_value):
+    """Percentiles from (bin, count) pairs, clamped to the observed min/max"""
+    if not count:
+        return {}
+    bins = sorted(bins)
+    result = {}
+    for p in percentiles:
+        rank = max(1, math.ceil(p / 100 * count))
+        cumulative = 0
+        for index, bin_count in bins:
+            cumulative += bin_count
+            if cumulative >= rank:
+                value = min(max(bin_value(index), min_value), max_value)
+                result[f'p{p:g}'] = round(value, 4)
+                break
+    return result
+
+def compute_fleet_analytics(start_week, coffee_origin, coffee_type, components, percentiles):
+    """Read the rollup tables and assemble per (origin, type, week) statistics"""
+    filters = [FleetWeeklyRollup.week_start >= start_week, FleetWeeklyRollup.component.in_(components)]
+    histogram_filters = [FleetWeeklyHistogram.week_start >= start_week, FleetWeeklyHistogram.component.in_(components)]
+    if coffee_origin is not None:
+        filters.append(FleetWeeklyRollup.coffee_origin == coffee_origin)
+        histogram_filters.append(FleetWeeklyHistogram.coffee_origin == coffee_origin)
+    if coffee_type is not None:
+        filters.append(FleetWeeklyRollup.coffee_type == coffee_type)
+        histogram_filters.append(FleetWeeklyHistogram.coffee_type == coffee_type)
+
+    rollup_rows = db.session.query(
+        FleetWeeklyRollup.coffee_origin, FleetWeeklyRollup.coffee_type, FleetWeeklyRollup.week_start,
+        FleetWeeklyRollup.component, FleetWeeklyRollup.count, FleetWeeklyRollup.total,
+        FleetWeeklyRollup.total_sq, FleetWeeklyRollup.min_value, FleetWeeklyRollup.max_value
+    ).filter(*filters).all()
+
+    histograms = {}
+    if percentiles:
+        histogram_rows = db.session.query(
+            FleetWeeklyHistogram.coffee_origin, FleetWeeklyHistogram.coffee_type, FleetWeeklyHistogram.week_start,
+            FleetWeeklyHistogram.component, FleetWeeklyHistogram.bin, FleetWeeklyHistogram.count
+        ).filter(*histogram_filters).all()
+        for origin, c_type, week, component, index, count in histogram_rows:
+            histograms.setdefault((origin, c_type, week, component), []).append((index, count))
+
+    groups = {}
+    for origin, c_type, week, component, count, total, total_sq, min_value, max_value in rollup_rows:
+        group = groups.setdefault((origin, c_type, week), {
+            'coffee_origin': None if origin == UNKNOWN else origin,
+            'coffee_type': None if c_type == UNKNOWN else c_type,
+            'week_start': week.isoformat(),
+            'components': {}
+        })
+        mean = total / count if count else None
+        variance = max(total_sq / count - mean * mean, 0.0) if count else None
+        stats = {
+            'count': count,
+            'average': round(mean, 4) if mean is not None else None,
+            'std': round(math.sqrt(variance), 4) if variance is not None else None,
+            'min': min_value,
+            'max': max_value
+        }
+        if percentiles:
+            stats['percentiles'] = histogram_percentiles(
+                histograms.get((origin, c_type, week, component), []), count, percentiles, min_value, max_value
+            )
+        group['components'][component] = stats
+
+    return sorted(groups.values(), key=lambda g: (g['week_start'], g['coffee_origin'] or -1, g['coffee_type'] or -1))
+
+@fleet_analytics_bp.route('/fleet/analytics', methods=['GET'])
+def get_fleet_analytics():
+    """Composition averages and percentiles by coffee origin x type x week across all devices"""
+    try:
+        weeks = max(1, min(request.args.get('weeks', 12, type=int), 520))
+        coffee_type = request.args.get('coffee_type', type=int)
+        coffee_origin = request.args.get('coffee_origin', type=int)
+        components = [c.strip() for c in request.args.get('component', ','.join(ROLLUP_COMPONENTS)).split(',') if c.strip()]
+        percentiles_arg = request.args.get('percentiles')
+
+        unknown = [c for c in components if c not in ROLLUP_COMPONENTS]
+        if unknown or not components:
+            return jsonify({
+                'success': False,
+                'message': f"مكونات غير معروفة: {', '.join(unknown)}",
+                'available_components': list(ROLLUP_COMPONENTS)
+            }), 400
+        try:
+            percentiles = tuple(float(p) for p in percentiles_arg.split(',') if p.strip()) \
+                if percentiles_arg is not None else DEFAULT_PERCENTILES
+        except ValueError:
+            percentiles = None
+        if percentiles is None or any(p <= 0 or p > 100 for p in percentiles):
+            return jsonify({
+                'success': False,
+                'message': 'قيم المئينات يجب أن تكون بين 0 و 100'
+            }), 400
+
+        start_week = week_start_for(datetime.utcnow() - timedelta(weeks=weeks - 1))
+        cache_key = (start_week, coffee_origin, coffee_type, tuple(components), percentiles)
+
+        groups = analytics_cache.get(cache_key)
+        cached = groups is not None
+        if not cached:
+            groups = compute_fleet_analytics(start_week, coffee_origin, coffee_type, components, percentiles)
+            analytics_cache.set(cache_key, (coffee_origin, coffee_type, start_week), groups)
+
+        return jsonify({
+            'success': True,
+            'weeks': weeks,
+            'start_week': start_week.isoformat(),
+            'groups': groups,
+            'total_groups': len(groups),
+            'cached': cached
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في حساب تحليلات الأسطول: {str(e)}'
+        }), 500
@@ -1,13 +1,15 @@
 from flask import Blueprint, request, jsonify
 from src.models.knowledge_entry import KnowledgeEntry, db
 from src.models.device import Device
+from src.models.idempotency import idempotency_key, insert_once
+from src.models.serializers import KNOWLEDGE_ENTRY_FIELDS, serialize_query, json_response, unknown_fields_response
 from datetime import datetime
 from sqlalchemy import desc
 
-knowledge_bp = Blueprint(\'knowledge\', __name__)
+knowledge_bp = Blueprint('knowledge', __name__)
 
 # This function should only be called by the ESP32 device, not directly by a user
-@knowledge_bp.route(\'/knowledge\', methods=[\'POST\'])
+@knowledge_bp.route('/knowledge', methods=['POST'])
 def receive_knowledge_entry():
     """Receive new knowledge base entry from ESP32 for owner approval"""
     try:
@@ -15,41 +17,51 @@ def receive_knowledge_entry():
         
         if not data:
             return jsonify({
-                \'success\': False,
-                \'message\': \'لم يتم استلام بيانات JSON\'
+                'success': False,
+                'message': 'لم يتم استلام بيانات JSON'
             }), 400
         
         # Verify device exists
-        device_serial = data.get(\'device_id\')
+        device_serial = data.get('device_id')
         device = Device.query.filter_by(device_serial=device_serial).first()
         if not device:
             return jsonify({
-                \'success\': False,
-                \'message\': \'الجهاز غير مسجل\'
+                'success': False,
+                'message': 'الجهاز غير مسجل'
             }), 404
 
         # Create new knowledge entry object from ESP32 data
         knowledge_entry = KnowledgeEntry.create_from_esp32_data(data)
+        knowledge_entry.idempotency_key = idempotency_key(device_serial, data, request.headers)
         
-        db.session.add(knowledge_entry)
+        # A retried upload conflicts on (device_serial, idempotency_key) and returns the original entry
+        entry_id, created = insert_once(db.session, knowledge_entry, 'device_serial')
         db.session.commit()
         
+        if not created:
+            return jsonify({
+                'success': True,
+                'entry_id': entry_id,
+                'duplicate': True,
+                'message': 'تم استلام إدخال المعرفة مسبقاً'
+            }), 200
+        
         return jsonify({
-            \'success\': True,
-            \'entry_id\': knowledge_entry.id,
-            \'message\': \'تم استلام إدخال المعرفة بنجاح. في انتظار موافقة المالك.\'
+            'success': True,
+            'entry_id': entry_id,
+            'message': 'تم استلام إدخال المعرفة بنجاح. في انتظار موافقة المالك.'
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({
-            \'success\': False,
-            \'message\': f\'خطأ في استلام إدخال المعرفة: {str(e)}\'
+            'success': False,
+            'message': f'خطأ في استلام إدخال المعرفة: {str(e)}'
         }), 500
 
 # These functions should only be accessible by the owner (e.g., via an authenticated admin panel)
 # For simplicity, we are not implementing full authentication here, but the intent is clear.
-@knowledge_bp.route(\'/knowledge\', methods=[\'GET\'])
+@knowledge_bp.route('/knowledge', methods=['GET'])
 def get_knowledge_entries():
     """Get all knowledge base entries (pending and approved) - Owner Only"""
     try:
@@ -57,29 +69,32 @@ def get_knowledge_entries():
         # if not is_owner_authenticated():
         #     return jsonify({'success': False, 'message': 'غير مصرح به'}), 403
 
-        approved_filter = request.args.get(\'approved\', type=str) # \'true\', \'false\', or None
+        approved_filter = request.args.get('approved', type=str) # 'true', 'false', or None
+        fields, unknown_fields = KNOWLEDGE_ENTRY_FIELDS.resolve(request.args.get('fields'))
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
 
         query = KnowledgeEntry.query
 
-        if approved_filter == \'true\':
+        if approved_filter == 'true':
             query = query.filter_by(approved=True)
-        elif approved_filter == \'false\':
+        elif approved_filter == 'false':
             query = query.filter_by(approved=False)
         
-        entries = query.order_by(desc(KnowledgeEntry.timestamp)).all()
+        entries, _ = serialize_query(query.order_by(desc(KnowledgeEntry.timestamp)), KNOWLEDGE_ENTRY_FIELDS, fields)
         
-        return jsonify({
-            \'success\': True,
-            \'entries\': [e.to_dict() for e in entries]
-        }), 200
+        return json_response({
+            'success': True,
+            'entries': entries
+        }, 200)
         
     except Exception as e:
         return jsonify({
-            \'success\': False,
-            \'message\': f\'خطأ في استرجاع إدخالات المعرفة: {str(e)}\'
+            'success': False,
+            'message': f'خطأ في استرجاع إدخالات المعرفة: {str(e)}'
         }), 500
 
-@knowledge_bp.route(\'/knowledge/<int:entry_id>/approve\', methods=[\'POST\'])
+@knowledge_bp.route('/knowledge/<int:entry_id>/approve', methods=['POST'])
 def approve_knowledge_entry(entry_id):
     """Approve a knowledge base entry - Owner Only"""
     try:
@@ -91,8 +106,8 @@ def approve_knowledge_entry(entry_id):
         
         if not entry:
             return jsonify({
-                \'success\': False,
-                \'message\': \'إدخال المعرفة غير موجود\'
+                'success': False,
+                'message': 'إدخال المعرفة غير موجود'
             }), 404
         
         entry.approved = True
@@ -100,21 +115,21 @@ def approve_knowledge_entry(entry_id):
 
         # TODO: Add logic here to integrate this approved entry into the main calibration model
         # This would involve re-training or updating the model with the new data.
-        # For now, it\'s just marked as approved.
+        # For now, it's just marked as approved.
         
         return jsonify({
-            \'success\': True,
-            \'message\': \'تمت الموافقة على إدخال المعرفة بنجاح\'
+            'success': True,
+            'message': 'تمت الموافقة على إدخال المعرفة بنجاح'
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({
-            \'success\': False,
-            \'message\': f\'خطأ في الموافقة على إدخال المعرفة: {str(e)}\'
+            'success': False,
+            'message': f'خطأ في الموافقة على إدخال المعرفة: {str(e)}'
         }), 500
 
-@knowledge_bp.route(\'/knowledge/<int:entry_id>/reject\', methods=[\'POST\'])
+@knowledge_bp.route('/knowledge/<int:entry_id>/reject', methods=['POST'])
 def reject_knowledge_entry(entry_id):
     """Reject and delete a knowledge base entry - Owner Only"""
     try:
@@ -126,23 +141,23 @@ def reject_knowledge_entry(entry_id):
         
         if not entry:
             return jsonify({
-                \'success\': False,
-                \'message\': \'إدخال المعرفة غير موجود\'
+                'success': False,
+                'message': 'إدخال المعرفة غير موجود'
             }), 404
         
         db.session.delete(entry)
         db.session.commit()
         
         return jsonify({
-            \'success\': True,
-            \'message\': \'تم رفض وحذف إدخال المعرفة بنجاح\'
+            'success': True,
+            'message': 'تم رفض وحذف إدخال المعرفة بنجاح'
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({
-            \'success\': False,
-            \'message\': f\'خطأ في رفض إدخال المعرفة: {str(e)}\'
+            'success': False,
+            'message': f'خطأ في رفض إدخال المعرفة: {str(e)}'
         }), 500
 
 
@@ -0,0 +1,224 @@
+"""Server-Sent Events feed of newly ingested measurements and device reports.
+
+The ingest routes publish a small summary of every measurement/report to an
+in-process broker, which encodes it once and fans it out to the bounded queue
+of each subscribed dashboard. With several server workers the summary is also
+relayed to the other workers' brokers (src/monitoring/worker_bus.py). A subscriber whose queue fills up (a stalled
+client) is dropped instead of slowing down ingest or growing memory.
+
+Each open stream holds a server thread, so the number of streams per worker
+is capped by the stream budget (src/monitoring/stream_budget.py), which
+``src/serve.py`` derives from the worker's thread count. Over the budget the
+endpoint answers 503 with ``Retry-After`` while threads remain for ingest.
+"""
+import itertools
+import json
+import queue
+import threading
+
+from flask import Blueprint, Response, request, jsonify
+
+from src.monitoring.stream_budget import stream_budget
+from src.monitoring.worker_bus import worker_bus
+
+live_feed_bp = Blueprint('live_feed', __name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+KEEPALIVE_SECONDS = 15
+RETRY_AFTER_SECONDS = 30
+EVENT_TYPES = ('measurement', 'report')
+
+
+class Subscriber:
+    """One open SSE connection"""
+    __slots__ = ('device_serial', 'event_types', 'queue', 'dropped')
+
+    def __init__(self, device_serial, event_types, queue_size):
+        self.device_serial = device_serial
+        self.event_types = event_types
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class LiveFeedBroker:
+    """In-process pub/sub: per-device and fleet-wide subscribers"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._by_device = {}   # device_serial -> set of subscribers
+        self._fleet = set()    # subscribers to every device
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.dropped_total = 0
+
+    def subscribe(self, device_serial=None, event_types=EVENT_TYPES):
+        """Register a subscriber"""
+        subscriber = Subscriber(device_serial, frozenset(event_types), self.queue_size)
+        with self._lock:
+            if device_serial is None:
+                self._fleet.add(subscriber)
+            else:
+                self._by_device.setdefault(device_serial, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber.device_serial is None:
+                removed = subscriber in self._fleet
+                self._fleet.discard(subscriber)
+            else:
+                subscribers = self._by_device.get(subscriber.device_serial, set())
+                removed = subscriber in subscribers
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    self._by_device.pop(subscriber.device_serial, None)
+            if removed:
+                self._count -= 1
+
+    def subscriber_count(self):
+        return self._count
+
+    def publish(self, event_type, device_serial, payload):
+        """Broadcast an event; the payload is encoded once for all subscribers"""
+        if not self._count:
+            return 0
+        with self._lock:
+            targets = [s for s in itertools.chain(self._fleet, self._by_device.get(device_serial, ()))
+                       if event_type in s.event_types]
+        if not targets:
+            return 0
+
+        message = (
+            f'id: {next(self._ids)}\n'
+            f'event: {event_type}\n'
+            f'data: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n'
+        )
+        delivered = 0
+        for subscriber in targets:
+            try:
+                subscriber.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                # Slow consumer: drop it rather than block ingest
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                self.dropped_total += 1
+        return delivered
+
+
+broker = LiveFeedBroker()
+# Events ingested by other workers reach this worker's subscribers too
+worker_bus.subscribe('live_feed', lambda message: broker.publish(*message))
+
+
+def _broadcast(event_type, device_serial, payload):
+    broker.publish(event_type, device_serial, payload)
+    worker_bus.publish('live_feed', [event_type, device_serial, payload])
+
+
+def publish_measurement(measurement):
+    """Publish a summary of a freshly stored measurement"""
+    if not broker.subscriber_count() and not worker_bus.started:
+        return
+    _broadcast('measurement', measurement.device_serial, {
+        'id': measurement.id,
+        'device_serial': measurement.device_serial,
+        'timestamp': measurement.timestamp.isoformat() if measurement.timestamp else None,
+        'estimated_co2': measurement.estimated_co2,
+        'estimated_protein': measurement.estimated_protein,
+        'estimated_amino_acids': measurement.estimated_amino_acids,
+        'estimated_minerals': measurement.estimated_minerals,
+        'estimated_flavor_compounds': measurement.estimated_flavor_compounds,
+        'estimated_moisture': measurement.estimated_moisture,
+        'quality_score': measurement.quality_score,
+        'coffee_type': measurement.coffee_type,
+        'coffee_origin': measurement.coffee_origin,
+        'sample_name': measurement.sample_name,
+        'is_anomaly': measurement.is_anomaly
+    })
+
+
+def publish_report(device_serial, data, received_at):
+    """Publish a summary of a device operation report"""
+    if not broker.subscriber_count() and not worker_bus.started:
+        return
+    data = data or {}
+    _broadcast('report', device_serial, {
+        'device_serial': device_serial,
+        'received_at': received_at.isoformat(),
+        'measurement_count': data.get('measurement_count'),
+        'error_count': data.get('error_count'),
+        'uptime_hours': data.get('uptime_hours'),
+        'wifi_signal': data.get('wifi_signal'),
+        'free_heap': data.get('free_heap'),
+        'current_mode': data.get('current_mode')
+    })
+
+
+def _event_stream(subscriber):
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                message = subscriber.queue.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                if subscriber.dropped:
+                    break
+                yield ': keepalive\n\n'
+                continue
+            yield message
+            if subscriber.dropped and subscriber.queue.empty():
+                break
+        yield 'event: dropped\ndata: {"reason": "slow_consumer"}\n\n'
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+@live_feed_bp.route('/live/feed', methods=['GET'])
+def live_feed():
+    """Stream new measurements/reports for one device (device_serial=) or the whole fleet"""
+    device_serial = request.args.get('device_serial') or None
+    events = request.args.get('events')
+    event_types = [e.strip() for e in events.split(',') if e.strip()] if events else list(EVENT_TYPES)
+    unknown = [e for e in event_types if e not in EVENT_TYPES]
+    if unknown:
+        return jsonify({
+            'success': False,
+            'message': f"أنواع أحداث غير معروفة: {', '.join(unknown)}"
+        }), 400
+
+    if not stream_budget.acquire():
+        response = jsonify({
+            'success': False,
+            'message': 'تم الوصول إلى الحد الأقصى لعدد المشتركين في البث المباشر'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response
+
+    subscriber = broker.subscribe(device_serial, event_types)
+
+    def close():
+        # Runs when the connection ends, even if the stream never started
+        broker.unsubscribe(subscriber)
+        stream_budget.release()
+
+    response = Response(_event_stream(subscriber), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(close)
+    return response
+
+
+@live_feed_bp.route('/live/stats', methods=['GET'])
+def live_feed_stats():
+    """Current subscriber count and dropped slow consumers"""
+    return jsonify({
+        'success': True,
+        'subscribers': broker.subscriber_count(),
+        'dropped_total': broker.dropped_total,
+        'stream_budget': stream_budget.stats()
+    }), 200
@@ -1,16 +1,55 @@
 from flask import Blueprint, request, jsonify
 from src.models.measurement import Measurement, db
 from src.models.device import Device
-from datetime import datetime, timedelta
+from src.models.serializers import (
+    MEASUREMENT_FIELDS, serialize_query, source_fields, encode_rows, json_response, unknown_fields_response
+)
+from src.models.measurement_archive import measurement_archive, combined_rows
+from src.models.idempotency import idempotency_key, existing_id, insert_once
+from src.models.read_routing import read_session
+from datetime import date, datetime, timedelta
 from sqlalchemy import func, desc
+import numpy as np
 from src.analysis.coffee_composition import (
     estimate_co2, estimate_protein, estimate_amino_acids, 
     estimate_minerals, estimate_flavor_compounds, estimate_moisture,
     get_calibration_data_for_coffee
 )
+from src.analysis.downsampling import lttb_indices
+from src.analysis.anomaly_detection import anomaly_detector, extract_features
+from src.analysis.quality_scoring import quality_scorer
+from src.analysis.spectral_index import spectral_index
+from src.routes.live_feed import publish_measurement
+from src.models.fleet_rollup import record_measurement as record_fleet_rollup, refresh_group, week_start_for
+from src.models.daily_aggregate import (
+    DAILY_COMPONENTS, record_measurement as record_daily_aggregate, refresh_day, window_stats, day_for
+)
+from src.routes.fleet_analytics import analytics_cache
+from src.monitoring.response_cache import response_cache, cached_response, measurements_scope
+import json
 
 measurements_bp = Blueprint("measurements", __name__)
 
+def calculate_value_stats(values):
+    """Summarize a list of values as count/average/min/max (empty dict when there are no values)"""
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "average": round(sum(values) / len(values), 2),
+        "min": min(values),
+        "max": max(values)
+    }
+
+def duplicate_measurement_response(measurement_id):
+    """Answer a retried upload with the measurement stored the first time"""
+    return jsonify({
+        "success": True,
+        "measurement_id": measurement_id,
+        "duplicate": True,
+        "message": "تم استلام هذا القياس مسبقاً"
+    }), 200
+
 @measurements_bp.route("/measurements", methods=["POST"])
 def receive_measurement():
     """Receive measurement data from ESP32 device"""
@@ -40,19 +79,55 @@ def receive_measurement():
                 "message": "الجهاز غير مسجل"
             }), 404
         
+        # Retries (same key) are answered before scoring
+        key = idempotency_key(device_serial, data, request.headers)
+        original_id = existing_id(db.session, Measurement, "device_serial", device_serial, key)
+        if original_id is not None:
+            return duplicate_measurement_response(original_id)
+        
         # Create new measurement object from ESP32 data
         measurement = Measurement.create_from_esp32_data(data)
-        
-        db.session.add(measurement)
+        measurement.idempotency_key = key
+        
+        # Score against the device's rolling baseline (in-memory, no history query);
+        # the baseline itself is only updated once the row is committed
+        features = extract_features(data, nir_readings)
+        anomaly_flags = anomaly_detector.score(device_serial, features)
+        measurement.is_anomaly = bool(anomaly_flags)
+        measurement.anomaly_flags = json.dumps(anomaly_flags) if anomaly_flags else None
+        
+        # Plausibility against the chemical reference ranges (precomputed range table)
+        measurement.quality_score = quality_scorer.score_measurement(measurement)
+        
+        # INSERT ... ON CONFLICT DO NOTHING; a concurrent retry that won the race keeps its row
+        measurement_id, created = insert_once(db.session, measurement, "device_serial")
+        if not created:
+            db.session.rollback()
+            return duplicate_measurement_response(measurement_id)
+        # Fleet-wide weekly rollup and per-device daily aggregate are updated in the same transaction
+        touched_rollups = record_fleet_rollup(db.session, measurement)
+        record_daily_aggregate(db.session, measurement)
         db.session.commit()
+        anomaly_detector.update(device_serial, features)
+        analytics_cache.invalidate(touched_rollups)
+        response_cache.bump(measurements_scope(device_serial))
         
         # Update device last seen
         device.last_seen = datetime.utcnow()
         db.session.commit()
         
+        # Searchable by spectral similarity right away
+        spectral_index.add(measurement)
+        
+        # Push to live dashboards
+        publish_measurement(measurement)
+        
         return jsonify({
             "success": True,
             "measurement_id": measurement.id,
+            "is_anomaly": measurement.is_anomaly,
+            "anomaly_flags": anomaly_flags,
+            "quality_score": measurement.quality_score,
             "message": "تم استلام وحفظ القياس بنجاح"
         }), 200
         
@@ -73,6 +148,9 @@ def get_device_measurements(device_serial):
         sample_type = request.args.get("sample_type", None)
         coffee_type = request.args.get("coffee_type", type=int) # New: Filter by coffee type
         coffee_origin = request.args.get("coffee_origin", type=int) # New: Filter by coffee origin
+        fields, unknown_fields = MEASUREMENT_FIELDS.resolve(request.args.get("fields"))
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
         
         # Calculate date range
         end_date = datetime.utcnow()
@@ -91,17 +169,18 @@ def get_device_measurements(device_serial):
         if coffee_origin is not None: # Apply filter if coffee_origin is provided
             query = query.filter(Measurement.coffee_origin == coffee_origin)
         
-        measurements = query.order_by(desc(Measurement.timestamp)).limit(limit).all()
+        query = query.order_by(desc(Measurement.timestamp)).limit(limit)
         
-        measurement_list = [m.to_dict() for m in measurements]
+        # Project only the requested columns and pass stored JSON through unparsed
+        measurement_list, total_count = serialize_query(query, MEASUREMENT_FIELDS, fields)
         
-        return jsonify({
+        return json_response({
             "success": True,
             "device_serial": device_serial,
             "measurements": measurement_list,
-            "total_count": len(measurement_list),
+            "total_count": total_count,
             "period_days": days
-        }), 200
+        }, 200)
         
     except Exception as e:
         return jsonify({
@@ -170,7 +249,17 @@ def update_measurement(measurement_id):
         if "estimated_moisture" in data:
             measurement.estimated_moisture = data["estimated_moisture"]
         
+        # Sums can't be corrected in place for min/max, so the day and the fleet week are recomputed from raw rows
+        touched_rollups = set()
+        if measurement.timestamp and any(attribute in data for attribute in DAILY_COMPONENTS.values()):
+            db.session.flush()
+            refresh_day(db.session, measurement.device_serial, day_for(measurement.timestamp))
+            touched_rollups = refresh_group(db.session, measurement.coffee_origin, measurement.coffee_type,
+                                            week_start_for(measurement.timestamp), measurement.device_serial)
+        
         db.session.commit()
+        analytics_cache.invalidate(touched_rollups)
+        response_cache.bump(measurements_scope(measurement.device_serial))
         
         return jsonify({
             "success": True,
@@ -185,7 +274,15 @@ def update_measurement(measurement_id):
             "message": f"خطأ في تحديث القياس: {str(e)}"
         }), 500
 
+# Columns read by the stats endpoint (from the hot table and the archive)
+STATS_COLUMNS = [
+    "timestamp", "estimated_co2", "estimated_protein", "estimated_amino_acids",
+    "estimated_minerals", "estimated_flavor_compounds", "estimated_moisture",
+    "sample_type", "coffee_type", "quality_score"
+]
+
 @measurements_bp.route("/measurements/<device_serial>/stats", methods=["GET"])
+@cached_response(measurements_scope)
 def get_measurement_stats(device_serial):
     """Get measurement statistics for a device"""
     try:
@@ -197,8 +294,8 @@ def get_measurement_stats(device_serial):
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Build query
-        query = Measurement.query.filter(
+        # Build query (read replica when configured)
+        query = read_session(db).query(Measurement).filter(
             Measurement.device_serial == device_serial,
             Measurement.timestamp >= start_date
         )
@@ -207,7 +304,11 @@ def get_measurement_stats(device_serial):
         if coffee_origin is not None:
             query = query.filter(Measurement.coffee_origin == coffee_origin)
 
-        measurements = query.all()
+        # Hot table plus any archived partitions in the period, oldest first
+        measurements = combined_rows(
+            query, device_serial, STATS_COLUMNS, start_date=start_date,
+            coffee_type=coffee_type, coffee_origin=coffee_origin
+        )
         
         if not measurements:
             return jsonify({
@@ -218,100 +319,52 @@ def get_measurement_stats(device_serial):
         
         # Calculate statistics
         total_measurements = len(measurements)
+        columns = {name: [row[i] for row in measurements] for i, name in enumerate(STATS_COLUMNS)}
         
         # CO2 statistics
-        co2_values = [m.estimated_co2 for m in measurements if m.estimated_co2 is not None]
-        co2_stats = {}
-        if co2_values:
-            co2_stats = {
-                "count": len(co2_values),
-                "average": round(sum(co2_values) / len(co2_values), 2),
-                "min": min(co2_values),
-                "max": max(co2_values)
-            }
+        co2_values = [v for v in columns["estimated_co2"] if v is not None]
+        co2_stats = calculate_value_stats(co2_values)
         
         # Protein statistics (New)
-        protein_values = [m.estimated_protein for m in measurements if m.estimated_protein is not None]
-        protein_stats = {}
-        if protein_values:
-            protein_stats = {
-                "count": len(protein_values),
-                "average": round(sum(protein_values) / len(protein_values), 2),
-                "min": min(protein_values),
-                "max": max(protein_values)
-            }
+        protein_values = [v for v in columns["estimated_protein"] if v is not None]
+        protein_stats = calculate_value_stats(protein_values)
 
         # Amino Acids statistics (New)
-        amino_acids_values = [m.estimated_amino_acids for m in measurements if m.estimated_amino_acids is not None]
-        amino_acids_stats = {}
-        if amino_acids_values:
-            amino_acids_stats = {
-                "count": len(amino_acids_values),
-                "average": round(sum(amino_acids_values) / len(amino_acids_values), 2),
-                "min": min(amino_acids_values),
-                "max": max(amino_acids_values)
-            }
+        amino_acids_values = [v for v in columns["estimated_amino_acids"] if v is not None]
+        amino_acids_stats = calculate_value_stats(amino_acids_values)
 
         # Minerals statistics (New)
-        minerals_values = [m.estimated_minerals for m in measurements if m.estimated_minerals is not None]
-        minerals_stats = {}
-        if minerals_values:
-            minerals_stats = {
-                "count": len(minerals_values),
-                "average": round(sum(minerals_values) / len(minerals_values), 2),
-                "min": min(minerals_values),
-                "max": max(minerals_values)
-            }
+        minerals_values = [v for v in columns["estimated_minerals"] if v is not None]
+        minerals_stats = calculate_value_stats(minerals_values)
 
         # Flavor Compounds statistics (New)
-        flavor_compounds_values = [m.estimated_flavor_compounds for m in measurements if m.estimated_flavor_compounds is not None]
-        flavor_compounds_stats = {}
-        if flavor_compounds_values:
-            flavor_compounds_stats = {
-                "count": len(flavor_compounds_values),
-                "average": round(sum(flavor_compounds_values) / len(flavor_compounds_values), 2),
-                "min": min(flavor_compounds_values),
-                "max": max(flavor_compounds_values)
-            }
+        flavor_compounds_values = [v for v in columns["estimated_flavor_compounds"] if v is not None]
+        flavor_compounds_stats = calculate_value_stats(flavor_compounds_values)
         
         # Moisture statistics (New)
-        moisture_values = [m.estimated_moisture for m in measurements if m.estimated_moisture is not None]
-        moisture_stats = {}
-        if moisture_values:
-            moisture_stats = {
-                "count": len(moisture_values),
-                "average": round(sum(moisture_values) / len(moisture_values), 2),
-                "min": min(moisture_values),
-                "max": max(moisture_values)
-            }
+        moisture_values = [v for v in columns["estimated_moisture"] if v is not None]
+        moisture_stats = calculate_value_stats(moisture_values)
         
         # Sample type distribution
         sample_types = {}
-        for m in measurements:
-            if m.sample_type:
-                sample_types[m.sample_type] = sample_types.get(m.sample_type, 0) + 1
+        for sample_type in columns["sample_type"]:
+            if sample_type:
+                sample_types[sample_type] = sample_types.get(sample_type, 0) + 1
         
         # Coffee type distribution (New)
         coffee_types_dist = {}
-        for m in measurements:
-            if m.coffee_type is not None:
-                coffee_types_dist[str(m.coffee_type)] = coffee_types_dist.get(str(m.coffee_type), 0) + 1
+        for value in columns["coffee_type"]:
+            if value is not None:
+                coffee_types_dist[str(value)] = coffee_types_dist.get(str(value), 0) + 1
 
         # Quality score statistics
-        quality_scores = [m.quality_score for m in measurements if m.quality_score is not None]
-        quality_stats = {}
-        if quality_scores:
-            quality_stats = {
-                "count": len(quality_scores),
-                "average": round(sum(quality_scores) / len(quality_scores), 2),
-                "min": min(quality_scores),
-                "max": max(quality_scores)
-            }
+        quality_scores = [v for v in columns["quality_score"] if v is not None]
+        quality_stats = calculate_value_stats(quality_scores)
         
         # Daily measurement counts
         daily_counts = {}
-        for m in measurements:
-            date_key = m.timestamp.date().isoformat()
+        for timestamp in columns["timestamp"]:
+            date_key = timestamp.date().isoformat()
             daily_counts[date_key] = daily_counts.get(date_key, 0) + 1
         
         return jsonify({
@@ -330,8 +383,8 @@ def get_measurement_stats(device_serial):
                 "coffee_type_distribution": coffee_types_dist, # Include coffee type distribution
                 "quality_statistics": quality_stats,
                 "daily_measurement_counts": daily_counts,
-                "first_measurement": measurements[-1].timestamp.isoformat() if measurements else None,
-                "last_measurement": measurements[0].timestamp.isoformat() if measurements else None
+                "first_measurement": columns["timestamp"][0].isoformat(),
+                "last_measurement": columns["timestamp"][-1].isoformat()
             }
         }), 200
         
@@ -341,6 +394,50 @@ def get_measurement_stats(device_serial):
             "message": f"خطأ في حساب إحصائيات القياسات: {str(e)}"
         }), 500
 
+@measurements_bp.route("/measurements/<device_serial>/daily-stats", methods=["GET"])
+@cached_response(measurements_scope)
+def get_daily_measurement_stats(device_serial):
+    """Measurement statistics over whole UTC days, summed from the daily aggregate table"""
+    try:
+        days = max(1, min(request.args.get("days", 30, type=int), 3650))
+        coffee_type = request.args.get("coffee_type", type=int)
+        coffee_origin = request.args.get("coffee_origin", type=int)
+        end_date = request.args.get("end_date")
+        
+        try:
+            end_day = date.fromisoformat(end_date) if end_date else datetime.utcnow().date()
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "message": "صيغة التاريخ غير صحيحة، استخدم YYYY-MM-DD"
+            }), 400
+        start_day = end_day - timedelta(days=days - 1)
+        
+        stats = window_stats(read_session(db), device_serial, start_day, end_day,
+                             coffee_type=coffee_type, coffee_origin=coffee_origin)
+        
+        return jsonify({
+            "success": True,
+            "device_serial": device_serial,
+            "start_date": start_day.isoformat(),
+            "end_date": end_day.isoformat(),
+            "period_days": days,
+            "stats": stats
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"خطأ في حساب الإحصائيات اليومية: {str(e)}"
+        }), 500
+
+# CSV export columns, in output order
+EXPORT_CSV_COLUMNS = [
+    "id", "timestamp", "sample_name", "sample_type", "coffee_type", "coffee_origin",
+    "estimated_co2", "estimated_protein", "estimated_amino_acids", "estimated_minerals",
+    "estimated_flavor_compounds", "estimated_moisture", "quality_score", "notes"
+]
+
 @measurements_bp.route("/measurements/<device_serial>/export", methods=["GET"])
 def export_measurements(device_serial):
     """Export measurements data for analysis"""
@@ -349,13 +446,16 @@ def export_measurements(device_serial):
         format_type = request.args.get("format", "json")  # json or csv
         coffee_type = request.args.get("coffee_type", type=int) # New: Filter by coffee type
         coffee_origin = request.args.get("coffee_origin", type=int) # New: Filter by coffee origin
+        fields, unknown_fields = MEASUREMENT_FIELDS.resolve(request.args.get("fields"))
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
         
         # Calculate date range
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Get measurements
-        query = Measurement.query.filter(
+        # Get measurements (read replica when configured)
+        query = read_session(db).query(Measurement).filter(
             Measurement.device_serial == device_serial,
             Measurement.timestamp >= start_date
         )
@@ -364,9 +464,15 @@ def export_measurements(device_serial):
         if coffee_origin is not None:
             query = query.filter(Measurement.coffee_origin == coffee_origin)
 
-        measurements = query.order_by(Measurement.timestamp).all()
+        query = query.order_by(Measurement.timestamp)
+        include_archive = measurement_archive.has_partitions(device_serial, start_date)
         
         if format_type == "csv":
+            measurements = combined_rows(
+                query, device_serial, EXPORT_CSV_COLUMNS, start_date=start_date,
+                coffee_type=coffee_type, coffee_origin=coffee_origin
+            )
+
             # Return CSV format
             import io
             import csv
@@ -383,15 +489,17 @@ def export_measurements(device_serial):
             ])
             
             # Write data
-            for m in measurements:
+            for (m_id, timestamp, sample_name, sample_type, m_coffee_type, m_coffee_origin,
+                 co2, protein, amino_acids, minerals, flavor_compounds, moisture,
+                 quality_score, notes) in measurements:
                 writer.writerow([
-                    m.id, m.timestamp.isoformat(), m.sample_name or "",
-                    m.sample_type or "", m.coffee_type, m.coffee_origin, # Include coffee origin
-                    m.estimated_co2 or "", 
-                    m.estimated_protein or "", m.estimated_amino_acids or "", 
-                    m.estimated_minerals or "", m.estimated_flavor_compounds or "", 
-                    m.estimated_moisture or "", 
-                    m.quality_score or "", m.notes or ""
+                    m_id, timestamp.isoformat(), sample_name or "",
+                    sample_type or "", m_coffee_type, m_coffee_origin, # Include coffee origin
+                    co2 or "", 
+                    protein or "", amino_acids or "", 
+                    minerals or "", flavor_compounds or "", 
+                    moisture or "", 
+                    quality_score or "", notes or ""
                 ])
             
             output.seek(0)
@@ -402,16 +510,24 @@ def export_measurements(device_serial):
         
         else:
             # Return JSON format
-            measurement_list = [m.to_dict() for m in measurements]
+            if include_archive:
+                selected = source_fields(MEASUREMENT_FIELDS, fields)
+                rows = combined_rows(
+                    query, device_serial, selected, start_date=start_date,
+                    coffee_type=coffee_type, coffee_origin=coffee_origin
+                )
+                measurement_list, total_count = encode_rows(rows, MEASUREMENT_FIELDS, selected, fields), len(rows)
+            else:
+                measurement_list, total_count = serialize_query(query, MEASUREMENT_FIELDS, fields)
             
-            return jsonify({
+            return json_response({
                 "success": True,
                 "device_serial": device_serial,
                 "export_date": datetime.utcnow().isoformat(),
                 "period_days": days,
-                "total_count": len(measurement_list),
+                "total_count": total_count,
                 "measurements": measurement_list
-            }), 200
+            }, 200)
         
     except Exception as e:
         return jsonify({
@@ -420,6 +536,7 @@ def export_measurements(device_serial):
         }), 500
 
 @measurements_bp.route("/measurements/<device_serial>/co2-trends", methods=["GET"])
+@cached_response(measurements_scope)
 def get_co2_trends(device_serial):
     """Get CO2 trends and patterns for a device"""
     try:
@@ -442,15 +559,18 @@ def get_co2_trends(device_serial):
         if coffee_origin is not None:
             query = query.filter(Measurement.coffee_origin == coffee_origin)
 
-        measurements = query.order_by(Measurement.timestamp).all()
+        measurements = combined_rows(
+            query, device_serial, ["timestamp", "estimated_co2"], start_date=start_date,
+            coffee_type=coffee_type, coffee_origin=coffee_origin, not_null="estimated_co2"
+        )
         
         # Prepare data for plotting
         trend_data = [
             {
-                "timestamp": m.timestamp.isoformat(),
-                "co2_level": m.estimated_co2
+                "timestamp": timestamp.isoformat(),
+                "co2_level": co2_level
             }
-            for m in measurements
+            for timestamp, co2_level in measurements
         ]
         
         return jsonify({
@@ -465,6 +585,232 @@ def get_co2_trends(device_serial):
             "message": f"خطأ في استرجاع اتجاهات CO2: {str(e)}"
         }), 500
 
+@measurements_bp.route("/measurements/<device_serial>/anomalies", methods=["GET"])
+def get_device_anomalies(device_serial):
+    """Get measurements flagged as anomalous for a device, plus its current baseline"""
+    try:
+        days = request.args.get("days", 30, type=int)
+        limit = request.args.get("limit", 100, type=int)
+        
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        query = Measurement.query.filter(
+            Measurement.device_serial == device_serial,
+            Measurement.is_anomaly.is_(True),
+            Measurement.timestamp >= start_date
+        ).order_by(desc(Measurement.timestamp)).limit(limit)
+        
+        anomalies, total_count = serialize_query(
+            query, MEASUREMENT_FIELDS,
+            ["id", "timestamp", "sample_name", "coffee_type", "coffee_origin", "anomaly_flags"]
+        )
+        
+        return json_response({
+            "success": True,
+            "device_serial": device_serial,
+            "period_days": days,
+            "anomalies": anomalies,
+            "total_count": total_count,
+            "baseline": anomaly_detector.baseline(device_serial)
+        }, 200)
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"خطأ في استرجاع القياسات الشاذة: {str(e)}"
+        }), 500
+
+# Estimate columns available to the trends endpoint
+TREND_COMPONENTS = {
+    "co2": Measurement.estimated_co2,
+    "protein": Measurement.estimated_protein,
+    "amino_acids": Measurement.estimated_amino_acids,
+    "minerals": Measurement.estimated_minerals,
+    "flavor_compounds": Measurement.estimated_flavor_compounds,
+    "moisture": Measurement.estimated_moisture,
+    "quality_score": Measurement.quality_score,
+}
+
+def epoch_seconds(column):
+    """SQL expression for a timestamp column as Unix epoch seconds"""
+    dialect = db.session.get_bind(mapper=Measurement.__mapper__).dialect.name
+    if dialect == "sqlite":
+        return func.cast(func.strftime("%s", column), db.Integer)
+    if dialect == "postgresql":
+        return func.extract("epoch", column)
+    return func.unix_timestamp(column)
+
+def bucketed_trend(query, value_column, start_date, bucket_seconds, archived_rows=None):
+    """Aggregate a component into fixed time buckets (min/avg/max/count per bucket).
+
+    ``archived_rows`` are (timestamp, value) pairs from the archive; they are
+    bucketed with numpy and merged into the SQL aggregates.
+    """
+    start_epoch = int((start_date - datetime(1970, 1, 1)).total_seconds())
+    bucket = func.floor((epoch_seconds(Measurement.timestamp) - start_epoch) / bucket_seconds).label("bucket")
+    rows = query.filter(value_column.isnot(None)).with_entities(
+        bucket,
+        func.min(value_column),
+        func.avg(value_column),
+        func.max(value_column),
+        func.count(value_column)
+    ).group_by(bucket).order_by(bucket).all()
+
+    # bucket -> [min, sum, max, count]
+    buckets = {
+        int(b): [min_value, avg_value * count, max_value, count]
+        for b, min_value, avg_value, max_value, count in rows
+    }
+    if archived_rows:
+        epoch = datetime(1970, 1, 1)
+        seconds = np.fromiter(((t - epoch).total_seconds() for t, _ in archived_rows), dtype=float, count=len(archived_rows))
+        values = np.fromiter((v for _, v in archived_rows), dtype=float, count=len(archived_rows))
+        indices = np.floor((np.floor(seconds) - start_epoch) / bucket_seconds).astype(np.int64)
+        order = np.argsort(indices, kind="stable")
+        indices, values = indices[order], values[order]
+        keys, starts, counts = np.unique(indices, return_index=True, return_counts=True)
+        mins = np.minimum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        for key, min_value, total, max_value, count in zip(keys.tolist(), mins.tolist(), sums.tolist(), maxs.tolist(), counts.tolist()):
+            merged = buckets.get(key)
+            if merged is None:
+                buckets[key] = [min_value, total, max_value, count]
+            else:
+                merged[0] = min(merged[0], min_value)
+                merged[1] += total
+                merged[2] = max(merged[2], max_value)
+                merged[3] += count
+
+    return [
+        {
+            "timestamp": datetime.utcfromtimestamp(start_epoch + b * bucket_seconds).isoformat(),
+            "min": min_value,
+            "avg": round(total / count, 4) if count else None,
+            "max": max_value,
+            "count": count
+        }
+        for b, (min_value, total, max_value, count) in sorted(buckets.items())
+    ]
+
+def lttb_trend(query, value_column, max_points, archive_filters=None):
+    """Reduce a component's raw points to at most max_points with LTTB.
+
+    ``archive_filters`` (device_serial, start_date, coffee_type, coffee_origin)
+    adds the archived points of the period.
+    """
+    if archive_filters:
+        rows = combined_rows(
+            query.filter(value_column.isnot(None)), names=["timestamp", value_column.key],
+            not_null=value_column.key, **archive_filters
+        )
+    else:
+        rows = query.filter(value_column.isnot(None)).with_entities(
+            Measurement.timestamp, value_column
+        ).order_by(Measurement.timestamp).all()
+    if not rows:
+        return [], 0
+
+    timestamps = [r[0] for r in rows]
+    x = np.fromiter((t.timestamp() for t in timestamps), dtype=float, count=len(rows))
+    y = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+    indices = lttb_indices(x, y, max_points)
+
+    return [
+        {"timestamp": timestamps[i].isoformat(), "value": rows[i][1]}
+        for i in indices
+    ], len(rows)
+
+@measurements_bp.route("/measurements/<device_serial>/trends", methods=["GET"])
+def get_component_trends(device_serial):
+    """Get downsampled trends for one or more estimate columns"""
+    try:
+        days = request.args.get("days", 30, type=int)
+        coffee_type = request.args.get("coffee_type", type=int)
+        coffee_origin = request.args.get("coffee_origin", type=int)
+        components = [c.strip() for c in request.args.get("component", "co2").split(",") if c.strip()]
+        method = request.args.get("method", "bucket")  # bucket or lttb
+        max_points = max(3, min(request.args.get("max_points", 500, type=int), 10000))
+        bucket_seconds = request.args.get("bucket_seconds", type=int)
+
+        unknown = [c for c in components if c not in TREND_COMPONENTS]
+        if unknown or not components:
+            return jsonify({
+                "success": False,
+                "message": f"مكونات غير معروفة: {', '.join(unknown)}",
+                "available_components": list(TREND_COMPONENTS)
+            }), 400
+        if method not in ("bucket", "lttb"):
+            return jsonify({
+                "success": False,
+                "message": "طريقة التجميع غير صحيحة (bucket أو lttb)"
+            }), 400
+
+        # Calculate date range
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+
+        query = Measurement.query.filter(
+            Measurement.device_serial == device_serial,
+            Measurement.timestamp >= start_date
+        )
+        if coffee_type is not None:
+            query = query.filter(Measurement.coffee_type == coffee_type)
+        if coffee_origin is not None:
+            query = query.filter(Measurement.coffee_origin == coffee_origin)
+
+        # Archived partitions overlapping the period are read alongside the hot table
+        include_archive = measurement_archive.has_partitions(device_serial, start_date)
+        archive_filters = {
+            "device_serial": device_serial, "start_date": start_date,
+            "coffee_type": coffee_type, "coffee_origin": coffee_origin
+        } if include_archive else None
+
+        # Buckets are never narrower than the width that keeps the series at or under max_points
+        min_bucket_seconds = max(1, -(-int((end_date - start_date).total_seconds()) // max_points))
+        bucket_seconds = max(bucket_seconds or 0, min_bucket_seconds)
+
+        series = {}
+        for component in components:
+            value_column = TREND_COMPONENTS[component]
+            if method == "bucket":
+                archived_rows = measurement_archive.read(
+                    columns=["timestamp", value_column.key], not_null=value_column.key, **archive_filters
+                ) if include_archive else None
+                points = bucketed_trend(query, value_column, start_date, bucket_seconds, archived_rows)
+                series[component] = {
+                    "points": points,
+                    "raw_count": sum(p["count"] for p in points),
+                    "returned_count": len(points)
+                }
+            else:
+                points, raw_count = lttb_trend(query, value_column, max_points, archive_filters)
+                series[component] = {
+                    "points": points,
+                    "raw_count": raw_count,
+                    "returned_count": len(points)
+                }
+
+        response = {
+            "success": True,
+            "device_serial": device_serial,
+            "method": method,
+            "period_days": days,
+            "max_points": max_points,
+            "series": series
+        }
+        if method == "bucket":
+            response["bucket_seconds"] = bucket_seconds
+
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"خطأ في استرجاع الاتجاهات: {str(e)}"
+        }), 500
+
 # New endpoint for calibration data
 @measurements_bp.route("/calibration_data", methods=["GET"])
 def get_calibration_data():
@@ -472,6 +818,7 @@ def get_calibration_data():
     try:
         coffee_type = request.args.get("coffee_type", type=int)
         coffee_origin = request.args.get("coffee_origin", type=int)
+        coffee_variety = request.args.get("coffee_variety")
         
         if coffee_type is None or coffee_origin is None:
             return jsonify({
@@ -480,7 +827,7 @@ def get_calibration_data():
             }), 400
         
         # Get calibration data from the analysis module
-        calibration_data = get_calibration_data_for_coffee(coffee_type, coffee_origin)
+        calibration_data = get_calibration_data_for_coffee(coffee_type, coffee_origin, coffee_variety)
         
         return jsonify({
             "success": True,
@@ -1,24 +1,40 @@
 from flask import Blueprint, request, jsonify
 from src.models.device import Device, db
 from src.models.device_report import DeviceReport
+from src.models.serializers import DEVICE_REPORT_FIELDS, serialize_query, json_response, unknown_fields_response
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from src.routes.live_feed import publish_report
+from src.models.idempotency import idempotency_key, insert_once
+from src.models.read_routing import read_session
+from src.monitoring.response_cache import response_cache, cached_response, reports_scope
+import json
 
 reports_bp = Blueprint('reports', __name__)
 
+# Fields returned by the report listing when no fields= argument is given
+REPORT_LIST_FIELDS = [
+    'id', 'measurement_count', 'error_count', 'uptime_hours', 'wifi_signal',
+    'free_heap', 'current_mode', 'created_at', 'additional_data'
+]
+
 @reports_bp.route('/devices/<device_id>/report', methods=['POST'])
 def receive_device_report(device_id):
     """Receive and store device operation report"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         
-        # Verify device exists
-        device = Device.query.filter_by(device_id=device_id).first()
+        # Verify device exists (the firmware posts its serial, other clients the device id)
+        device = Device.query.filter(
+            (Device.device_id == device_id) | (Device.device_serial == device_id)
+        ).first()
         if not device:
             return jsonify({
                 'success': False,
                 'message': 'الجهاز غير موجود'
             }), 404
+        device_id = device.device_id
+        device.last_seen = datetime.utcnow()
         
         # Create new report
         new_report = DeviceReport(
@@ -29,18 +45,36 @@ def receive_device_report(device_id):
             wifi_signal=data.get('wifi_signal', 0),
             free_heap=data.get('free_heap', 0),
             current_mode=data.get('current_mode', 0),
-            additional_data=data.get('additional_data', {})
+            additional_data=json.dumps(data.get('additional_data', {})),
+            created_at=datetime.utcnow(),
+            idempotency_key=idempotency_key(device_id, data, request.headers)
         )
         
-        db.session.add(new_report)
+        # A retried report conflicts on (device_id, idempotency_key) and returns the original id
+        report_id, created = insert_once(db.session, new_report, 'device_id')
         db.session.commit()
+        if created:
+            response_cache.bump(reports_scope(device_id))
+        
+        if not created:
+            return jsonify({
+                'success': True,
+                'report_id': report_id,
+                'duplicate': True,
+                'message': 'تم استلام هذا التقرير مسبقاً'
+            }), 200
+        
+        # Push to live dashboards
+        publish_report(device.device_serial, data, new_report.created_at)
         
         return jsonify({
             'success': True,
+            'report_id': report_id,
             'message': 'تم استلام التقرير بنجاح'
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': f'خطأ في استلام التقرير: {str(e)}'
@@ -53,37 +87,28 @@ def get_device_reports(device_id):
         # Get query parameters
         limit = request.args.get('limit', 50, type=int)
         days = request.args.get('days', 30, type=int)
+        fields, unknown_fields = DEVICE_REPORT_FIELDS.resolve(request.args.get('fields'), REPORT_LIST_FIELDS)
+        if unknown_fields:
+            return unknown_fields_response(unknown_fields)
         
         # Calculate date range
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Query reports
-        reports = DeviceReport.query.filter(
+        # Query reports (read replica when configured)
+        query = read_session(db).query(DeviceReport).filter(
             DeviceReport.device_id == device_id,
             DeviceReport.created_at >= start_date
-        ).order_by(DeviceReport.created_at.desc()).limit(limit).all()
+        ).order_by(DeviceReport.created_at.desc()).limit(limit)
         
-        report_list = []
-        for report in reports:
-            report_list.append({
-                'id': report.id,
-                'measurement_count': report.measurement_count,
-                'error_count': report.error_count,
-                'uptime_hours': report.uptime_hours,
-                'wifi_signal': report.wifi_signal,
-                'free_heap': report.free_heap,
-                'current_mode': report.current_mode,
-                'created_at': report.created_at.isoformat(),
-                'additional_data': report.additional_data
-            })
+        report_list, total_count = serialize_query(query, DEVICE_REPORT_FIELDS, fields)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'device_id': device_id,
             'reports': report_list,
-            'total_count': len(report_list)
-        }), 200
+            'total_count': total_count
+        }, 200)
         
     except Exception as e:
         return jsonify({
@@ -92,6 +117,7 @@ def get_device_reports(device_id):
         }), 500
 
 @reports_bp.route('/devices/<device_id>/stats', methods=['GET'])
+@cached_response(reports_scope)
 def get_device_stats(device_id):
     """Get device statistics and health summary"""
     try:
@@ -156,11 +182,14 @@ def get_device_stats(device_id):
 def get_dashboard_summary():
     """Get overall dashboard summary for all devices"""
     try:
+        # Aggregate reads go to the read replica when configured
+        session = read_session(db)
+        
         # Get all devices
-        total_devices = Device.query.count()
+        total_devices = session.query(Device).count()
         
         # Get devices by activation level
-        level_counts = db.session.query(
+        level_counts = session.query(
             Device.activation_level,
             func.count(Device.id)
         ).group_by(Device.activation_level).all()
@@ -173,7 +202,7 @@ def get_dashboard_summary():
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(hours=24)
         
-        recent_reports = DeviceReport.query.filter(
+        recent_reports = session.query(DeviceReport).filter(
             DeviceReport.created_at >= start_date
         ).all()
         
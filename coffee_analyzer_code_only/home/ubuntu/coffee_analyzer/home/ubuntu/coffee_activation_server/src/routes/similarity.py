@@ -0,0 +1,118 @@
+from flask import Blueprint, request, jsonify
+from src.models.measurement import Measurement, db
+from src.analysis.spectral_index import spectral_index
+import time
+
+similarity_bp = Blueprint('similarity', __name__)
+
+DEFAULT_K = 10
+MAX_K = 1000
+# Over-fetch factor while archived ids crowd the live ones out of the top k
+REFETCH_GROWTH = 4
+
+def _search(nir_readings, params, exclude_id=None):
+    """Run a filtered top-k search and build the JSON response"""
+    k = params.get('k', DEFAULT_K)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        return jsonify({
+            'success': False,
+            'message': f'قيمة k يجب أن تكون بين 1 و {MAX_K}'
+        }), 400
+
+    started = time.perf_counter()
+    # Pick up rows stored by other workers (at most once per sync interval)
+    spectral_index.maybe_sync(db.session)
+    include_archived = params.get('include_archived') is True
+    fetch = k
+    try:
+        while True:
+            matches = spectral_index.search(
+                nir_readings, k=fetch,
+                device_serial=params.get('device_serial'),
+                coffee_type=params.get('coffee_type'),
+                coffee_origin=params.get('coffee_origin'),
+                exclude_id=exclude_id
+            )
+            # Archived measurements stay indexed but are no longer served by GET /measurements/<id>
+            live_ids = {m_id for (m_id,) in db.session.query(Measurement.id)
+                        .filter(Measurement.id.in_([m_id for m_id, _ in matches]))} if matches else set()
+            if include_archived or len(live_ids) >= k or len(matches) < fetch:
+                break
+            fetch *= REFETCH_GROWTH
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'قراءات NIR يجب أن تحتوي على 11 قناة رقمية'
+        }), 400
+
+    results = []
+    for m_id, distance in matches:
+        match = {'measurement_id': m_id, 'distance': round(distance, 6)}
+        if m_id not in live_ids:
+            if not include_archived:
+                continue
+            match['archived'] = True
+        results.append(match)
+        if len(results) == k:
+            break
+
+    return jsonify({
+        'success': True,
+        'matches': results,
+        'k': k,
+        'indexed': len(spectral_index),
+        'query_ms': round((time.perf_counter() - started) * 1000, 2)
+    }), 200
+
+@similarity_bp.route('/measurements/<int:measurement_id>/similar', methods=['GET'])
+def similar_to_measurement(measurement_id):
+    """Past measurements whose spectra are nearest to a stored measurement"""
+    try:
+        measurement = db.session.get(Measurement, measurement_id)
+        if not measurement:
+            return jsonify({
+                'success': False,
+                'message': 'القياس غير موجود'
+            }), 404
+
+        params = {
+            'k': request.args.get('k', DEFAULT_K, type=int),
+            'device_serial': request.args.get('device_serial'),
+            'coffee_type': request.args.get('coffee_type', type=int),
+            'coffee_origin': request.args.get('coffee_origin', type=int),
+            'include_archived': request.args.get('include_archived', 'false') == 'true'
+        }
+        return _search(measurement.nir_data, params, exclude_id=measurement_id)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في البحث عن القياسات المشابهة: {str(e)}'
+        }), 500
+
+@similarity_bp.route('/measurements/similar', methods=['POST'])
+def similar_to_spectrum():
+    """Past measurements whose spectra are nearest to the posted NIR readings"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('nir_readings'):
+            return jsonify({
+                'success': False,
+                'message': 'قراءات NIR مطلوبة'
+            }), 400
+
+        return _search(data['nir_readings'], data)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في البحث عن القياسات المشابهة: {str(e)}'
+        }), 500
+
+@similarity_bp.route('/similarity/stats', methods=['GET'])
+def similarity_index_stats():
+    """Size and configuration of the spectral index"""
+    return jsonify({
+        'success': True,
+        'index': spectral_index.stats()
+    }), 200
@@ -0,0 +1,54 @@
+"""Compute quality_score for stored measurements against the chemical reference ranges.
+
+New measurements are scored at ingest; run this to backfill existing rows
+(only unscored rows by default) or to rescore after the reference data
+changes. Scoring is vectorized over batches of rows. The daily aggregates of
+every rescored device-day are recomputed; ``--rebuild-rollup`` also rebuilds
+the fleet rollup (hot and archived rows) so its quality_score statistics match.
+
+Example:
+    python src/score_measurements.py
+    python src/score_measurements.py --all --rebuild-rollup
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.user import db
+from src.analysis.quality_scoring import rescore_measurements
+from src.models.fleet_rollup import rebuild_rollup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score measurements against the chemical reference ranges.')
+    parser.add_argument('--all', action='store_true', help='Rescore every measurement, not only unscored ones')
+    parser.add_argument('--device', help='Only score this device serial')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows scored per batch')
+    parser.add_argument('--dry-run', action='store_true', help='Score without writing')
+    parser.add_argument('--rebuild-rollup', action='store_true',
+                        help='Rebuild the fleet rollup afterwards so its quality_score statistics match')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    app = create_app()
+    with app.app_context():
+        read, scored = rescore_measurements(
+            db.session, only_missing=not args.all, device_serial=args.device,
+            batch_size=args.batch_size, dry_run=args.dry_run
+        )
+        elapsed = time.perf_counter() - started
+        suffix = ' (dry run)' if args.dry_run else ''
+        print(f"Scored {scored} of {read} measurements in {elapsed:.2f} s{suffix}")
+        if args.rebuild_rollup and scored and not args.dry_run:
+            count = rebuild_rollup(db.session)
+            print(f"Rebuilt fleet rollup from {count} measurements")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Production launcher: the Flask app under gunicorn with threaded workers.
+
+The app, the chemical reference table, the calibration lookup table, the
+anomaly baselines and the memory-mapped spectral index are loaded once in the
+master process before forking (``preload_app``), then frozen out of the
+garbage collector so workers share those pages copy-on-write. Each worker is
+recycled after ``--max-requests`` (+ jitter) requests. On shutdown or
+recycling, a worker finishes its in-flight requests within
+``--graceful-timeout`` and then writes its in-memory state (anomaly
+baselines, spectral index) to disk.
+
+Example:
+    python src/serve.py --bind 0.0.0.0:5000 --workers 3 --threads 16
+
+Defaults come from the environment: ``BIND`` (or ``PORT``), ``WEB_CONCURRENCY``,
+``THREADS``, ``MAX_REQUESTS``, ``MAX_REQUESTS_JITTER``, ``GRACEFUL_TIMEOUT``,
+``TIMEOUT``. ``python src/main.py`` still starts the single-process debug
+server for development.
+
+Held requests: workers are ``gthread`` workers, and a long-polled status
+check (``?wait=``) or a live-feed stream holds one thread while it is open.
+Each worker keeps ``reserved_threads(threads)`` threads (a quarter, at least
+4) for everything else; long polls over the remaining budget are answered at
+once and live streams over it get 503 (src/monitoring/stream_budget.py). Raise
+``--threads`` for more concurrent dashboards or long-polling devices.
+
+Several workers: the master creates a directory for the worker bus
+(src/monitoring/worker_bus.py). Live-feed events, activation wake-ups,
+response- and fleet-analytics-cache invalidations and read-your-writes pins
+are relayed to every other worker, so a dashboard or long poll sees events
+ingested by any worker. Per worker, not relayed:
+
+- anomaly baselines: each worker learns from the measurements it ingests and
+  the last worker to exit writes the checkpoint;
+- the spectral index sees other workers' rows on its next sync.
+
+Throughput comparison from src/load_test.py (400 devices, 1 s measurement
+interval, 20 s plus 2 s ramp-up, SQLite). Measured on a single-vCPU sandbox
+where the load generator shares the server's CPU, so total throughput is CPU
+bound and the gain from extra workers is mostly in latency and errors. Repeat
+the run on the deployment host before sizing workers:
+
+    server                                        req/s   measurement p50/p95 ms   errors
+    python src/main.py (debug server)              86.5   7277 / 10001             3.89%
+    python src/serve.py -w 1                      107.8   3523 /  5000             0.16%
+    python src/serve.py (defaults: 3 x 16 thr.)    99.7   1626 /  8475             2.20%
+    python src/serve.py -w 8                       85.8   4465 /  9520             9.27%
+    defaults + 48 held ?wait=60 status polls       89.9   2520 /  9672             0.23%
+
+The multi-worker errors are SQLite write-lock timeouts and 10 s client
+timeouts; several write-heavy workers want a server database
+(PostgreSQL/MySQL). In the last row 48 devices keep a long poll open
+throughout, more than the workers' stream budgets; the polls over budget
+are answered at once and ingest keeps its reserved threads.
+
+Reproduce against a fresh database with the server under test on port 5000:
+    python src/load_test.py --devices 400 --measurement-interval 1 --duration 20 --ramp-up 2
+"""
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+# Add the parent directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+logger = logging.getLogger(__name__)
+
+
+def preload_state(app):
+    """Load shared read-mostly state in the master so workers inherit it"""
+    from src.analysis.anomaly_detection import anomaly_detector
+    from src.analysis.calibration_resolver import calibration_resolver
+    from src.analysis.spectral_index import spectral_index
+
+    with app.app_context():
+        try:
+            calibration_resolver.rebuild()
+        except Exception:
+            # Calibration table unavailable: workers fall back to the built-in defaults
+            calibration_resolver.rebuild(entries=[])
+    anomaly_detector._ensure_loaded()
+    spectral_index._ensure_loaded()
+
+    # Connections opened during startup must not be shared across the fork
+    from src.main import MODEL_DATABASES
+    from src.models.read_routing import replica_router
+    with app.app_context():
+        for model_db in MODEL_DATABASES:
+            model_db.engine.dispose()
+    if replica_router.engine is not None:
+        replica_router.engine.dispose()
+
+
+def flush_state():
+    """Write in-memory state to disk (worker shutdown and recycling)"""
+    from src.analysis.anomaly_detection import anomaly_detector
+    from src.analysis.spectral_index import spectral_index
+
+    for name, component in (('anomaly baselines', anomaly_detector), ('spectral index', spectral_index)):
+        if not component._dirty:
+            continue
+        try:
+            component.checkpoint()
+        except Exception:
+            logger.exception('Failed to checkpoint %s', name)
+
+
+def load_app(config=None):
+    from src.main import create_app
+    os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
+    app = create_app(config)
+    preload_state(app)
+    # Keep the preloaded objects out of GC passes so their pages stay shared after fork
+    gc.freeze()
+    return app
+
+
+def post_fork(server, worker):
+    from src.monitoring.worker_bus import worker_bus
+    worker_bus.start(server.cfg.worker_bus_dir)
+
+
+def worker_exit(server, worker):
+    from src.monitoring.worker_bus import worker_bus
+    worker_bus.stop()
+    flush_state()
+
+
+def on_exit(server):
+    shutil.rmtree(server.cfg.worker_bus_dir, ignore_errors=True)
+
+
+if BaseApplication is not None:
+    class ProductionServer(BaseApplication):
+        """gunicorn application configured from a dict instead of a config file"""
+
+        def __init__(self, options, app_config=None, worker_bus_dir=None):
+            self.options = options
+            self.app_config = app_config
+            self.worker_bus_dir = worker_bus_dir
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            # Read by the post_fork/on_exit hooks
+            self.cfg.worker_bus_dir = self.worker_bus_dir
+
+        def load(self):
+            return load_app(self.app_config)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def parse_args(argv=None):
+    default_bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+    parser = argparse.ArgumentParser(description='Run the activation server under gunicorn.')
+    parser.add_argument('--bind', default=default_bind)
+    parser.add_argument('-w', '--workers', type=int,
+                        default=_env_int('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+    parser.add_argument('--threads', type=int, default=_env_int('THREADS', 16),
+                        help='Threads per worker (long polls and live streams each hold one)')
+    parser.add_argument('--max-requests', type=int, default=_env_int('MAX_REQUESTS', 10000),
+                        help='Recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=_env_int('MAX_REQUESTS_JITTER', 1000))
+    parser.add_argument('--graceful-timeout', type=int, default=_env_int('GRACEFUL_TIMEOUT', 30),
+                        help='Seconds a stopping worker gets to finish in-flight requests')
+    parser.add_argument('--timeout', type=int, default=_env_int('TIMEOUT', 120),
+                        help='Seconds before a silent worker is killed and replaced')
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL', 'info'))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if BaseApplication is None:
+        sys.exit('gunicorn is not installed (pip install gunicorn)')
+
+    from src.monitoring.stream_budget import budget_for_threads
+    app_config = {'STREAM_THREAD_BUDGET': budget_for_threads(args.threads)}
+
+    ProductionServer({
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'preload_app': True,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'graceful_timeout': args.graceful_timeout,
+        'timeout': args.timeout,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'on_exit': on_exit,
+        'accesslog': None,
+        'loglevel': args.log_level,
+    }, app_config, tempfile.mkdtemp(prefix='coffee-worker-bus-')).run()
+
+
+if __name__ == '__main__':
+    main()
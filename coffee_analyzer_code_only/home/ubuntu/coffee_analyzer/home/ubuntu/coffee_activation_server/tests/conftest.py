@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+# Add the server directory to the sys.path to allow importing from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import create_app
+from src.models.device import Device, db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from src.models.measurement_archive import measurement_archive
+    from src.analysis.spectral_index import spectral_index
+    from src.analysis.anomaly_detection import anomaly_detector
+    from src.analysis.calibration_resolver import calibration_resolver
+    monkeypatch.setattr(measurement_archive, 'root', str(tmp_path / 'archive'))
+    # The index is process-wide: start each test from an empty one of its own
+    monkeypatch.setattr(spectral_index, 'directory', str(tmp_path / 'spectral_index'))
+    spectral_index._reset()
+    spectral_index._loaded = False
+    monkeypatch.setattr(anomaly_detector, 'checkpoint_path', str(tmp_path / 'anomaly_state.json'))
+    monkeypatch.setattr(anomaly_detector, 'states', {})
+    # Rebuilt from this test's database on first use
+    calibration_resolver.invalidate()
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        # Tests post faster than a device's token bucket refills
+        'RATE_LIMIT_ENABLED': False,
+    })
+    yield app
+    from src.main import MODEL_DATABASES
+    with app.app_context():
+        for model_db in MODEL_DATABASES:
+            model_db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def device(app):
+    """A registered device: (device_id, device_serial)"""
+    with app.app_context():
+        db.session.add(Device(device_id='dev-1', device_serial='SN-0001', activation_key='key-1'))
+        db.session.commit()
+    return 'dev-1', 'SN-0001'
@@ -0,0 +1,78 @@
+import json
+import threading
+
+import numpy as np
+
+from src.analysis.anomaly_detection import FEATURES, DeviceAnomalyDetector
+
+
+def test_concurrent_ingest_checkpoints_cleanly(tmp_path):
+    path = tmp_path / 'baselines.json'
+    detector = DeviceAnomalyDetector(checkpoint_path=str(path), checkpoint_interval=0.0)
+    errors = []
+
+    def ingest(worker):
+        rng = np.random.default_rng(worker)
+        try:
+            for i in range(100):
+                detector.score_and_update(f'SN-{worker}-{i % 25}', rng.normal(size=len(FEATURES)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest, args=(worker,)) for worker in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    detector.checkpoint()
+
+    assert errors == []
+    assert len(json.loads(path.read_text())['devices']) == 150
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / 'baselines.json'
+    detector = DeviceAnomalyDetector(checkpoint_path=str(path))
+    for value in np.linspace(1.0, 2.0, 30):
+        detector.score_and_update('SN-0001', np.full(len(FEATURES), value))
+    detector.checkpoint()
+
+    restored = DeviceAnomalyDetector(checkpoint_path=str(path))
+    assert restored.baseline('SN-0001') == detector.baseline('SN-0001')
+
+
+def post_reading(client, protein, minute=0, headers=None):
+    response = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_protein': protein,
+        'timestamp': f'2026-01-01T10:{minute:02d}:00'
+    }, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def test_outlier_is_flagged_against_the_device_baseline(client, device):
+    from src.analysis.anomaly_detection import anomaly_detector
+
+    for i in range(25):
+        assert not post_reading(client, 12.0 + 0.1 * (i % 5), minute=i)['is_anomaly']
+    body = post_reading(client, 30.0, minute=30)
+
+    assert body['is_anomaly']
+    assert [flag['feature'] for flag in body['anomaly_flags']] == ['estimated_protein']
+    assert anomaly_detector.baseline('SN-0001')['estimated_protein']['count'] == 26
+
+
+def test_duplicate_retry_leaves_the_baseline_unchanged(client, device, monkeypatch):
+    from src.analysis.anomaly_detection import anomaly_detector
+    from src.routes import measurements
+
+    post_reading(client, 12.0, headers={'Idempotency-Key': 'm-1'})
+    before = anomaly_detector.baseline('SN-0001')
+
+    # A concurrent retry that passed the lookup and lost the insert race
+    monkeypatch.setattr(measurements, 'existing_id', lambda *args: None)
+    retry = post_reading(client, 12.0, headers={'Idempotency-Key': 'm-1'})
+
+    assert retry['duplicate'] is True
+    assert anomaly_detector.baseline('SN-0001') == before
@@ -0,0 +1,54 @@
+import json
+
+from src import benchmarks
+
+
+def report(**seconds):
+    return {'results': {name: {'size': 1, 'seconds': value} for name, value in seconds.items()}}
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_only_slowdowns_beyond_the_threshold_regress():
+    rows = benchmarks.compare_results(
+        report(fast=1.0, steady=1.0, slow=1.0, gone=1.0, zero=0.0),
+        report(fast=0.5, steady=1.09, slow=1.2, zero=1.0),
+        threshold=10
+    )
+    assert {name: (round(change, 1), regressed) for name, _, _, change, regressed in rows} == {
+        'fast': (-50.0, False), 'steady': (9.0, False), 'slow': (20.0, True)
+    }
+
+
+def test_compare_exit_code(tmp_path, capsys):
+    baseline = write(tmp_path / 'baseline.json', report(a=1.0, b=2.0))
+    current = write(tmp_path / 'current.json', report(a=1.05, b=2.5))
+
+    assert benchmarks.main(['compare', baseline, current, '--threshold', '30']) == 0
+    assert benchmarks.main(['compare', baseline, current]) == 1
+    assert '1 regression(s) beyond 10.0% threshold' in capsys.readouterr().out
+
+    partial = write(tmp_path / 'partial.json', report(a=1.0))
+    assert benchmarks.main(['compare', baseline, partial]) == 0
+    assert f"{'b':<45} missing from current run" in capsys.readouterr().out
+
+
+def test_run_saves_a_baseline_that_compares_cleanly(tmp_path):
+    output = tmp_path / 'bench' / 'baseline.json'
+    assert benchmarks.main([
+        'run', '--output', str(output), '--max-samples', '100', '--max-profiles', '10',
+        '--repeat', '1', '--min-time', '0.001', '--filter', 'samples=100]'
+    ]) == 0
+
+    saved = json.loads(output.read_text())
+    assert set(saved['results']) == {
+        'estimators[samples=100]', 'profile_signature[samples=100]',
+        'measurement_to_dict[samples=100]', 'stats_aggregation[samples=100]'
+    }
+    for result in saved['results'].values():
+        assert result['size'] == 100 and result['seconds'] > 0 and result['loops'] >= 1
+    rows = benchmarks.compare_results(saved, saved, threshold=0)
+    assert len(rows) == 4 and not any(regressed for *_, regressed in rows)
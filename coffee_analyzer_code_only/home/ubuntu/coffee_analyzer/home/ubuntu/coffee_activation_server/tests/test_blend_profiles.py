@@ -0,0 +1,54 @@
+import pytest
+
+from src.models.device import Device, db
+
+
+@pytest.fixture
+def profile(app, client, device):
+    with app.app_context():
+        Device.query.filter_by(device_id='dev-1').update({'activation_level': 'blend_profiles'})
+        db.session.commit()
+    response = client.post('/api/blend/devices/dev-1/profiles', json={
+        'profile_name': 'house', 'samples': [
+            {'sensor_reading_1': 10, 'sensor_reading_2': 20, 'sensor_reading_3': 30},
+            {'sensor_reading_1': 12, 'sensor_reading_2': 22, 'sensor_reading_3': 32},
+        ]
+    })
+    assert response.status_code in (200, 201), response.json
+
+
+def match_batch(client, body):
+    return client.post('/api/blend/devices/dev-1/match/batch', json=body)
+
+
+def test_batch_matches_samples_and_stored_measurements(client, profile):
+    stored = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': [11, 21, 31, 0, 0, 0, 0, 0, 0, 0, 0]
+    }).json['measurement_id']
+
+    response = match_batch(client, {
+        'samples': [{'sensor_reading_1': 11, 'sensor_reading_2': 21, 'sensor_reading_3': 31}, {}],
+        'measurement_ids': [stored, stored + 100]
+    })
+    assert response.status_code == 200, response.json
+    body = response.json
+    assert [row.get('measurement_id') for row in body['results']] == [None, stored]
+    assert all(row['best_match']['profile_name'] == 'house' for row in body['results'])
+    assert body['invalid_samples'] == [1]
+    assert body['missing_measurement_ids'] == [stored + 100]
+
+
+@pytest.mark.parametrize('body', [
+    {'measurement_ids': ['1']},
+    {'measurement_ids': [1.5]},
+    {'measurement_ids': [True]},
+    {'measurement_ids': [[1]]},
+    {'measurement_ids': '1,2'},
+    {'measurement_ids': {'id': 1}},
+    {'samples': ['sample']},
+    {'samples': {'sensor_reading_1': 1}},
+])
+def test_malformed_batch_is_rejected(client, profile, body):
+    response = match_batch(client, body)
+    assert response.status_code == 400, response.json
+    assert response.json['success'] is False
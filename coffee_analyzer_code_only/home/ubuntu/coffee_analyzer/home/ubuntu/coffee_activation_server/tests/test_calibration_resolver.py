@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+from src.analysis.calibration_resolver import COEFFICIENT_FIELDS, CalibrationResolver
+
+
+def offline_resolver(refresh_seconds, rows=None):
+    """Resolver whose database rebuilds fail until ``rows`` is filled; returns (resolver, attempt counter)"""
+    resolver = CalibrationResolver(refresh_seconds=refresh_seconds)
+    build = resolver._build
+    attempts = []
+
+    def failing_build(entries=None, fresh=True):
+        if entries is None:
+            attempts.append(1)
+            if not rows:
+                raise RuntimeError('database unavailable')
+            entries = rows
+        return build(entries, fresh)
+
+    resolver._build = failing_build
+    return resolver, attempts
+
+
+def test_failed_rebuild_is_not_retried_on_every_lookup():
+    resolver, attempts = offline_resolver(refresh_seconds=60)
+    resolver.rebuild(entries=[])
+    resolver._built_at = time.monotonic() - 120
+    for _ in range(100):
+        resolver.resolve(1, 3)
+    assert len(attempts) == 1
+
+
+def test_defaults_fallback_is_retried_on_next_lookup():
+    rows = []
+    resolver, attempts = offline_resolver(refresh_seconds=60, rows=rows)
+    assert resolver.resolve(1, 3) == resolver.resolve(1, 3)
+    assert len(attempts) == 2
+
+    rows.append(SimpleNamespace(id=7, coffee_type=1, coffee_origin=3, coffee_variety=None,
+                                **{field: None for field in COEFFICIENT_FIELDS}))
+    rows[0].protein_coeff = 0.5
+    values, sources = resolver.resolve_with_sources(1, 3)
+    assert (values['protein_coeff'], sources) == (0.5, [7])
+    resolver.resolve(1, 3)
+    assert len(attempts) == 3
+
+
+def test_failed_rebuild_rolls_back_the_session(app, monkeypatch):
+    from src.models.calibration_data import CalibrationData, db
+
+    resolver = CalibrationResolver()
+    with app.app_context():
+        monkeypatch.setattr(CalibrationData, 'query', property(lambda self: 1 / 0), raising=False)
+        rollbacks = []
+        monkeypatch.setattr(db.session, 'rollback', lambda: rollbacks.append(1))
+        resolver.resolve(1, 3)
+    assert rollbacks == [1]
+
+
+def test_stale_table_survives_failed_refresh():
+    resolver, attempts = offline_resolver(refresh_seconds=0.05)
+    resolver.rebuild(entries=[])
+    before = resolver.resolve(1, 3)
+    time.sleep(0.06)
+    assert resolver.resolve(1, 3) == before
+    assert resolver.resolve(1, 3) == before
+    assert len(attempts) == 1
+
+
+def test_lookup_after_invalidate():
+    resolver = CalibrationResolver()
+    resolver.rebuild(entries=[])
+    resolver._build = lambda entries=None: CalibrationResolver._build(resolver, [])
+    values = resolver.resolve(0)
+    resolver.invalidate()
+    assert resolver.resolve(0) == values
@@ -0,0 +1,27 @@
+import gzip
+import json
+
+import pytest
+
+MEASUREMENT = {'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_co2': 610.0}
+
+
+def post_encoded(client, body, encoding):
+    return client.post('/api/measurements', data=body,
+                       headers={'Content-Type': 'application/json', 'Content-Encoding': encoding})
+
+
+def test_gzip_request_is_decompressed(client, device):
+    response = post_encoded(client, gzip.compress(json.dumps(MEASUREMENT).encode()), 'gzip')
+    assert response.status_code == 200, response.json
+
+
+def test_gzip_bomb_is_rejected(client, device):
+    bomb = gzip.compress(b' ' * (64 * 1024 * 1024))
+    assert post_encoded(client, bomb, 'gzip').status_code == 413
+
+
+@pytest.mark.parametrize('encoding', ['br', 'deflate'])
+def test_other_request_encodings_are_refused(client, device, encoding):
+    # Refused before the body is read, whatever it contains
+    assert post_encoded(client, b'\x8b\x07\x80' * 100, encoding).status_code == 415
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.models.daily_aggregate import MeasurementDailyAgg, db, rebuild_daily_aggregates, refresh_day, window_stats
+from src.models.measurement import Measurement
+from src.models.measurement_archive import archive_measurements
+
+PROTEIN = [10.0, 12.5, None, 11.0, 14.0, 9.5, 13.0]
+
+
+def post_week(client, days_ago=6):
+    """One measurement per day ending today (noon UTC), alternating coffee type"""
+    start = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+    ids = []
+    for i, protein in enumerate(PROTEIN):
+        response = client.post('/api/measurements', json={
+            'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'coffee_type': i % 2,
+            'estimated_protein': protein, 'estimated_moisture': 10.0 + i,
+            'timestamp': (start + timedelta(days=i)).isoformat()
+        })
+        assert response.status_code == 200, response.json
+        ids.append(response.json['measurement_id'])
+    return ids
+
+
+def raw_stats(app, coffee_type=None):
+    """The same statistics computed directly from the stored rows"""
+    with app.app_context():
+        query = db.session.query(Measurement.estimated_protein).filter(Measurement.device_serial == 'SN-0001')
+        if coffee_type is not None:
+            query = query.filter(Measurement.coffee_type == coffee_type)
+        values = np.array([value for (value,) in query if value is not None])
+    return {'count': len(values), 'average': round(values.mean(), 2), 'std': round(values.std(), 4),
+            'min': values.min(), 'max': values.max()}
+
+
+def daily_stats(client, **params):
+    response = client.get('/api/measurements/SN-0001/daily-stats', query_string={'days': 7, **params})
+    assert response.status_code == 200, response.json
+    return response.json['stats']
+
+
+def test_daily_stats_match_raw_rows(app, client, device):
+    post_week(client)
+
+    stats = daily_stats(client)
+    assert stats['total_measurements'] == len(PROTEIN)
+    assert stats['statistics']['protein'] == raw_stats(app)
+    assert list(stats['daily_measurement_counts'].values()) == [1] * len(PROTEIN)
+    assert stats['coffee_type_distribution'] == {'0': 4, '1': 3}
+    assert daily_stats(client, coffee_type=1)['statistics']['protein'] == raw_stats(app, coffee_type=1)
+
+
+def test_edit_refreshes_the_day(app, client, device):
+    ids = post_week(client)
+    daily_stats(client)
+
+    response = client.put(f'/api/measurements/{ids[0]}', json={'estimated_protein': 30.0})
+    assert response.status_code == 200, response.json
+    assert daily_stats(client)['statistics']['protein'] == raw_stats(app)
+
+
+def test_refresh_and_rebuild_reproduce_recorded_rows(app, client, device):
+    post_week(client)
+
+    def snapshot():
+        columns = [column for column in MeasurementDailyAgg.__table__.columns if column.name != 'id']
+        return sorted(tuple(row) for row in db.session.query(*columns))
+
+    with app.app_context():
+        recorded = snapshot()
+        day = datetime.utcnow().date() - timedelta(days=2)
+        refresh_day(db.session, 'SN-0001', day)
+        db.session.commit()
+        assert snapshot() == recorded
+
+        rebuild_daily_aggregates(db.session)
+        assert snapshot() == recorded
+
+
+def test_window_stats_include_archived_days(app, client, device):
+    post_week(client, days_ago=400)
+    with app.app_context():
+        end_day = datetime.utcnow().date() - timedelta(days=394)
+        before = window_stats(db.session, 'SN-0001', end_day - timedelta(days=6), end_day)
+        expected = raw_stats(app)
+
+        archive_measurements(older_than_days=365)
+        assert db.session.query(Measurement).count() == 0
+        rebuild_daily_aggregates(db.session)
+        after = window_stats(db.session, 'SN-0001', end_day - timedelta(days=6), end_day)
+
+    assert before['statistics']['protein'] == expected
+    assert after == before
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from src.monitoring.stream_budget import stream_budget
+
+
+def status(client, etag=None, wait=None):
+    headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+    query = f'?wait={wait}' if wait is not None else ''
+    return client.get(f'/api/activation/devices/SN-0001/status{query}', headers=headers)
+
+
+def test_long_poll_over_the_stream_budget_is_answered_at_once(client, device, monkeypatch):
+    monkeypatch.setattr(stream_budget, 'limit', 0)
+    etag = status(client).get_etag()[0]
+
+    started = time.monotonic()
+    response = status(client, etag, wait=30)
+    assert response.status_code == 304
+    assert time.monotonic() - started < 2
+    assert stream_budget.active == 0
+
+
+def test_unchanged_status_is_not_modified(client, device):
+    first = status(client)
+    assert first.status_code == 200
+    etag = first.get_etag()[0]
+
+    response = status(client, etag)
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+    assert status(client, 'stale').status_code == 200
+
+
+def test_periodic_report_keeps_the_status_etag(client, device):
+    etag = status(client).get_etag()[0]
+    response = client.post('/api/activation/devices/dev-1/report', json={'measurement_count': 3, 'uptime_hours': 1})
+    assert response.status_code in (200, 201), response.json
+
+    assert status(client, etag).status_code == 304
+
+
+def test_activation_changes_the_etag(client, device):
+    etag = status(client).get_etag()[0]
+    client.post('/api/activation/devices/SN-0001/activate', json={'activation_level': 'professional'})
+
+    response = status(client, etag)
+    assert response.status_code == 200
+    assert response.json['activation_level'] == 'professional'
+    assert response.get_etag()[0] != etag
+
+
+def test_long_poll_is_woken_by_activation(app, client, device):
+    etag = status(client).get_etag()[0]
+    result = {}
+
+    def poll():
+        started = time.monotonic()
+        result['response'] = status(app.test_client(), etag, wait=20)
+        result['elapsed'] = time.monotonic() - started
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    time.sleep(0.3)
+    client.post('/api/activation/devices/SN-0001/activate', json={'activation_level': 'advanced'})
+    poller.join(10)
+
+    assert result['response'].status_code == 200
+    assert result['response'].json['activation_level'] == 'advanced'
+    assert 0.3 <= result['elapsed'] < 3
+    assert stream_budget.active == 0
+
+
+def test_long_poll_times_out_with_304(client, device):
+    etag = status(client).get_etag()[0]
+    started = time.monotonic()
+    assert status(client, etag, wait=1).status_code == 304
+    assert time.monotonic() - started >= 1
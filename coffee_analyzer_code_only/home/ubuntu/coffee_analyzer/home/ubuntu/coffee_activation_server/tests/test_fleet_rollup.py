@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from src.models.device import Device
+from src.models.fleet_rollup import FleetWeeklyRollup, db, rebuild_rollup, refresh_group, week_start_for
+from src.models.measurement_archive import archive_measurements, measurement_archive
+
+
+def fleet_protein(client):
+    response = client.get('/api/fleet/analytics?weeks=1&component=protein&percentiles=50,100')
+    assert response.status_code == 200, response.json
+    return response.json, response.json['groups'][0]['components']['protein']
+
+
+def test_estimate_edit_recomputes_weekly_rollup(client, device):
+    ids = []
+    for protein in (10.0, 20.0):
+        response = client.post('/api/measurements', json={
+            'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4},
+            'estimated_protein': protein, 'timestamp': datetime.utcnow().isoformat()
+        })
+        assert response.status_code in (200, 201), response.json
+        ids.append(response.json['measurement_id'])
+
+    _, protein = fleet_protein(client)
+    assert (protein['count'], protein['min'], protein['max']) == (2, 10.0, 20.0)
+    assert fleet_protein(client)[0]['cached']
+
+    response = client.put(f'/api/measurements/{ids[0]}', json={'estimated_protein': 40.0})
+    assert response.status_code == 200, response.json
+
+    body, protein = fleet_protein(client)
+    assert not body['cached']
+    assert (protein['count'], protein['min'], protein['max'], protein['average']) == (2, 20.0, 40.0, 30.0)
+    assert protein['percentiles']['p100'] == 40.0
+
+
+def test_non_estimate_edit_keeps_rollup(client, device):
+    response = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4},
+        'estimated_protein': 12.0, 'timestamp': datetime.utcnow().isoformat()
+    })
+    measurement_id = response.json['measurement_id']
+    fleet_protein(client)
+
+    client.put(f'/api/measurements/{measurement_id}', json={'notes': 'ok'})
+    body, protein = fleet_protein(client)
+    assert body['cached'] and protein['count'] == 1
+
+
+def post_old_measurements(client, serial, count):
+    start = datetime.utcnow() - timedelta(days=400)
+    for i in range(count):
+        response = client.post('/api/measurements', json={
+            'device_serial': serial, 'nir_readings': {'channel0': 0.4}, 'coffee_origin': i % 2,
+            'estimated_protein': 10.0 + i, 'timestamp': (start + timedelta(days=7 * i)).isoformat()
+        })
+        assert response.status_code in (200, 201), response.json
+
+
+def rollup_rows(app):
+    with app.app_context():
+        return sorted(
+            (row.coffee_origin, row.coffee_type, row.week_start, row.component, row.count, row.total)
+            for row in FleetWeeklyRollup.query
+        )
+
+
+def test_rebuild_keeps_archived_weeks(app, client, device):
+    post_old_measurements(client, 'SN-0001', 40)
+    before = rollup_rows(app)
+
+    with app.app_context():
+        summary = archive_measurements(older_than_days=180)
+        assert summary['archived'] > 0
+        assert rebuild_rollup(db.session) == 40
+
+    assert rollup_rows(app) == before
+
+
+def test_group_refresh_reads_only_devices_in_the_group(app, client, device, monkeypatch):
+    with app.app_context():
+        db.session.add(Device(device_id='dev-2', device_serial='SN-0002', activation_key='key-2'))
+        db.session.add(Device(device_id='dev-3', device_serial='SN-0003', activation_key='key-3'))
+        db.session.commit()
+    post_old_measurements(client, 'SN-0001', 4)
+    post_old_measurements(client, 'SN-0002', 4)
+    with app.app_context():
+        archive_measurements(older_than_days=180)
+
+    opened = []
+    read = measurement_archive.read
+    monkeypatch.setattr(measurement_archive, 'read',
+                        lambda serial, *args, **kwargs: opened.append(serial) or read(serial, *args, **kwargs))
+
+    before = rollup_rows(app)
+    week = week_start_for(datetime.utcnow() - timedelta(days=400))
+    with app.app_context():
+        refresh_group(db.session, 0, None, week)
+        db.session.commit()
+
+    assert sorted(opened) == ['SN-0001', 'SN-0002']
+    assert rollup_rows(app) == before
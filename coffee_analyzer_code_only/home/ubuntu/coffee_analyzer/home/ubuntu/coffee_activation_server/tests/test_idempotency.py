@@ -0,0 +1,52 @@
+from src.models.device_report import DeviceReport, db
+
+REPORT = {
+    'device_serial': 'SN-0001',
+    'measurement_count': 12,
+    'error_count': 0,
+    'uptime_hours': 3.25,
+    'wifi_signal': -61,
+    'free_heap': 182000,
+    'current_mode': 1,
+}
+
+
+def report_count(app):
+    with app.app_context():
+        return db.session.query(DeviceReport).count()
+
+
+def test_retried_report_is_stored_once(app, client, device):
+    # Same URL the firmware posts to: /api/activation/devices/<serial>/report
+    first = client.post('/api/activation/devices/SN-0001/report', json=REPORT)
+    retry = client.post('/api/activation/devices/SN-0001/report', json=REPORT)
+
+    assert first.status_code == 200 and retry.status_code == 200
+    assert retry.json['duplicate'] is True
+    assert retry.json['report_id'] == first.json['report_id']
+    assert report_count(app) == 1
+
+
+def test_report_by_device_id_shares_the_key(app, client, device):
+    client.post('/api/activation/devices/SN-0001/report', json=REPORT)
+    retry = client.post('/api/activation/devices/dev-1/report', json=REPORT)
+
+    assert retry.json['duplicate'] is True
+    assert report_count(app) == 1
+
+
+def test_idempotency_header_distinguishes_reports(app, client, device):
+    client.post('/api/activation/devices/SN-0001/report', json=REPORT, headers={'Idempotency-Key': 'r-1'})
+    client.post('/api/activation/devices/SN-0001/report', json=REPORT, headers={'Idempotency-Key': 'r-2'})
+    client.post('/api/activation/devices/SN-0001/report', json=REPORT, headers={'Idempotency-Key': 'r-1'})
+
+    assert report_count(app) == 2
+
+
+def test_knowledge_route_is_registered(client, device):
+    entry = {'device_id': 'SN-0001', 'title': 'Ethiopia light roast', 'content': 'NIR peaks at 1450nm'}
+    first = client.post('/api/knowledge', json=entry)
+    retry = client.post('/api/knowledge', json=entry)
+
+    assert first.status_code == 200, first.json
+    assert retry.json.get('duplicate') is True
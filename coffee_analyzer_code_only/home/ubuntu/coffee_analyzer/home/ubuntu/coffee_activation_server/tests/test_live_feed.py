@@ -0,0 +1,70 @@
+from src.monitoring.stream_budget import stream_budget
+from src.routes.live_feed import LiveFeedBroker, _event_stream, broker
+
+
+def drain(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(subscriber.queue.get_nowait())
+    return messages
+
+
+def test_events_fan_out_to_device_and_fleet_subscribers():
+    feed = LiveFeedBroker()
+    device = feed.subscribe('SN-0001')
+    other = feed.subscribe('SN-0002')
+    fleet = feed.subscribe()
+    reports_only = feed.subscribe(event_types=('report',))
+
+    assert feed.publish('measurement', 'SN-0001', {'id': 7}) == 2
+
+    assert drain(device) == drain(fleet) == ['id: 1\nevent: measurement\ndata: {"id": 7}\n\n']
+    assert drain(other) == drain(reports_only) == []
+
+
+def test_slow_consumer_is_dropped_without_blocking_publish():
+    feed = LiveFeedBroker(queue_size=2)
+    slow = feed.subscribe('SN-0001')
+    fast = feed.subscribe('SN-0001')
+
+    for i in range(3):
+        drain(fast)
+        feed.publish('measurement', 'SN-0001', {'id': i})
+
+    assert slow.dropped and not fast.dropped
+    assert feed.dropped_total == 1
+    assert feed.subscriber_count() == 1
+
+    # The dropped client still gets what was queued, then a final notice
+    stream = list(_event_stream(slow))
+    assert stream[0].startswith('retry:')
+    assert len(stream) == 4 and 'slow_consumer' in stream[-1]
+
+
+def test_stream_delivers_ingested_measurement(client, device):
+    response = client.get('/api/live/feed?device_serial=SN-0001', buffered=False)
+    assert response.status_code == 200
+    assert broker.subscriber_count() == 1 and stream_budget.active == 1
+
+    client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_protein': 11.0
+    })
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    event = next(chunks).decode('utf-8')
+    assert 'event: measurement' in event and '"estimated_protein": 11.0' in event
+
+    response.close()
+    assert broker.subscriber_count() == 0 and stream_budget.active == 0
+
+
+def test_stream_over_the_budget_gets_503(client, monkeypatch):
+    monkeypatch.setattr(stream_budget, 'limit', 0)
+    response = client.get('/api/live/feed')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    assert broker.subscriber_count() == 0
+
+
+def test_unknown_event_type_is_rejected(client):
+    assert client.get('/api/live/feed?events=measurement,bogus').status_code == 400
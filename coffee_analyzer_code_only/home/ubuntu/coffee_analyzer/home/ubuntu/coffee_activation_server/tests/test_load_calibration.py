@@ -0,0 +1,57 @@
+import pytest
+
+from src.analysis.calibration_resolver import calibration_resolver
+from src.analysis.reference_ranges import DEFAULT_CHEMICAL_DATA_PATH, load_reference_ranges
+from src.load_calibration_data import DEFAULT_DEFINITIONS_PATH, load_calibration, read_calibration_definitions
+from src.models.calibration_data import CalibrationData
+from src.models.chemical_reference import ChemicalReferenceRange
+from src.models.user import db
+
+CSV_HEADER = 'coffee_type,coffee_origin,coffee_variety,protein_coeff,protein_offset\n'
+
+
+def write_definitions(tmp_path, *lines):
+    path = tmp_path / 'definitions.csv'
+    path.write_text(CSV_HEADER + ''.join(line + '\n' for line in lines))
+    return read_calibration_definitions(str(path))
+
+
+def test_bundled_data_loads_once_and_reloads_as_no_op(app):
+    definitions = read_calibration_definitions(DEFAULT_DEFINITIONS_PATH)
+    ranges, _ = load_reference_ranges(DEFAULT_CHEMICAL_DATA_PATH)
+    with app.app_context():
+        first = load_calibration(db.session, definitions, ranges)
+        assert len(first['calibration']['inserted']) == len(definitions) == CalibrationData.query.count()
+        assert len(first['reference_ranges']['inserted']) == len(ranges) == ChemicalReferenceRange.query.count()
+
+        second = load_calibration(db.session, definitions, ranges)
+        for section in ('calibration', 'reference_ranges'):
+            assert second[section]['inserted'] == second[section]['updated'] == []
+        assert second['calibration']['unchanged'] == len(definitions)
+        assert CalibrationData.query.count() == len(definitions)
+
+
+def test_changes_are_reported_and_applied(app, tmp_path):
+    with app.app_context():
+        load_calibration(db.session, write_definitions(tmp_path, 'ROASTED,BRAZIL,Arabica,0.05,1.0', '1,2,,0.04,0'), [])
+        assert calibration_resolver.resolve(1, 1, 'Arabica')['protein_coeff'] == 0.05
+
+        definitions = write_definitions(tmp_path, 'ROASTED,origin_brazil,Arabica,0.07,1.0', '1,2,,0.04,0')
+        dry_run = load_calibration(db.session, definitions, [], dry_run=True)
+        assert dry_run['calibration']['updated'] == [{
+            'coffee_type': 1, 'coffee_origin': 1, 'coffee_variety': 'Arabica',
+            'changes': {'protein_coeff': {'old': 0.05, 'new': 0.07}}
+        }]
+        assert calibration_resolver.resolve(1, 1, 'Arabica')['protein_coeff'] == 0.05
+
+        report = load_calibration(db.session, definitions, [])
+        assert report['calibration']['unchanged'] == 1
+        # The resolver is invalidated by the write
+        assert calibration_resolver.resolve(1, 1, 'Arabica')['protein_coeff'] == 0.07
+        # A missing variety is stored as 'Unknown' so the unique key still applies
+        assert CalibrationData.query.filter_by(coffee_origin=2).one().coffee_variety == 'Unknown'
+
+
+def test_unknown_codes_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match='coffee_origin'):
+        write_definitions(tmp_path, 'ROASTED,ATLANTIS,Arabica,0.05,0')
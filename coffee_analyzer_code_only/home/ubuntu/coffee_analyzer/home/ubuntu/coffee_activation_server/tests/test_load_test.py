@@ -0,0 +1,97 @@
+import asyncio
+import json
+import random
+import socket
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from src import load_test
+from src.models.device import Device
+from src.models.measurement import Measurement
+
+
+@pytest.fixture
+def base_url(app):
+    server = make_server('127.0.0.1', 0, app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    thread.join()
+
+
+def fleet_argv(base_url):
+    return ['--base-url', base_url, '--devices', '3', '--duration', '1.0', '--ramp-up', '0',
+            '--measurement-interval', '0.1', '--report-interval', '0.4']
+
+
+def test_percentile_and_endpoint_summary():
+    ordered = [i / 1000 for i in range(1, 101)]
+    assert load_test.percentile(ordered, 50) == 0.05
+    assert load_test.percentile(ordered, 99) == 0.099
+    assert load_test.percentile([], 95) == 0.0
+
+    stats = load_test.EndpointStats()
+    for latency, status in ((0.01, 200), (0.02, 201), (0.03, 500), (0.04, None)):
+        stats.record(latency, status)
+    summary = stats.summary(elapsed=2.0)
+    assert summary['requests'] == 4 and summary['throughput_rps'] == 2.0
+    assert summary['error_rate'] == 50.0
+    assert summary['status_counts'] == {'200': 1, '201': 1, '500': 1, 'exception': 1}
+    assert summary['max_ms'] == 40.0
+
+
+def test_fleet_follows_the_firmware_sequence(app, base_url, tmp_path):
+    output = tmp_path / 'results.json'
+    results = load_test.main([*fleet_argv(base_url), '--json', str(output)])
+
+    assert results['error_rate'] == 0.0
+    endpoints = results['endpoints']
+    assert endpoints['POST /api/activation/devices']['requests'] == 3
+    assert endpoints['GET /api/activation/devices/<serial>/status']['requests'] == 3
+    measurements = endpoints['POST /api/measurements']['requests']
+    assert measurements > 0
+    # Every measurement fetches its calibration first
+    assert endpoints['GET /api/calibration_data']['requests'] == measurements
+    assert endpoints['POST /api/activation/devices/<serial>/report']['requests'] >= 3
+    assert results['total_requests'] == sum(s['requests'] for s in endpoints.values())
+    assert json.loads(output.read_text()) == results
+
+    with app.app_context():
+        assert Device.query.filter(Device.device_serial.like('R3S-%')).count() == 3
+        assert Measurement.query.count() == measurements
+
+
+def test_offline_reports_are_queued_and_replayed(app, base_url):
+    async def scenario():
+        client = load_test.LoadTestClient(base_url)
+        device = load_test.SimulatedDevice(1, client, load_test.parse_args(fleet_argv(base_url)), random.Random(1))
+        await device.register()
+        device.online = False
+        await device.send_report()
+        await device.take_measurement()
+        assert [data_type for data_type, _ in device.pending] == ['report']
+        assert 'POST /api/measurements' not in client.stats
+
+        device.online = True
+        await device.sync_pending()
+        return device, client
+
+    device, client = asyncio.run(scenario())
+    assert device.pending == []
+    assert device.measurement_count == 1
+    assert client.stats['SYNC report'].status_counts == {'200': 1}
+
+
+def test_unreachable_server_is_counted_as_errors():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    client = load_test.LoadTestClient(f'http://127.0.0.1:{port}', timeout=1.0)
+    status, _ = asyncio.run(client.request('GET', '/api/health', label='health'))
+    assert status is None
+    assert client.stats['health'].errors == 1
+    assert client.stats['health'].status_counts == {'exception': 1}
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from src.models import measurement_archive as archive_module
+from src.models.measurement import Measurement, db
+from src.models.measurement_archive import archive_measurements, combined_rows, measurement_archive
+
+OLD_MONTHS = [(2025, 1), (2025, 2), (2025, 3)]
+
+
+def post_measurements(client):
+    """Two readings in each old month and one today; returns their ids"""
+    timestamps = [datetime(year, month, day, 12) for year, month in OLD_MONTHS for day in (5, 20)]
+    timestamps.append(datetime.utcnow().replace(microsecond=0))
+    ids = []
+    for i, timestamp in enumerate(timestamps):
+        response = client.post('/api/measurements', json={
+            'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4},
+            'estimated_protein': 10.0 + i, 'timestamp': timestamp.isoformat()
+        })
+        assert response.status_code == 200, response.json
+        ids.append(response.json['measurement_id'])
+    return ids
+
+
+def hot_ids():
+    return sorted(m_id for (m_id,) in db.session.query(Measurement.id))
+
+
+def all_rows(start=None, end=None):
+    query = db.session.query(Measurement).filter(Measurement.device_serial == 'SN-0001')
+    if start is not None:
+        query = query.filter(Measurement.timestamp >= start)
+    if end is not None:
+        query = query.filter(Measurement.timestamp <= end)
+    return combined_rows(query, 'SN-0001', ['id', 'estimated_protein'], start_date=start, end_date=end)
+
+
+def test_rerun_after_interrupted_archive_keeps_one_copy(app, client, device, monkeypatch):
+    ids = post_measurements(client)
+    with app.app_context():
+        # Interrupted after the partitions were written, before the hot rows were deleted
+        chunk_size = archive_module.DELETE_CHUNK_SIZE
+        monkeypatch.setattr(archive_module, 'DELETE_CHUNK_SIZE', 0)
+        try:
+            archive_measurements(older_than_days=365)
+        except ValueError:
+            db.session.rollback()
+        monkeypatch.setattr(archive_module, 'DELETE_CHUNK_SIZE', chunk_size)
+        assert hot_ids() == ids
+        assert [row[0] for row in all_rows()] == ids
+
+        # An edit made in between wins over the stale archived copy
+        db.session.get(Measurement, ids[0]).estimated_protein = 99.0
+        db.session.commit()
+        summary = archive_measurements(older_than_days=365)
+
+        assert summary['archived'] == 6
+        assert hot_ids() == ids[-1:]
+        assert [row[0] for row in all_rows()] == ids
+        assert all_rows()[0][1] == 99.0
+        partition_ids = [row[0] for row in measurement_archive.read('SN-0001', ['id'])]
+        assert sorted(partition_ids) == ids[:-1]
+
+
+def test_date_range_reads_hot_and_archived_rows(app, client, device):
+    ids = post_measurements(client)
+    with app.app_context():
+        # Only January and February are archived
+        archive_measurements(older_than_days=(datetime.utcnow() - datetime(2025, 3, 1)).days)
+        assert hot_ids() == ids[4:]
+
+        rows = all_rows(datetime(2025, 2, 10), datetime(2025, 3, 10))
+        assert [row[0] for row in rows] == ids[3:5]
+        rows = all_rows(datetime(2025, 1, 1), datetime.utcnow() + timedelta(days=1))
+        assert [row[0] for row in rows] == ids
+
+
+def test_reads_open_only_overlapping_partitions(app, client, device, monkeypatch):
+    post_measurements(client)
+    with app.app_context():
+        archive_measurements(older_than_days=365)
+    assert [(year, month) for year, month, _ in measurement_archive.partitions('SN-0001')] == OLD_MONTHS
+
+    opened = []
+    read_table = archive_module.pq.read_table
+
+    def recording(path, **kwargs):
+        opened.append(path)
+        return read_table(path, **kwargs)
+
+    monkeypatch.setattr(archive_module.pq, 'read_table', recording)
+    rows = measurement_archive.read('SN-0001', ['id'], datetime(2025, 2, 1), datetime(2025, 2, 28))
+    assert len(rows) == 2
+    assert opened == [measurement_archive.partition_path('SN-0001', 2025, 2)]
+    assert measurement_archive.read('SN-0001', ['id'], datetime(2025, 6, 1)) == []
+    assert opened == [measurement_archive.partition_path('SN-0001', 2025, 2)]
@@ -0,0 +1,59 @@
+import threading
+
+from src.monitoring.metrics import MetricsRegistry
+
+ROUTE = 'blueprint="measurements",endpoint="/api/measurements/<device_serial>"'
+
+
+def sample(text, name, labels):
+    """Value of one series in Prometheus text output (0 when absent)"""
+    prefix = f'{name}{{{labels}}} ' if labels else f'{name} '
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0.0
+
+
+def test_requests_and_queries_are_counted_per_route_template(client, device):
+    before = client.get('/metrics').get_data(as_text=True)
+    for serial in ('SN-0001', 'SN-0002'):
+        assert client.get(f'/api/measurements/{serial}').status_code == 200
+    after = client.get('/metrics').get_data(as_text=True)
+
+    requests = f'{ROUTE},method="GET",status="200"'
+    assert sample(after, 'http_requests_total', requests) - sample(before, 'http_requests_total', requests) == 2
+    assert sample(after, 'http_request_duration_seconds_count', f'{ROUTE},method="GET"') - \
+        sample(before, 'http_request_duration_seconds_count', f'{ROUTE},method="GET"') == 2
+    assert sample(after, 'db_queries_total', ROUTE) - sample(before, 'db_queries_total', ROUTE) >= 2
+    assert '/api/measurements/SN-0002' not in after
+    assert sample(after, 'http_requests_in_flight', '') == 1  # the /metrics request itself
+
+
+def test_shards_of_finished_threads_are_merged():
+    registry = MetricsRegistry()
+
+    def work():
+        for _ in range(100):
+            registry.inc('http_requests_total', (('endpoint', '/x'),))
+            registry.observe('http_request_duration_seconds', (('endpoint', '/x'),), 0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = registry.render()
+    assert sample(text, 'http_requests_total', 'endpoint="/x"') == 800
+    assert sample(text, 'http_request_duration_seconds_bucket', 'endpoint="/x",le="0.01"') == 0
+    assert sample(text, 'http_request_duration_seconds_bucket', 'endpoint="/x",le="0.025"') == 800
+    assert sample(text, 'http_request_duration_seconds_bucket', 'endpoint="/x",le="+Inf"') == 800
+    assert registry._shards == []
+    # Rendering again doesn't double count the retired shards
+    assert sample(registry.render(), 'http_requests_total', 'endpoint="/x"') == 800
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc('http_requests_total', (('endpoint', 'a"b\\c\nd'),))
+    assert 'http_requests_total{endpoint="a\\"b\\\\c\\nd"} 1' in registry.render()
@@ -0,0 +1,131 @@
+import sqlite3
+
+from src.main import create_app
+
+# measurements as created before anomaly detection and ingest deduplication
+OLD_MEASUREMENTS = '''
+CREATE TABLE measurements (
+    id INTEGER PRIMARY KEY,
+    device_serial VARCHAR(32) NOT NULL,
+    timestamp DATETIME,
+    nir_data TEXT NOT NULL,
+    estimated_co2 FLOAT,
+    estimated_protein FLOAT,
+    estimated_amino_acids FLOAT,
+    estimated_minerals FLOAT,
+    estimated_flavor_compounds FLOAT,
+    estimated_moisture FLOAT,
+    sample_name VARCHAR(120),
+    sample_type VARCHAR(120),
+    coffee_type INTEGER,
+    coffee_origin INTEGER,
+    measurement_mode INTEGER,
+    quality_score FLOAT,
+    notes TEXT,
+    analysis_results TEXT
+)
+'''
+
+# Blend tables as created before full-spectrum profiles
+OLD_BLEND_PROFILES = '''
+CREATE TABLE blend_profiles (
+    id INTEGER PRIMARY KEY,
+    device_id VARCHAR(32) NOT NULL,
+    profile_name VARCHAR(100) NOT NULL,
+    description TEXT,
+    sample_count INTEGER,
+    profile_signature TEXT,
+    created_at DATETIME,
+    updated_at DATETIME
+)
+'''
+OLD_BLEND_SAMPLES = '''
+CREATE TABLE blend_samples (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES blend_profiles (id),
+    sample_name VARCHAR(100),
+    sensor_reading_1 FLOAT,
+    sensor_reading_2 FLOAT,
+    sensor_reading_3 FLOAT,
+    chemical_data TEXT,
+    notes TEXT,
+    created_at DATETIME
+)
+'''
+
+
+def columns(path, table):
+    connection = sqlite3.connect(path)
+    try:
+        return {row[1] for row in connection.execute(f'PRAGMA table_info({table})')}
+    finally:
+        connection.close()
+
+
+def old_database(tmp_path, *statements):
+    path = tmp_path / 'app.db'
+    connection = sqlite3.connect(path)
+    for statement in statements:
+        connection.execute(statement)
+    connection.execute("INSERT INTO measurements (device_serial, timestamp, nir_data) VALUES ('SN-0001', '2026-01-05 10:00:00', '{}')")
+    connection.commit()
+    connection.close()
+    return path
+
+
+def make_app(path):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'RATE_LIMIT_BACKEND': 'memory',
+    })
+
+
+def test_measurements_table_gets_new_columns(tmp_path):
+    path = old_database(tmp_path, OLD_MEASUREMENTS)
+    app = make_app(path)
+
+    assert {'is_anomaly', 'anomaly_flags', 'idempotency_key'} <= columns(path, 'measurements')
+
+    from src.models.device import Device, db
+    with app.app_context():
+        db.session.add(Device(device_id='dev-1', device_serial='SN-0001', activation_key='key-1'))
+        db.session.commit()
+    client = app.test_client()
+    response = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_co2': 610.0
+    })
+    assert response.status_code == 200, response.json
+    # The pre-existing row reads back with the new columns empty
+    listing = client.get('/api/measurements/SN-0001?days=3650')
+    assert listing.status_code == 200
+
+
+def test_blend_tables_get_spectrum_columns(tmp_path):
+    path = old_database(tmp_path, OLD_MEASUREMENTS, OLD_BLEND_PROFILES, OLD_BLEND_SAMPLES)
+    app = make_app(path)
+
+    assert {'spectrum_mean', 'spectrum_covariance'} <= columns(path, 'blend_profiles')
+    assert 'spectrum' in columns(path, 'blend_samples')
+
+    from src.models.device import Device, db
+    with app.app_context():
+        db.session.add(Device(device_id='dev-1', device_serial='SN-0001', activation_key='key-1',
+                              activation_level='blend_profiles'))
+        db.session.commit()
+    client = app.test_client()
+    nir = {f'channel{i}': 0.1 * (i + 1) for i in range(11)}
+    created = client.post('/api/blend/devices/dev-1/profiles', json={
+        'profile_name': 'House blend',
+        'samples': [{'nir_readings': nir}, {'nir_readings': {k: v * 1.05 for k, v in nir.items()}}]
+    })
+    assert created.status_code == 201, created.json
+    assert client.get('/api/blend/devices/dev-1/profiles').status_code == 200
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    path = old_database(tmp_path, OLD_MEASUREMENTS)
+    make_app(path)
+    before = columns(path, 'measurements')
+    make_app(path)
+    assert columns(path, 'measurements') == before
@@ -0,0 +1,66 @@
+import csv
+from datetime import date
+
+from src import provision_devices as provision_cli
+from src.models.device import Device, db
+
+BATCH = ['R3S-20260105-A00001', 'r3s-20260105-a00002', 'R3S-20260105-A00001', 'R3S-20260212-B00001',
+         'SN-0001', 'R3S-2026-X', 'R3S-20260105-AB']
+
+
+def devices(app):
+    with app.app_context():
+        return {d.device_serial: d for d in Device.query.all()}
+
+
+def test_batch_is_validated_and_inserted_once(app, client, device):
+    response = client.post('/api/activation/devices/provision', json={
+        'serials': BATCH + ['R3S-20260105-A00001'], 'activation_level': 'professional'
+    })
+    assert response.status_code == 201, response.json
+    body = response.json
+    assert [d['device_serial'] for d in body['created']] == [
+        'R3S-20260105-A00001', 'R3S-20260105-A00002', 'R3S-20260212-B00001'
+    ]
+    assert body['invalid'] == ['SN-0001', 'R3S-2026-X', 'R3S-20260105-AB']
+
+    stored = devices(app)
+    assert stored['R3S-20260212-B00001'].manufacture_date == date(2026, 2, 12)
+    assert all(d['activation_key'].startswith('PRO-') for d in body['created'])
+    assert len({d.device_id for d in stored.values()}) == len(stored) == 4
+
+    again = client.post('/api/activation/devices/provision', json={'serials': BATCH[:2]})
+    assert again.status_code == 200
+    assert again.json['skipped_existing'] == ['R3S-20260105-A00001', 'R3S-20260105-A00002']
+
+
+def test_generated_ids_avoid_existing_ones(app, client, device, monkeypatch):
+    candidates = iter(['dev-1', 'dev-1', 'id-a', 'id-a', 'id-b'])
+    monkeypatch.setattr(Device, 'generate_device_id', staticmethod(lambda: next(candidates)))
+    body = client.post('/api/activation/devices/provision', json={'serials': BATCH[:2]}).json
+    assert [d['device_id'] for d in body['created']] == ['id-a', 'id-b']
+    assert all(d['activation_key'] == '' for d in body['created'])
+
+
+def test_dry_run_and_bad_requests_insert_nothing(app, client, device):
+    response = client.post('/api/activation/devices/provision', json={'serials': BATCH, 'dry_run': True})
+    assert response.status_code == 200 and response.json['created_count'] == 3
+    assert client.post('/api/activation/devices/provision', json={'serials': 'R3S-20260105-A00001'}).status_code == 400
+    assert client.post('/api/activation/devices/provision', json={
+        'serials': BATCH, 'activation_level': 'gold'
+    }).status_code == 400
+    assert list(devices(app)) == ['SN-0001']
+
+
+def test_cli_reads_serials_and_writes_keys(app, tmp_path, monkeypatch):
+    serials = tmp_path / 'serials.csv'
+    serials.write_text('device_serial,batch\n# line 1\nR3S-20260105-A00001,1\n\nR3S-20260105-A00002,1\n')
+    output = tmp_path / 'keys.csv'
+    monkeypatch.setattr(provision_cli, 'create_app', lambda: app)
+
+    assert provision_cli.main([str(serials), '--activation-level', 'basic', '--output', str(output)]) == 0
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['device_serial'] for row in rows] == ['R3S-20260105-A00001', 'R3S-20260105-A00002']
+    assert all(row['activation_key'].startswith('BAS-') and row['manufacture_date'] == '2026-01-05' for row in rows)
+    assert set(devices(app)) == {row['device_serial'] for row in rows}
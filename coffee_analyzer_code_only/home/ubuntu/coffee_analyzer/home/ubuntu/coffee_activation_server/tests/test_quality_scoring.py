@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.analysis.quality_scoring import quality_scorer, rescore_measurements, score_values
+from src.models.chemical_reference import ChemicalReferenceRange, db
+
+
+def test_score_falls_linearly_outside_the_range():
+    low, high = np.array([[10.0]]), np.array([[12.0]])
+    scores = [score_values([[value]], low, high)[0] for value in (11.0, 13.0, 14.0, 20.0)]
+    assert scores == [100.0, 50.0, 0.0, 0.0]
+    assert np.isnan(score_values([[np.nan]], low, high)[0])
+
+
+def add_protein_range(app, low, high):
+    with app.app_context():
+        db.session.add(ChemicalReferenceRange(variety='arabica', region='general',
+                                              component='proteins_percent', min_value=low, max_value=high))
+        db.session.commit()
+        quality_scorer.invalidate()
+
+
+def score(app, protein):
+    with app.app_context():
+        return quality_scorer.score_measurement(SimpleNamespace(
+            coffee_origin=None, estimated_protein=protein, estimated_moisture=None, estimated_minerals=None
+        ))
+
+
+def test_ranges_come_from_the_reference_table(app):
+    # Empty table: the bundled reference file (arabica protein 10-13 %)
+    assert score(app, 11.0) == 100.0
+    assert score(app, 21.0) == 0.0
+
+    add_protein_range(app, 20.0, 22.0)
+    assert score(app, 21.0) == 100.0
+    assert score(app, 11.0) == 0.0
+
+
+def test_rescoring_refreshes_daily_aggregates_and_cached_stats(app, client, device):
+    response = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_protein': 21.0
+    })
+    assert response.status_code in (200, 201), response.json
+
+    daily = client.get('/api/measurements/SN-0001/daily-stats?days=1')
+    assert daily.json['stats']['statistics']['quality_score']['average'] == 0.0
+    assert client.get('/api/measurements/SN-0001/daily-stats?days=1').headers['X-Cache'] == 'HIT'
+
+    add_protein_range(app, 20.0, 22.0)
+    with app.app_context():
+        assert rescore_measurements(db.session, only_missing=False) == (1, 1)
+
+    daily = client.get('/api/measurements/SN-0001/daily-stats?days=1')
+    assert daily.headers['X-Cache'] == 'MISS'
+    assert daily.json['stats']['statistics']['quality_score']['average'] == 100.0
+
+
+def test_file_fallback_is_replaced_once_the_table_can_be_read(app):
+    from src.analysis.quality_scoring import QualityScorer
+
+    scorer = QualityScorer()
+    measurement = SimpleNamespace(coffee_origin=None, estimated_protein=21.0,
+                                  estimated_moisture=None, estimated_minerals=None)
+    # No app context: the bundled reference file, twice (the second failure must not pin it)
+    assert scorer.score_measurement(measurement) == 0.0
+    assert scorer.score_measurement(measurement) == 0.0
+
+    add_protein_range(app, 20.0, 22.0)
+    with app.app_context():
+        assert scorer.score_measurement(measurement) == 100.0
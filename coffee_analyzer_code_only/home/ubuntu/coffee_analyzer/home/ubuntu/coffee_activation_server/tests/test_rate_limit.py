@@ -0,0 +1,88 @@
+import pytest
+
+from src.main import MODEL_DATABASES, create_app
+from src.models.device import Device, db
+from src.monitoring.rate_limit import BACKLOG_KEY, GLOBAL_KEY, TokenBucket, admit
+
+DEVICE = 'device:SN-0001@addr:10.0.0.1'
+
+
+def run(requests, device_bucket, global_bucket, max_retry_after=300, start=1000.0, states=None):
+    """Apply ``admit`` to (offset seconds, device key) requests; returns the retry_after of each"""
+    states = {} if states is None else states
+    results = []
+    for offset, device_key in requests:
+        updates, retry_after = admit(states, start + offset, device_key, device_bucket, global_bucket,
+                                     max_retry_after)
+        states.update(updates)
+        results.append(retry_after)
+    return results, states
+
+
+def test_device_is_held_to_its_own_rate():
+    results, states = run([(0, DEVICE)] * 3 + [(0.5, DEVICE), (1.0, DEVICE)],
+                          TokenBucket(rate=1.0, burst=2), TokenBucket(rate=100.0, burst=100))
+    assert results[:2] == [None, None]
+    assert results[2:4] == [1.0, 0.5]
+    assert results[4] is None
+    # A throttled device doesn't join the fleet backlog
+    assert states[BACKLOG_KEY][0] == 0.0
+
+
+def test_global_backlog_spreads_retries():
+    devices = [(0, f'device:SN-{i}@addr:10.0.0.{i}') for i in range(5)]
+    results, states = run(devices, TokenBucket(rate=1.0, burst=5), TokenBucket(rate=10.0, burst=1))
+    assert results[0] is None
+    assert results[1:] == pytest.approx([0.2, 0.3, 0.4, 0.5])
+    assert states[GLOBAL_KEY][0] == 0.0
+
+    # The backlog (4 deep) drains at the global rate: one slot left after 0.3 s
+    later, _ = run(devices[:2], TokenBucket(rate=1.0, burst=5), TokenBucket(rate=10.0, burst=1),
+                   start=1000.3, states=states)
+    assert later[0] is None
+    assert later[1] == pytest.approx(0.3)
+
+
+def test_retry_after_is_capped():
+    results, _ = run([(0, f'device:SN-{i}@addr:x') for i in range(10)],
+                     TokenBucket(rate=1.0, burst=5), TokenBucket(rate=1.0, burst=1), max_retry_after=4)
+    assert max(results[1:]) == 4
+
+
+@pytest.fixture
+def limited_client(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'RATE_LIMIT_BACKEND': 'memory',
+        'RATE_LIMIT_DEVICE_RATE': 0.01,
+        'RATE_LIMIT_DEVICE_BURST': 2,
+    })
+    with app.app_context():
+        db.session.add(Device(device_id='dev-1', device_serial='SN-0001', activation_key='key-1'))
+        db.session.commit()
+    yield app.test_client()
+    with app.app_context():
+        for model_db in MODEL_DATABASES:
+            model_db.engine.dispose()
+
+
+def post(client, address, minute):
+    return client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4},
+        'timestamp': f'2026-01-01T10:{minute:02d}:00'
+    }, environ_base={'REMOTE_ADDR': address})
+
+
+def test_throttled_request_gets_retry_after(limited_client):
+    assert [post(limited_client, '10.0.0.1', minute).status_code for minute in range(2)] == [200, 200]
+    response = post(limited_client, '10.0.0.1', 2)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '100'
+    assert response.json['retry_after'] == 100
+
+
+def test_claimed_serial_from_another_address_has_its_own_bucket(limited_client):
+    # Someone else naming the device's serial exhausts only their own bucket
+    assert [post(limited_client, '10.9.9.9', minute).status_code for minute in range(3)] == [200, 200, 429]
+    assert post(limited_client, '10.0.0.1', 10).status_code == 200
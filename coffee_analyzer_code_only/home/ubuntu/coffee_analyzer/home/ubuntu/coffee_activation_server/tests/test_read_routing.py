@@ -0,0 +1,79 @@
+import shutil
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.main import create_app
+from src.models.read_routing import STICKY_COOKIE, replica_router
+
+REPORT = {'measurement_count': 12, 'error_count': 0, 'uptime_hours': 1.5,
+          'wifi_signal': -60, 'free_heap': 180000, 'current_mode': 1}
+# Only the replica holds a report with this count, so reads show where they went
+REPLICA_MARKER = 999
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    primary, replica = tmp_path / 'app.db', tmp_path / 'replica.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+        'SQLALCHEMY_REPLICA_URL': f'sqlite:///{replica}',
+        'READ_YOUR_WRITES_SECONDS': 0.5,
+        'RATE_LIMIT_BACKEND': 'memory',
+    })
+    from src.models.device import Device, db
+    with app.app_context():
+        db.session.add(Device(device_id='dev-1', device_serial='SN-0001', activation_key='key-1'))
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+
+    engine = create_engine(f'sqlite:///{replica}')
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO device_reports (device_id, measurement_count, created_at) "
+            "VALUES ('dev-1', :count, CURRENT_TIMESTAMP)"
+        ), {'count': REPLICA_MARKER})
+    engine.dispose()
+    yield app
+    replica_router.engine.dispose()
+
+
+def report_counts(client):
+    response = client.get('/api/activation/devices/dev-1/reports?fields=measurement_count')
+    assert response.status_code == 200, response.json
+    return [report['measurement_count'] for report in response.json['reports']]
+
+
+def test_reads_go_to_the_replica(replica_app):
+    assert replica_router.enabled
+    assert report_counts(replica_app.test_client()) == [REPLICA_MARKER]
+
+
+def test_write_pins_reads_to_primary_until_window_expires(replica_app):
+    client = replica_app.test_client()
+    response = client.post('/api/activation/devices/dev-1/report', json=REPORT)
+    assert response.status_code == 200
+    assert STICKY_COOKIE in response.headers.get('Set-Cookie', '')
+
+    # Read-your-writes: the report just written, served by the primary
+    assert report_counts(client) == [REPORT['measurement_count']]
+
+    time.sleep(0.6)
+    assert report_counts(client) == [REPLICA_MARKER]
+
+
+def test_failed_write_does_not_pin(replica_app):
+    client = replica_app.test_client()
+    response = client.post('/api/activation/devices/unknown/report', json=REPORT)
+    assert response.status_code == 404
+    assert STICKY_COOKIE not in response.headers.get('Set-Cookie', '')
+    assert report_counts(client) == [REPLICA_MARKER]
+
+
+def test_app_without_replica_reads_primary(app, client, device):
+    assert not replica_router.enabled
+    client.post('/api/activation/devices/dev-1/report', json=REPORT)
+    assert report_counts(app.test_client()) == [REPORT['measurement_count']]
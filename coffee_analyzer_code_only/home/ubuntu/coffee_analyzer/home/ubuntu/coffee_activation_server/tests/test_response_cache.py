@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from src.monitoring.response_cache import CACHE_HEADER, RedisCacheBackend, response_cache
+
+
+class FakeRedis:
+    """The subset of redis.Redis the cache backend uses; values come back as bytes like redis-py"""
+
+    def __init__(self):
+        self.values = {}
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        value = self.values.get(key)
+        if value is None or (value[1] is not None and value[1] < time.monotonic()):
+            return None
+        return value[0]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = (self._encode(value), time.monotonic() + ex if ex else None)
+
+    def setnx(self, key, value):
+        if self.get(key) is None:
+            self.set(key, value)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.set(key, value)
+        return value
+
+
+MEASUREMENT = {'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4}, 'estimated_co2': 610.0}
+
+
+@pytest.fixture
+def redis_client(app):
+    client = FakeRedis()
+    response_cache.configure(RedisCacheBackend(client), ttl=60)
+    return client
+
+
+def stats(client):
+    response = client.get('/api/measurements/SN-0001/stats')
+    assert response.status_code == 200
+    return response
+
+
+def test_ingest_bump_invalidates_redis_cached_stats(client, device, redis_client):
+    client.post('/api/measurements', json=MEASUREMENT)
+
+    first = stats(client)
+    assert first.headers[CACHE_HEADER] == 'MISS'
+    assert stats(client).headers[CACHE_HEADER] == 'HIT'
+    version = redis_client.get('response-cache:version:measurements:SN-0001')
+
+    client.post('/api/measurements', json=dict(MEASUREMENT, estimated_co2=640.0))
+
+    assert redis_client.get('response-cache:version:measurements:SN-0001') == str(int(version) + 1).encode()
+    after = stats(client)
+    assert after.headers[CACHE_HEADER] == 'MISS'
+    assert after.json['stats']['total_measurements'] == first.json['stats']['total_measurements'] + 1
+    assert stats(client).headers[CACHE_HEADER] == 'HIT'
+
+
+def test_bump_only_touches_its_scope(client, device, redis_client):
+    client.get('/api/measurements/OTHER/stats')
+    assert client.get('/api/measurements/OTHER/stats').headers[CACHE_HEADER] == 'HIT'
+
+    client.post('/api/measurements', json=MEASUREMENT)
+
+    assert client.get('/api/measurements/OTHER/stats').headers[CACHE_HEADER] == 'HIT'
+
+
+def test_evicted_version_counter_does_not_resurrect_entries(client, device, redis_client):
+    client.post('/api/measurements', json=MEASUREMENT)
+    stats(client)
+    client.post('/api/measurements', json=dict(MEASUREMENT, estimated_co2=640.0))
+    stats(client)
+
+    # Server evicts the counter: the recreated one starts from the clock, past every cached version
+    del redis_client.values['response-cache:version:measurements:SN-0001']
+    assert stats(client).headers[CACHE_HEADER] == 'MISS'
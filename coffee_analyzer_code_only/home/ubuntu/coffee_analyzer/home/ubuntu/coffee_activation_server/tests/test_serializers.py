@@ -0,0 +1,59 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from src.models import serializers
+from src.models.measurement import Measurement, db
+from src.models.serializers import MEASUREMENT_FIELDS, encode_rows, json_response, stored_json
+
+ENCODERS = ['stdlib', 'orjson']
+if serializers.FRAGMENTS:
+    ENCODERS.append('fragments')
+
+
+@pytest.fixture(params=ENCODERS)
+def encoder(request, monkeypatch):
+    """Run a test with each encoder available here"""
+    if request.param == 'stdlib':
+        monkeypatch.setattr(serializers, 'orjson', None)
+    if request.param != 'fragments':
+        monkeypatch.setattr(serializers, 'FRAGMENTS', False)
+    return request.param
+
+
+def encode(rows, fields):
+    return json.loads(json_response({'rows': encode_rows(rows, MEASUREMENT_FIELDS, fields, fields)}).get_data())['rows']
+
+
+def test_rows_match_to_dict(app, device, encoder):
+    fields = ['id', 'timestamp', 'nir_data', 'estimated_protein', 'notes', 'anomaly_flags']
+    with app.app_context():
+        measurement = Measurement(device_serial='SN-0001', timestamp=datetime(2026, 1, 2, 3, 4, 5, 678),
+                                  nir_data=json.dumps({'channel0': 0.4}), estimated_protein=12.5, notes='حبوب')
+        db.session.add(measurement)
+        db.session.commit()
+        expected = {name: measurement.to_dict()[name] for name in fields}
+        rows = db.session.query(*[MEASUREMENT_FIELDS.fields[name][0] for name in fields]).all()
+    assert encode(rows, fields) == [expected]
+
+
+@pytest.mark.parametrize('stored, expected', [
+    (None, {}),
+    ('', {}),
+    ('not json', {}),
+    ('{"channel0": 0.4', {}),
+    ('{"channel0": 0.4} trailing', {}),
+    ('  {"channel0": 0.4}', {'channel0': 0.4}),
+])
+def test_invalid_stored_json_is_not_embedded(encoder, stored, expected):
+    assert encode([(stored, stored)], ['nir_data', 'anomaly_flags']) == [
+        {'nir_data': expected, 'anomaly_flags': expected or []}
+    ]
+
+
+def test_stored_nan_is_re_encoded_as_valid_json(encoder):
+    if encoder == 'stdlib':
+        pytest.skip('json.dumps writes NaN, like jsonify')
+    body = json_response({'signature': stored_json('{"peak": NaN, "width": 2}')}).get_data(as_text=True)
+    assert json.loads(body, parse_constant=pytest.fail) == {'signature': {'peak': None, 'width': 2}}
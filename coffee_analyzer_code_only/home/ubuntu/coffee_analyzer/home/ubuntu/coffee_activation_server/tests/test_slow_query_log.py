@@ -0,0 +1,55 @@
+import sqlite3
+
+from src.monitoring.slow_query_log import explain_query_plan
+
+
+class RecordingCursor:
+    """DBAPI cursor stand-in that logs statements and fails the EXPLAIN"""
+
+    def __init__(self, log, fail_explain):
+        self.log = log
+        self.fail_explain = fail_explain
+        self.connection = self
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement, parameters=None):
+        is_explain = statement.startswith('EXPLAIN')
+        self.log.append('EXPLAIN' if is_explain else statement)
+        if is_explain and self.fail_explain:
+            raise RuntimeError('cannot EXPLAIN this statement')
+
+    def fetchall(self):
+        return [('Seq Scan on measurements',)]
+
+    def close(self):
+        pass
+
+
+def test_postgresql_explain_runs_in_a_savepoint():
+    log = []
+    plan = explain_query_plan(RecordingCursor(log, False), 'postgresql', 'SELECT 1', {})
+    assert plan == ['Seq Scan on measurements']
+    assert log == ['SAVEPOINT slow_query_explain', 'EXPLAIN', 'RELEASE SAVEPOINT slow_query_explain']
+
+
+def test_failed_explain_rolls_back_to_the_savepoint():
+    log = []
+    plan = explain_query_plan(RecordingCursor(log, True), 'postgresql', 'SELECT 1', {})
+    assert plan[0].startswith('plan unavailable')
+    assert log == ['SAVEPOINT slow_query_explain', 'EXPLAIN', 'ROLLBACK TO SAVEPOINT slow_query_explain',
+                   'RELEASE SAVEPOINT slow_query_explain']
+
+
+def test_sqlite_plan_leaves_the_transaction_alone():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE measurements (id INTEGER PRIMARY KEY, device_serial TEXT)')
+    connection.execute("INSERT INTO measurements (device_serial) VALUES ('SN-0001')")
+    assert connection.in_transaction
+
+    plan = explain_query_plan(connection.cursor(), 'sqlite', 'SELECT * FROM measurements WHERE id = ?', (1,))
+    assert plan and 'measurements' in plan[0]
+    assert connection.in_transaction
+    connection.rollback()
+    assert connection.execute('SELECT count(*) FROM measurements').fetchone()[0] == 0
@@ -0,0 +1,101 @@
+import json
+from datetime import datetime, timedelta
+
+from src.analysis.spectral_index import spectral_index
+from src.models.measurement import Measurement, db
+from src.models.measurement_archive import archive_measurements
+
+
+def spectrum(shape):
+    # Spectra are compared after SNV, so they differ in shape, not level
+    return {f'channel{i}': 0.5 + 0.01 * i + shape * (i % 2) for i in range(11)}
+
+
+def post_measurement(client, shape, days_ago=0):
+    response = client.post('/api/measurements', json={
+        'device_serial': 'SN-0001', 'nir_readings': spectrum(shape),
+        'timestamp': (datetime.utcnow() - timedelta(days=days_ago)).isoformat()
+    })
+    assert response.status_code in (200, 201), response.json
+    return response.json['measurement_id']
+
+
+def store_directly(app, shape, measurement_id=None):
+    """A row committed by another worker: in the table but not in this worker's index"""
+    with app.app_context():
+        measurement = Measurement(id=measurement_id, device_serial='SN-0001', nir_data=json.dumps(spectrum(shape)))
+        db.session.add(measurement)
+        db.session.commit()
+        return measurement.id
+
+
+def tracked_rows(monkeypatch):
+    fetched = []
+    add_rows = spectral_index.add_rows
+
+    def recording(rows):
+        fetched.extend(row[0] for row in rows)
+        return add_rows(rows)
+
+    monkeypatch.setattr(spectral_index, 'add_rows', recording)
+    return fetched
+
+
+def test_sync_fetches_only_unindexed_rows(app, client, device, monkeypatch):
+    indexed = [post_measurement(client, shape) for shape in (0.1, 0.2)]
+    with app.app_context():
+        spectral_index.sync(db.session)
+    other = store_directly(app, 0.3)
+
+    fetched = tracked_rows(monkeypatch)
+    with app.app_context():
+        assert spectral_index.sync(db.session) == 1
+        # Nothing new since: no spectra are read again
+        assert spectral_index.sync(db.session) == 0
+    assert fetched == [other]
+    assert len(spectral_index) == len(indexed) + 1
+
+
+def test_search_syncs_at_most_once_per_interval(app, client, device, monkeypatch):
+    post_measurement(client, 0.1)
+    client.post('/api/measurements/similar', json={'nir_readings': spectrum(0.1)})
+    other = store_directly(app, 0.1)
+
+    body = client.post('/api/measurements/similar', json={'nir_readings': spectrum(0.1)}).json
+    assert other not in [match['measurement_id'] for match in body['matches']]
+
+    monkeypatch.setattr(spectral_index, '_synced_at', spectral_index._synced_at - spectral_index.sync_interval)
+    body = client.post('/api/measurements/similar', json={'nir_readings': spectrum(0.1)}).json
+    assert other in [match['measurement_id'] for match in body['matches']]
+
+
+def test_sync_picks_up_ids_committed_out_of_order(app, client, device):
+    with app.app_context():
+        spectral_index.sync(db.session)
+    store_directly(app, 0.1, measurement_id=10)
+    store_directly(app, 0.2, measurement_id=12)
+    with app.app_context():
+        assert spectral_index.sync(db.session) == 2
+    # Id 11 was reserved by a slower worker and committed last
+    store_directly(app, 0.3, measurement_id=11)
+    with app.app_context():
+        assert spectral_index.sync(db.session) == 1
+    assert sorted(spectral_index._arrays['ids'][:len(spectral_index)]) == [10, 11, 12]
+
+
+def test_archived_matches_are_left_out_unless_requested(app, client, device):
+    archived = [post_measurement(client, 0.1 + 0.01 * i, days_ago=400) for i in range(3)]
+    live = post_measurement(client, 0.5)
+    with app.app_context():
+        archive_measurements(older_than_days=365)
+        assert spectral_index.rebuild(db.session) == 4
+
+    body = client.post('/api/measurements/similar', json={'nir_readings': spectrum(0.1), 'k': 2}).json
+    assert [match['measurement_id'] for match in body['matches']] == [live]
+
+    body = client.post('/api/measurements/similar', json={
+        'nir_readings': spectrum(0.1), 'k': 2, 'include_archived': True
+    }).json
+    assert [match['measurement_id'] for match in body['matches']] == archived[:2]
+    assert all(match['archived'] for match in body['matches'])
+    assert client.get(f'/api/measurements/{archived[0]}').status_code == 404
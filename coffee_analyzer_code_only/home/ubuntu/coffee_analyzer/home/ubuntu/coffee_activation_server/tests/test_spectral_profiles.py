@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.analysis.spectral_profiles import (
+    SPECTRUM_CHANNELS, CholeskyCache, encode_array, mahalanobis_distances, spectral_signature
+)
+from src.models.device import Device, db
+
+
+def spectra(center, count, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0.2, 0.8, SPECTRUM_CHANNELS) + center
+    return base + rng.normal(scale=0.01, size=(count, SPECTRUM_CHANNELS))
+
+
+@pytest.mark.parametrize('count', [1, 2, 5, 40])
+def test_signature_is_positive_definite_for_any_sample_count(count):
+    mean, covariance = spectral_signature(spectra(0.0, count))
+    assert mean.shape == (SPECTRUM_CHANNELS,)
+    assert np.allclose(covariance, covariance.T)
+    assert np.linalg.eigvalsh(covariance).min() > 0
+
+
+def test_mahalanobis_matches_the_direct_formula():
+    mean, covariance = spectral_signature(spectra(0.0, 8))
+    samples = spectra(0.02, 5, seed=1)
+    expected = [np.sqrt(d @ np.linalg.inv(covariance) @ d) for d in samples - mean]
+    assert np.allclose(mahalanobis_distances(samples, mean, np.linalg.cholesky(covariance)), expected)
+
+
+def test_cholesky_factor_is_cached_per_covariance():
+    cache = CholeskyCache(max_entries=2)
+    first = encode_array(spectral_signature(spectra(0.0, 4))[1])
+    second = encode_array(spectral_signature(spectra(0.1, 4))[1])
+
+    factor = cache.factor(1, first)
+    assert cache.factor(1, first) is factor
+    # The profile's stored covariance changed: factor recomputed
+    assert cache.factor(1, second) is not factor
+    cache.factor(2, first)
+    cache.factor(3, first)
+    assert list(cache._entries) == [2, 3]
+
+
+def nir(values):
+    return {f'channel{i}': float(v) for i, v in enumerate(values)}
+
+
+def test_spectrum_samples_are_matched_by_mahalanobis_distance(app, client, device):
+    with app.app_context():
+        Device.query.filter_by(device_id='dev-1').update({'activation_level': 'blend_profiles'})
+        db.session.commit()
+    for name, center in (('light', 0.0), ('dark', 0.05)):
+        response = client.post('/api/blend/devices/dev-1/profiles', json={
+            'profile_name': name,
+            'samples': [{'nir_readings': nir(values)} for values in spectra(center, 6, seed=int(center * 100))]
+        })
+        assert response.status_code in (200, 201), response.json
+
+    for center, expected in ((0.0, 'light'), (0.05, 'dark')):
+        response = client.post('/api/blend/devices/dev-1/match', json={
+            'nir_readings': nir(spectra(center, 1, seed=7)[0])
+        })
+        assert response.status_code == 200, response.json
+        best = response.json['best_match']
+        assert best['profile_name'] == expected
+        assert best['method'] == 'spectrum'
+        assert best['mahalanobis_distance'] < min(
+            match['mahalanobis_distance'] for match in response.json['matches'][1:]
+        )
+
+    # Sensor-only samples still match on the three readings
+    response = client.post('/api/blend/devices/dev-1/match', json={
+        'sensor_reading_1': 0.2, 'sensor_reading_2': 0.26, 'sensor_reading_3': 0.32
+    })
+    assert response.json['best_match']['method'] == 'sensor_readings'
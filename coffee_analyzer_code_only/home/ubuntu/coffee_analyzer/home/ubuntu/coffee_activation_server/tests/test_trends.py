@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+
+def post_measurements(client, count):
+    start = datetime.utcnow() - timedelta(days=6)
+    for i in range(count):
+        client.post('/api/measurements', json={
+            'device_serial': 'SN-0001', 'nir_readings': {'channel0': 0.4},
+            'estimated_co2': 500.0 + i, 'timestamp': (start + timedelta(minutes=37 * i)).isoformat()
+        })
+
+
+def test_requested_bucket_width_cannot_exceed_max_points(client, device):
+    post_measurements(client, 60)
+    response = client.get('/api/measurements/SN-0001/trends?days=7&max_points=20&bucket_seconds=1')
+    assert response.status_code == 200, response.json
+
+    # 7 days over at most 20 points: buckets at least ceil(604800 / 20) seconds wide
+    assert response.json['bucket_seconds'] == 30240
+    points = response.json['series']['co2']['points']
+    assert 0 < len(points) <= 20
+    assert sum(point['count'] for point in points) == 60
+
+
+def test_wider_requested_bucket_is_kept(client, device):
+    post_measurements(client, 10)
+    response = client.get('/api/measurements/SN-0001/trends?days=7&max_points=20&bucket_seconds=86400')
+    assert response.json['bucket_seconds'] == 86400
@@ -0,0 +1,54 @@
+import socket
+import threading
+
+from src.monitoring.stream_budget import StreamBudget, budget_for_threads
+from src.monitoring.worker_bus import WorkerBus
+
+
+def test_messages_reach_other_workers_only(tmp_path):
+    first, second = WorkerBus(), WorkerBus()
+    received = {'first': [], 'second': []}
+    arrived = threading.Event()
+    first.subscribe('live_feed', received['first'].append)
+    second.subscribe('live_feed', lambda payload: (received['second'].append(payload), arrived.set()))
+    first.start(str(tmp_path), name='first')
+    second.start(str(tmp_path), name='second')
+    try:
+        assert first.publish('live_feed', ['measurement', 'SN-0001', {'id': 1}]) == 1
+        assert arrived.wait(2)
+        assert received == {'first': [], 'second': [['measurement', 'SN-0001', {'id': 1}]]}
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_exited_worker_socket_is_forgotten(tmp_path):
+    # A worker that exited without removing its socket file
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stale.bind(str(tmp_path / 'second.sock'))
+    stale.close()
+
+    first = WorkerBus()
+    first.start(str(tmp_path), name='first')
+    try:
+        assert first.publish('activation', 'SN-0001') == 0
+        assert not (tmp_path / 'second.sock').exists()
+    finally:
+        first.stop()
+
+
+def test_publish_without_start_is_local_only():
+    assert WorkerBus().publish('activation', 'SN-0001') == 0
+
+
+def test_stream_budget_keeps_threads_for_ingest():
+    assert budget_for_threads(16) == 12
+    assert budget_for_threads(8) == 4
+    assert budget_for_threads(2) == 0
+
+    budget = StreamBudget(limit=2)
+    assert budget.acquire() and budget.acquire()
+    assert not budget.acquire()
+    budget.release()
+    assert budget.acquire()
+    assert budget.stats() == {'active': 2, 'limit': 2, 'rejected': 1}